@@ -1,14 +1,21 @@
 import os
+import glob
+import io
 import pandas as pd
 import numpy as np
 import ftplib
 import logging
 import time
 import tempfile
+import threading
+import warnings
 from datetime import datetime, timedelta, timezone
-from scipy.signal import medfilt
-from scipy.stats import zscore
 from prometheus_client import Gauge, start_http_server
+from scheduler import IntervalTrigger, Scheduler, TailTrigger, ValueTrigger
+import instrumentation
+import query_api
+from profiling import profiler
+from iaga2002 import read_iaga2002, read_iaga2002_file_set
 
 len_days = 3
 update_interval_minutes = 10  
@@ -21,6 +28,8 @@ temp_dir = tempfile.gettempdir()
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
 
 k_index_gauge = Gauge("geomagnetic_k_index", "K-index value", ["station"])
+k_provisional_gauge = Gauge("geomagnetic_k_index_provisional", "K of the open 3-hour block so far", ["station"])
+k_elapsed_gauge = Gauge("geomagnetic_k_block_elapsed", "Fraction of the open 3-hour block observed", ["station"])
 
 def list_ftp_files(ftp, path):
     files = []
@@ -55,8 +64,10 @@ def get_ftp_files():
             local_files = []
             for filename in files_to_download:
                 local_path = os.path.join(temp_dir, filename)
-                with open(local_path, 'wb') as f:
-                    ftp.retrbinary(f"RETR {filename}", f.write)
+                with instrumentation.stage("kindex", "download") as timed:
+                    with open(local_path, 'wb') as f:
+                        ftp.retrbinary(f"RETR {filename}", f.write)
+                    timed.bytes = os.path.getsize(local_path)
                 local_files.append(local_path)
                 logging.info(f"Downloaded {filename} to {local_path}")
             return local_files
@@ -66,59 +77,88 @@ def get_ftp_files():
         logging.error(f"FTP connection error: {e}")
         return []
 
-def read_iaga2002(file_path):
-    try:
-        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-            lines = [line.strip() for line in f.readlines() if line.strip()]
-
-        header_end = -1
-        for i, line in enumerate(lines):
-            if line.startswith("DATE") and "TIME" in line and "DOY" in line:
-                header_end = i
-                break
-        if header_end == -1:
-            logging.error(f"Header not found in file: {file_path}")
-            return pd.DataFrame(), None, None
-
-        header_fields = [field.strip().replace('|', '') for field in lines[header_end].split()]
-        reported_components = ['X', 'Y', 'Z'] if all(c in header_fields for c in ['X', 'Y', 'Z']) else None
-        if reported_components is None:
-            logging.error(f"No valid components in file {file_path}")
-            return pd.DataFrame(), None, None
-
-        data = pd.read_csv(
-            file_path,
-            skiprows=header_end + 1,
-            names=header_fields,
-            sep=r"\s+",
-            na_values=[99999.00, 99999.9],
-            engine='python'
-        )
-        datetime_col = data["DATE"].astype(str) + " " + data["TIME"].astype(str)
-        data["DATETIME"] = pd.to_datetime(datetime_col, errors='coerce', utc=True)
-        data.dropna(subset=["DATETIME"], inplace=True)
-        for comp in reported_components:
-            data[comp] = pd.to_numeric(data[comp], errors='coerce')
-        return data[["DATETIME"] + reported_components], reported_components, station_code.upper()
-    except Exception as e:
-        logging.error(f"Error reading file {file_path}: {e}")
-        return pd.DataFrame(), None, None
+# Hampel-style spike filter: trailing window of raw minutes, robust sigma = 1.4826 * MAD
+spike_window_minutes = 61
+spike_threshold = 5.0
+
+class SpikeFilter:
+    """Incremental rolling median/MAD spike rejection over the X/Y/Z components.
+
+    Each minute is compared with the rolling median of the trailing window
+    ending at it. Its MAD is the rolling median of the absolute deviations
+    from those medians. A verdict therefore only depends on the
+    2 * (window - 1) minutes before it. Each call judges the minutes not
+    seen before, including late or out-of-order ones, and every minute whose
+    window they changed. Only that segment and its context are evaluated.
+    The evaluated and rejected minutes are remembered for the loaded
+    history only.
+    """
+
+    def __init__(self, window=spike_window_minutes, threshold=spike_threshold):
+        self.window = window
+        self.threshold = threshold
+        self.min_periods = window // 2 + 1
+        self.reach = 2 * (window - 1)   # minutes before a minute that its verdict depends on
+        self._seen = np.empty(0, dtype=np.int64)      # ns times of the evaluated minutes
+        self._rejected = np.empty(0, dtype=np.int64)  # ns times of rejected minutes
+
+    def evaluate(self, values, start=0):
+        """Keep flags for rows `start:` of `values` (rows x components), each judged on its trailing window."""
+        frame = pd.DataFrame(values)
+        median = frame.rolling(self.window, min_periods=self.min_periods).median()
+        deviation = (frame - median).abs()
+        mad = deviation.rolling(self.window, min_periods=self.min_periods).median()
+        spike = (deviation > self.threshold * 1.4826 * mad) & (mad > 0)
+        return ~spike.to_numpy()[start:].any(axis=1)
+
+    def filter(self, data, components):
+        if not data["DATETIME"].is_monotonic_increasing:
+            data = data.sort_values("DATETIME")
+        keys = data["DATETIME"].values.astype("datetime64[ns]").view(np.int64)
+        if len(keys) == 0:
+            return data
+        new = np.flatnonzero(~np.isin(keys, self._seen, assume_unique=True))
+        if len(new):
+            # a minute's verdict changes when any minute within `reach` before it is new
+            reach = self.reach
+            changed = np.zeros(len(keys) + 1, dtype=np.int64)
+            np.add.at(changed, new, 1)
+            np.add.at(changed, np.minimum(new + reach + 1, len(keys)), -1)
+            rows = np.flatnonzero(np.cumsum(changed[:-1]) > 0)
+            start = max(rows[0] - reach, 0)
+            values = data[components].to_numpy(dtype=float)[start:rows[-1] + 1]
+            flags = self.evaluate(values)[rows - start]
+            judged = keys[rows]
+            kept = self._rejected[(self._rejected >= keys[0]) & ~np.isin(self._rejected, judged)]
+            self._rejected = np.union1d(kept, judged[~flags])
+            self._seen = keys.copy()
+        if len(self._rejected) == 0:
+            return data
+        return data[~np.isin(keys, self._rejected)]
+
+spike_filter = SpikeFilter()
 
 def preprocess_data(data, components):
     if data.empty:
         return data
-    numeric_data = data[components].select_dtypes(include=np.number)
-    if not numeric_data.empty:
-        z_scores = numeric_data.apply(lambda x: zscore(x, nan_policy='omit') if x.std(skipna=True) > 0 else np.zeros_like(x))
-        valid_mask = (np.abs(z_scores) <= 2.5).all(axis=1)
-        return data[valid_mask]
-    return data
+    return spike_filter.filter(data, list(components))
 
 def time_to_float(dt_series):
     if dt_series.empty:
         return np.array([])
     return (dt_series.dt.tz_convert("UTC") - pd.Timestamp("1970-01-01", tz='UTC')) // pd.Timedelta('1s')
 
+K_THRESHOLDS = np.array([0, 5, 10, 20, 40, 70, 120, 200, 330, 500])
+BLOCK_SECONDS = 10800
+
+def k_from_variation(variations, k9):
+    """K for each 3-hour range (nT) on the scale with K9 lower limit `k9`; K0 is reported as 0.25."""
+    thresholds = K_THRESHOLDS * k9 / 500.0
+    k_values_indices = np.searchsorted(thresholds, variations, side='right') - 1
+    k_values = np.clip(k_values_indices, 0, 9).astype(float)
+    k_values[k_values == 0] = 0.25
+    return k_values
+
 def calculate_k_index(minute_time_float, minute_comp_x, minute_comp_y, k9):
     if len(minute_time_float) == 0:
         return np.array([]), np.array([])
@@ -132,52 +172,224 @@ def calculate_k_index(minute_time_float, minute_comp_x, minute_comp_y, k9):
         variation = max(np.ptp(minute_comp_x[mask]), np.ptp(minute_comp_y[mask])) if np.sum(mask) > 1 else 0
         variations.append(variation)
         timestamps_float.append(day_seconds_start_utc + block_idx * 10800 + 5400)
-    thresholds = np.array([0, 5, 10, 20, 40, 70, 120, 200, 330, 500]) * k9 / 500.0
-    k_values_indices = np.searchsorted(thresholds, variations, side='right') - 1
-    k_values = np.clip(k_values_indices, 0, 9).astype(float)
-    k_values[k_values == 0] = 0.25
+    k_values = k_from_variation(variations, k9)
     return np.array(k_values), np.array(timestamps_float)
 
+class KNowcaster:
+    """Provisional K of the open 3-hour block, updated as minutes arrive.
+
+    A block only gains minutes while it is open, so its X/Y ranges are kept
+    as running minima and maxima: each new minute costs O(1) and no window
+    needs a deque. A minute of a later block closes the open one and reports
+    its final K. Minutes at or before the newest one seen are ignored, so
+    overlapping reads are harmless. NaN components are skipped.
+    """
+
+    def __init__(self, k9=k9_limit):
+        self.k9 = k9
+        self.block = None              # open block: seconds since the epoch // BLOCK_SECONDS
+        self.low = np.full(2, np.nan)  # running min of X, Y
+        self.high = np.full(2, np.nan)
+        self.count = 0
+        self.last = None               # newest minute folded in (s)
+
+    def _result(self, final):
+        spread = self.high - self.low
+        variation = np.nanmax(spread) if self.count > 1 and not np.isnan(spread).all() else 0
+        k = k_from_variation([variation], self.k9)[0]
+        return self.block * BLOCK_SECONDS + BLOCK_SECONDS // 2, k, final
+
+    @property
+    def elapsed(self):
+        """Fraction of the open block covered up to the end of its newest minute."""
+        if self.block is None:
+            return 0.0
+        return min((self.last + 60 - self.block * BLOCK_SECONDS) / BLOCK_SECONDS, 1.0)
+
+    def provisional(self):
+        return self._result(False)[1] if self.block is not None else None
+
+    def update(self, times, x, y):
+        """Fold time-ordered minutes (s since the epoch, X, Y) in.
+
+        Returns (block mid-time s, K, final) for every block the minutes touched:
+        the closed ones with their final K and the open one last, provisionally.
+        """
+        times = np.asarray(times, dtype=np.float64)
+        values = np.column_stack((x, y)).astype(float)
+        if self.last is not None:
+            new = times > self.last
+            times, values = times[new], values[new]
+        if len(times) == 0:
+            return []
+        blocks = (times // BLOCK_SECONDS).astype(np.int64)
+        starts = np.flatnonzero(np.r_[True, blocks[1:] != blocks[:-1]])
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN runs
+            lows = np.fmin.reduceat(values, starts, axis=0)
+            highs = np.fmax.reduceat(values, starts, axis=0)
+        counts = np.diff(np.append(starts, len(times)))
+        results = []
+        for block, low, high, count in zip(blocks[starts], lows, highs, counts):
+            if block == self.block:
+                self.low, self.high = np.fmin(self.low, low), np.fmax(self.high, high)
+                self.count += count
+                continue
+            if self.block is not None:
+                results.append(self._result(True))
+            self.block, self.low, self.high, self.count = block, low, high, count
+        self.last = times[-1]
+        results.append(self._result(False))
+        return results
+
+class IagaTail:
+    """Rows appended to an IAGA-2002 file (or to the file a callable names) since the last read.
+
+    Only complete lines are consumed. A new path or a file that shrank is
+    read again from the start.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._offset = 0
+        self._fields = None
+
+    def read(self):
+        path = self.path() if callable(self.path) else self.path
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return pd.DataFrame()
+        if path != self._file or size < self._offset:
+            self._file, self._offset, self._fields = path, 0, None
+        with open(path, 'rb') as f:
+            f.seek(self._offset)
+            chunk = f.read(size - self._offset)
+        chunk = chunk[:chunk.rfind(b'\n') + 1]
+        lines = [line.strip() for line in chunk.decode('utf-8', errors='ignore').splitlines() if line.strip()]
+        start = 0
+        if self._fields is None:
+            header = next((i for i, line in enumerate(lines)
+                           if line.startswith("DATE") and "TIME" in line and "DOY" in line), None)
+            if header is None:
+                return pd.DataFrame()   # header not downloaded yet; read from the start next time
+            self._fields = [field.strip().replace('|', '') for field in lines[header].split()]
+            start = header + 1
+        self._offset += len(chunk)
+        if not all(c in self._fields for c in ['X', 'Y', 'Z']) or start >= len(lines):
+            return pd.DataFrame()
+        data = pd.read_csv(io.StringIO('\n'.join(lines[start:])), names=self._fields, sep=r"\s+",
+                           na_values=[99999.00, 99999.9])
+        data["DATETIME"] = pd.to_datetime(data["DATE"].astype(str) + " " + data["TIME"].astype(str),
+                                          errors='coerce', utc=True)
+        data = data.dropna(subset=["DATETIME"])
+        for comp in ['X', 'Y', 'Z']:
+            data[comp] = pd.to_numeric(data[comp], errors='coerce')
+        return data[["DATETIME", 'X', 'Y', 'Z']]
+
 # promethus expose
 def expose_k_index(k_values, station_name="ENT"):
     if len(k_values) > 0:
         k_index_gauge.labels(station=station_name).set(float(k_values[-1]))
 
-def main_loop():
-    while True:
-        try:
-            logging.info("Fetching data...")
-            files = get_ftp_files()
-            if not files:
-                time.sleep(update_interval_minutes * 60)
-                continue
+def today_iaga_file():
+    return os.path.join(temp_dir, f"{station_code}{datetime.now(timezone.utc):%Y%m%d}pmin.min")
 
-            all_data, components, station_name = pd.DataFrame(), None, station_code.upper()
-            for file_path in files:
-                data, comps, name = read_iaga2002(file_path)
-                if not data.empty:
-                    all_data = pd.concat([all_data, data], ignore_index=True)
-                    if components is None:
-                        components, station_name = comps, name
+def iaga_files():
+    return sorted(glob.glob(os.path.join(temp_dir, f"{station_code}*pmin.min")))[-len_days:]
 
-            if all_data.empty:
-                time.sleep(update_interval_minutes * 60)
-                continue
+def history_signature():
+    """UTC date and (path, size) of the closed days' files; a change means the K history must be recomputed.
+
+    Today's file is left out: the minutes appended to it are nowcast. Re-downloads
+    that leave a file's size unchanged do not count.
+    """
+    today = today_iaga_file()
+    files = tuple((path, os.path.getsize(path)) for path in iaga_files() if path != today)
+    return datetime.now(timezone.utc).date(), files
+
+def update_k_index(max_workers=None):
+    files = iaga_files()
+    with instrumentation.stage("kindex", "read") as timed:
+        all_data, components, station_name = read_iaga2002_file_set(files, max_workers=max_workers)
+        timed.rows = len(all_data)
+        timed.bytes = sum(os.path.getsize(path) for path in files)
+    if all_data.empty:
+        logging.warning("No valid data processed")
+        return
 
-            all_data = preprocess_data(all_data, components)
-            times_float = time_to_float(all_data["DATETIME"])
-            comp_x, comp_y = all_data[components[0]].values, all_data[components[1]].values
-            k_indices, k_times = calculate_k_index(times_float, comp_x, comp_y, k9_limit)
+    with instrumentation.stage("kindex", "spike_filter", rows=len(all_data)):
+        all_data = preprocess_data(all_data, components)
+    with instrumentation.stage("kindex", "k_index", rows=len(all_data)):
+        times_float = time_to_float(all_data["DATETIME"])
+        comp_x, comp_y = all_data[components[0]].values, all_data[components[1]].values
+        k_indices, k_times = calculate_k_index(times_float, comp_x, comp_y, k9_limit)
 
-            expose_k_index(k_indices, station_name)
-            logging.info(f"K-index exposed for {station_name}: {k_indices[-1] if len(k_indices) else 'N/A'}")
+    with instrumentation.stage("kindex", "export", rows=len(k_indices)):
+        expose_k_index(k_indices, station_name)
+        # the current 3-hour block is recomputed every update, so its bucket is replaced
+        query_api.rollups.add(station_name, "K_index", (np.asarray(k_times) * 1e9).astype(np.int64), 0, k_indices,
+                              replace=True)
+        # the nowcaster continues from the open block of the recomputed history
+        with nowcast_lock:
+            nowcaster.update(times_float, comp_x, comp_y)
+            expose_nowcast(station_name)
+    instrumentation.observe_epoch("kindex", station_name, all_data["DATETIME"].max())
+    logging.info(f"K-index exposed for {station_name}: {k_indices[-1] if len(k_indices) else 'N/A'}")
 
-            time.sleep(update_interval_minutes * 60)
-        except Exception as e:
-            logging.error(f"Error in main loop: {e}")
-            time.sleep(60)
+# streaming nowcast: today's file is tailed and only its new minutes are processed
+nowcaster = KNowcaster()
+nowcast_lock = threading.Lock()   # the history and nowcast stages both update the nowcaster
+iaga_tail = IagaTail(today_iaga_file)
+nowcast_filter = SpikeFilter()
+_nowcast_context = pd.DataFrame()
+
+def expose_nowcast(station_name="ENT"):
+    # called with nowcast_lock held
+    k = nowcaster.provisional()
+    if k is not None:
+        k_index_gauge.labels(station=station_name).set(k)
+        k_provisional_gauge.labels(station=station_name).set(k)
+        k_elapsed_gauge.labels(station=station_name).set(nowcaster.elapsed)
+
+def nowcast_k_index(station_name=station_code.upper()):
+    """Fold the minutes appended to today's file into the open block's K; returns the blocks touched."""
+    global _nowcast_context
+    new = iaga_tail.read()
+    if new.empty:
+        return []
+    with instrumentation.stage("kindex", "nowcast", rows=len(new)):
+        # the spike filter judges each minute on the raw minutes before it
+        raw = pd.concat([_nowcast_context, new]) if len(_nowcast_context) else new
+        raw = raw.drop_duplicates("DATETIME", keep="last").sort_values("DATETIME")
+        _nowcast_context = raw.tail(nowcast_filter.reach)
+        data = nowcast_filter.filter(raw, ['X', 'Y', 'Z'])
+        with nowcast_lock:
+            results = nowcaster.update(time_to_float(data["DATETIME"]).to_numpy(), data['X'].values,
+                                       data['Y'].values)
+            if results:
+                expose_nowcast(station_name)
+    if results:
+        times, k_values = zip(*[(t, k) for t, k, _ in results])
+        query_api.rollups.add(station_name, "K_index", (np.asarray(times) * 10**9).astype(np.int64), 0,
+                              np.asarray(k_values), replace=True)
+        instrumentation.observe_epoch("kindex", station_name, new["DATETIME"].max())
+    return results
+
+def main_loop():
+    # Files are fetched every update interval. The K history is recomputed when a closed day's file
+    # arrives or changes and when the UTC day rolls over (the first poll fires too); in between only
+    # the minutes appended to today's file are folded into the nowcast
+    scheduler = Scheduler()
+    scheduler.add("kindex_fetch", get_ftp_files, [IntervalTrigger(update_interval_minutes * 60)])
+    scheduler.add("kindex", update_k_index, [ValueTrigger(history_signature, poll_seconds=30)],
+                  run_at_start=False)
+    scheduler.add("kindex_nowcast", nowcast_k_index, [TailTrigger(today_iaga_file)], debounce=2, run_at_start=False)
+    scheduler.run_forever()
 
 if __name__ == "__main__":
+    profiler.install()
     start_http_server(8000)
     logging.info("Prometheus exporter started at http://localhost:8000/metrics")
     main_loop()
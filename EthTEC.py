@@ -2,14 +2,14 @@
 
 import numpy as np
 import pandas as pd
-import matplotlib
-matplotlib.use('Agg')  # Use a non-interactive backend for running as a service
-import matplotlib.pyplot as plt
-from matplotlib.path import Path
 from datetime import datetime, date, timedelta, timezone # <-- MODIFIED: import timezone
 import requests
 import time
 import os
+import functools
+from scheduler import IntervalTrigger, Scheduler, ValueTrigger
+import instrumentation
+from profiling import profiler
 
 def main():
     print("EthTEC Auto-Refresh System Initialized")
@@ -17,116 +17,194 @@ def main():
     # Create the 'assets' directory if it doesn't exist
     assets_dir = 'assets'
     os.makedirs(assets_dir, exist_ok=True)
+
+    # Tiled high-resolution TEC (zoomable pyramid) next to the overview PNG
+    from concurrent.futures import ProcessPoolExecutor
+    from tile_server import TecTileServer
+    tile_pool = ProcessPoolExecutor()
+    tile_server = TecTileServer().start()
+    
+    def refresh():
+        # Get current UTC time using the modern, timezone-aware method
+        now = datetime.now(timezone.utc)
+        render_tec_products(now, f10p7_trigger.value, tile_pool, tile_server, assets_dir)
+
+    def current_f10p7():
+        today = datetime.now(timezone.utc)
+        return getF10p7N(today.year, today.month, today.day)
+
+    # The map depends on the hour (refreshed every minute) and on F10.7 (polled hourly);
+    # the first map is drawn as soon as F10.7 is known, or after a minute without it
+    f10p7_trigger = ValueTrigger(current_f10p7, poll_seconds=3600)
+    scheduler = Scheduler()
+    scheduler.add('ethtec', refresh, [IntervalTrigger(60), f10p7_trigger], debounce=0.0, retry_seconds=60,
+                  run_at_start=False)
+    scheduler.run_forever()
+
+# The tiled model is re-evaluated once per bucket of TILE_MINUTES (model hour), or when F10.7 changes;
+# the assimilation increments are re-applied to it whenever the ISMR residuals change
+TILE_MINUTES = 15
+_tiles = {'model': None, 'published': None}   # (model key, model pyramid), key of the served pyramid
+
+
+@functools.lru_cache(maxsize=None)
+def _map_layers():
+    """Geomagnetic equator, border and GNSS stations drawn on TEC_Map.png (read once; they are static)."""
+    gmea = pd.read_csv('geomagnetic_equator.txt', sep='\t', skiprows=1, header=None, names=['lon', 'lat'])
+    coast = pd.read_csv('Ethiopia_border.txt', sep=',')
+    GNSS = pd.read_csv('GNSS_Stn.txt', sep=',')
+    return gmea, coast, GNSS
+
+
+def render_tec_products(now, f10p7, tile_pool, tile_server, assets_dir='assets'):
+    """Draw TEC_Map.png and publish the tiled TEC pyramid for time `now` (UTC)."""
+    import tec_tiles  # imported here: tec_tiles imports compute_tec from this module
+    from tec_assimilation import assimilator
+    # matplotlib is imported by the first render only, keeping `import EthTEC` cheap at startup
+    import matplotlib
+    matplotlib.use('Agg')  # Use a non-interactive backend for running as a service
+    import matplotlib.pyplot as plt
+    from matplotlib.path import Path
+    from mpl_toolkits.axes_grid1 import make_axes_locatable
+    print(f"\nProcessing TEC data for {now.strftime('%Y-%m-%d %H:%M:%S')} UTC")
+    
+    # Time parameters
+    year = now.year 
+    month = now.month
+    day_of_month = now.day
+    hour = now.hour + now.minute/60
+    longres = .1
+    latres = .1
+    
+    # Calculate day of year
+    doy = (date(year, month, day_of_month) - date(year, 1, 1)).days + 1
+    
+    # Solar data is polled separately, not on every refresh
+    if f10p7 is None:
+        print("Warning: Using default F10.7 value (100.0)")
+        f10p7 = 100.0
     
-    while True:
-        try:
-            # Get current UTC time using the modern, timezone-aware method
-            now = datetime.now(timezone.utc) # <-- CORRECTED: Replaced utcnow()
-            print(f"\nProcessing TEC data for {now.strftime('%Y-%m-%d %H:%M:%S')} UTC")
-            
-            # Time parameters
-            year = now.year 
-            month = now.month
-            day_of_month = now.day
-            hour = now.hour + now.minute/60
-            longres = .1
-            latres = .1
-            
-            # Calculate day of year
-            doy = (date(year, month, day_of_month) - date(year, 1, 1)).days + 1
-            
-            # Get solar data
-            f10p7 = getF10p7N(year, month, day_of_month)
-            if f10p7 is None:
-                print("Warning: Using default F10.7 value (100.0)")
-                f10p7 = 100.0
-            
-            # --- Data Processing ---
-            long_start, long_end = 33, 48
-            lat_start, lat_end = 3, 15
-            long = np.arange(long_start, long_end + longres, longres)
-            lat = np.arange(lat_start, lat_end + latres, latres)
-            long2, lat2 = np.meshgrid(long, lat)
-            szl, szll = long2.shape, long2.size
-            LTHourm = hour + long2.ravel() / 15
-            DOYs = np.sin((2 * np.pi * doy) / 365.25)
-            DOYc = np.cos((2 * np.pi * doy) / 365.25)
-            LTHoursm = np.sin((2 * np.pi * LTHourm) / 24)
-            LTHourcm = np.cos((2 * np.pi * LTHourm) / 24)
-            inputs = np.column_stack([np.full(szll, DOYc), np.full(szll, DOYs), LTHourcm, LTHoursm, long2.ravel(), lat2.ravel(), np.full(szll, f10p7)])
-            TEC = net32D(inputs)
-            TEC[TEC < 0] = 0
-            TECm = TEC.reshape(szl)
-            gmea = pd.read_csv('geomagnetic_equator.txt', sep='\t', skiprows=1, header=None, names=['lon', 'lat'])
-            coast = pd.read_csv('Ethiopia_border.txt', sep=',')
-            GNSS = pd.read_csv('GNSS_Stn.txt', sep=',')
-            points = np.column_stack((long2.ravel(), lat2.ravel()))
-            polygon = Path(np.column_stack((coast['Lon'].values, coast['Lat'].values)))
-            TECm.ravel()[~polygon.contains_points(points)] = np.nan
-            f_L1 = 1575.42e6
-            k_L1 = 40.3e16 / f_L1**2
-            
-            # --- Plotting ---
-            plt.close('all')
-            vmin = round(np.nanmin(TECm), 0)-10 
-            vmax =round(np.nanmax(TECm), 0)+10
-            fig = plt.figure(figsize=(11, 7), facecolor='black')
-            ax = fig.add_subplot(111, facecolor='white')
-            mesh = ax.pcolormesh(long2, lat2, TECm, shading='auto', cmap='jet', vmin=vmin, vmax=vmax)
-            from mpl_toolkits.axes_grid1 import make_axes_locatable
-            divider = make_axes_locatable(ax)
-            colorbar_axes = divider.append_axes('right', size="8%", pad=0.7)
-            cbar = plt.colorbar(mesh, cax=colorbar_axes)
-            cbar.set_label(' Vertical TEC (TECU)', fontsize=16, color='white')
-            cbar.ax.yaxis.set_label_position('left')
-            cbar.ax.yaxis.set_tick_params(color='white')
-            tec_ticks = np.linspace(vmin, vmax, 6)
-            cbar.set_ticks(tec_ticks)
-            cbar.set_ticklabels([f"{tick:.0f}" for tick in tec_ticks], color='white', fontsize=14)
-            cbar_ax2 = cbar.ax.twinx()
-            l1_ticks = k_L1 * np.linspace(vmin, vmax, 6)
-            cbar_ax2.set_ylim(cbar.ax.get_ylim())
-            cbar_ax2.set_yticks(tec_ticks)
-            cbar_ax2.set_yticklabels([f"{val:.1f}" for val in l1_ticks], color='white', fontsize=14)
-            cbar_ax2.set_ylabel("Ionospheric Range Error (m)", fontsize=16, color='white')
-            ax.plot(coast['Lon'], coast['Lat'], 'k', linewidth=2)
-            ax.plot(gmea['lon'], gmea['lat'], 'k--', linewidth=2)
-            if len(GNSS) > 1:
-                ax.scatter(GNSS['lon'][1], GNSS['lat'][1], c='r', s=100)
-                ax.text(GNSS['lon'][1] - 0.3, GNSS['lat'][1] - 0.5, GNSS['Stn'][1], fontsize=11, weight='bold')
-            timestamp = now.strftime('%Y-%m-%d %H:%M UTC')
-            
-            fname = os.path.join(assets_dir, 'TEC_Map.png')
-            
-            ax.set_xlim([long_start, long_end])
-            ax.set_ylim([lat_start, lat_end])
-            ax.set_xlabel('Longitude (Degree)')
-            ax.set_ylabel('Latitude (Degree)')
-            ax.set_title(f'GPS L1 Range Error From TEC {timestamp}', fontsize=18, color='white')
-            ax.axis('off')
-            ax.grid(False)
-            
-            plt.savefig(fname, dpi=150, bbox_inches='tight', facecolor='black')
-            print(f"Saved image to: {fname}")
-            
-            plt.close(fig)
-            
-            next_run = now + timedelta(minutes=1)
-            print(f"Next update at: {next_run.strftime('%H:%M UTC')}")
-            # Use the corrected 'now' for sleep calculation as well
-            sleep_time = max(0, (next_run - datetime.now(timezone.utc)).total_seconds())
-            time.sleep(sleep_time)
-            
-        except Exception as e:
-            print(f"Error encountered in EthTEC.py: {str(e)}")
-            print("Retrying in 1 minute...")
-            time.sleep(60)
+    # --- Data Processing ---
+    long_start, long_end = 33, 48
+    lat_start, lat_end = 3, 15
+    long = np.arange(long_start, long_end + longres, longres)
+    lat = np.arange(lat_start, lat_end + latres, latres)
+    long2, lat2 = np.meshgrid(long, lat)
+    with instrumentation.stage('ethtec', 'model', rows=long2.size):
+        TECm = compute_tec(long2, lat2, hour, doy, f10p7)
+    # Correct net32D with the recent ISMR VTEC (residuals fed by the ISMR pipeline)
+    assimilator.f10p7 = f10p7
+    TECm = assimilator.analysis(long, lat, TECm, now=int(now.timestamp() * 10**9))
+    gmea, coast, GNSS = _map_layers()
+    points = np.column_stack((long2.ravel(), lat2.ravel()))
+    polygon = Path(np.column_stack((coast['Lon'].values, coast['Lat'].values)))
+    TECm.ravel()[~polygon.contains_points(points)] = np.nan
+    f_L1 = 1575.42e6
+    k_L1 = 40.3e16 / f_L1**2
+    
+    # --- Plotting ---
+    with instrumentation.stage('ethtec', 'plot'):
+        plt.close('all')
+        vmin = round(np.nanmin(TECm), 0)-10 
+        vmax =round(np.nanmax(TECm), 0)+10
+        fig = plt.figure(figsize=(11, 7), facecolor='black')
+        ax = fig.add_subplot(111, facecolor='white')
+        mesh = ax.pcolormesh(long2, lat2, TECm, shading='auto', cmap='jet', vmin=vmin, vmax=vmax)
+        divider = make_axes_locatable(ax)
+        colorbar_axes = divider.append_axes('right', size="8%", pad=0.7)
+        cbar = plt.colorbar(mesh, cax=colorbar_axes)
+        cbar.set_label(' Vertical TEC (TECU)', fontsize=16, color='white')
+        cbar.ax.yaxis.set_label_position('left')
+        cbar.ax.yaxis.set_tick_params(color='white')
+        tec_ticks = np.linspace(vmin, vmax, 6)
+        cbar.set_ticks(tec_ticks)
+        cbar.set_ticklabels([f"{tick:.0f}" for tick in tec_ticks], color='white', fontsize=14)
+        cbar_ax2 = cbar.ax.twinx()
+        l1_ticks = k_L1 * np.linspace(vmin, vmax, 6)
+        cbar_ax2.set_ylim(cbar.ax.get_ylim())
+        cbar_ax2.set_yticks(tec_ticks)
+        cbar_ax2.set_yticklabels([f"{val:.1f}" for val in l1_ticks], color='white', fontsize=14)
+        cbar_ax2.set_ylabel("Ionospheric Range Error (m)", fontsize=16, color='white')
+        ax.plot(coast['Lon'], coast['Lat'], 'k', linewidth=2)
+        ax.plot(gmea['lon'], gmea['lat'], 'k--', linewidth=2)
+        if len(GNSS) > 1:
+            ax.scatter(GNSS['lon'][1], GNSS['lat'][1], c='r', s=100)
+            ax.text(GNSS['lon'][1] - 0.3, GNSS['lat'][1] - 0.5, GNSS['Stn'][1], fontsize=11, weight='bold')
+        timestamp = now.strftime('%Y-%m-%d %H:%M UTC')
+
+        fname = os.path.join(assets_dir, 'TEC_Map.png')
+
+        ax.set_xlim([long_start, long_end])
+        ax.set_ylim([lat_start, lat_end])
+        ax.set_xlabel('Longitude (Degree)')
+        ax.set_ylabel('Latitude (Degree)')
+        ax.set_title(f'GPS L1 Range Error From TEC {timestamp}', fontsize=18, color='white')
+        ax.axis('off')
+        ax.grid(False)
+
+        plt.savefig(fname, dpi=150, bbox_inches='tight', facecolor='black')
+        print(f"Saved image to: {fname}")
+
+        plt.close(fig)
+
+    stamp = int(now.timestamp() * 10**9)
+    bucket = int(hour * 60) // TILE_MINUTES
+    model_key = (doy, bucket, f10p7)
+    key = (model_key, assimilator.version(stamp))
+    if key == _tiles['published']:
+        return
+    with instrumentation.stage('ethtec', 'tiles') as timed:
+        if _tiles['model'] is None or _tiles['model'][0] != model_key:
+            border, equator, stations = tec_tiles.load_geometry()
+            model = tec_tiles.build_tec_pyramid(bucket * TILE_MINUTES / 60, doy, f10p7, border, equator, stations,
+                                                executor=tile_pool)
+            _tiles['model'] = (model_key, model)
+        pyramid = _assimilate_tiles(_tiles['model'][1], stamp, now.strftime('%Y-%m-%dT%H:%M:%SZ'))
+        pyramid.save(os.path.join(assets_dir, 'tec_tiles'))
+        tile_server.publish(pyramid)
+        _tiles['published'] = key
+        timed.rows = sum(len(t) for t in pyramid.levels.values())
+        print(f"Saved {timed.rows} TEC tiles")
+
+
+def _assimilate_tiles(model, now, epoch):
+    """The model pyramid with the current assimilation increment added to every tile."""
+    import tec_tiles
+    from tec_assimilation import assimilator
+
+    pyramid = tec_tiles.TecPyramid(model.domain, model.tile_deg, model.tile_px, epoch)
+    for z, tiles in model.levels.items():
+        for (tx, ty), values in tiles.items():
+            long, lat = tec_tiles.tile_axes(model.bounds(z, tx, ty), model.tile_px)
+            increment = assimilator.increment(long, lat, now)
+            if increment is not None:
+                values = np.maximum(values + increment, 0).astype(np.float32)
+            pyramid.add(z, tx, ty, values)
+    return pyramid
+
+def compute_tec(long2, lat2, hour, doy, f10p7):
+    """Evaluate net32D on a lon/lat grid and return TEC (TECU) with the grid's shape.
+
+    `hour` (UTC) and `doy` are scalars, or arrays shaped like the grid for scattered points.
+    """
+    szl, szll = long2.shape, long2.size
+    LTHourm = np.ravel(hour) + long2.ravel() / 15
+    DOYs = np.sin((2 * np.pi * np.ravel(doy)) / 365.25)
+    DOYc = np.cos((2 * np.pi * np.ravel(doy)) / 365.25)
+    LTHoursm = np.sin((2 * np.pi * LTHourm) / 24)
+    LTHourcm = np.cos((2 * np.pi * LTHourm) / 24)
+    inputs = np.column_stack([np.full(szll, DOYc), np.full(szll, DOYs), LTHourcm, LTHoursm, long2.ravel(), lat2.ravel(), np.full(szll, f10p7)])
+    TEC = net32D(inputs)
+    TEC[TEC < 0] = 0
+    return TEC.reshape(szl)
 
 # (getF10p7N and net32D functions remain unchanged)
 def getF10p7N(year,month,day):
     url='https://services.swpc.noaa.gov/text/27-day-outlook.txt'
     try:
-        response=requests.get(url,timeout=10)
+        with instrumentation.stage('ethtec', 'f10p7_fetch') as timed:
+            response=requests.get(url,timeout=10)
+            timed.bytes = len(response.content)
         response.raise_for_status()
         lines=response.text.splitlines()
         target_date=datetime(year,month,day).strftime('%Y %b %d')
@@ -149,4 +227,5 @@ def net32D(X):
     X=X.T;N=X.shape[1];yy=X-xoffset_in.reshape(-1,1);yy=yy*gain_in.reshape(-1,1);Xp1=yy+ymin_in;n1=np.tile(b1.reshape(-1,1),(1,N))+LW1@Xp1;a1=2/(1+np.exp(-2*n1))-1;n2=np.tile(b2,(1,N))+LW2@a1;a2=2/(1+np.exp(-2*n2))-1;xx2=a2-ymin_out;xx2=xx2/gain_out;Y=xx2+xoffset_out;return Y.T
 
 if __name__ == "__main__":
+    profiler.install()
     main()
@@ -1,40 +1,47 @@
 ######Daniel Chekole#########
 import os
 import ftplib
-import gzip
-import shutil
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 import time
 from datetime import datetime, timedelta
 import glob
 import subprocess
-import matplotlib
-matplotlib.use('Agg')  # Use a non-interactive backend like 'Agg'
+# matplotlib is imported (with the Agg backend) by plot_engine on the first plot
 #matplotlib.use('TkAgg')  # or 'Qt5Agg'
 #os.environ["QT_QPA_PLATFORM"] = "xcb"  # Use X11 instead of Wayland
 
 from prometheus_client import start_http_server, Gauge
+from scheduler import FileTrigger, IntervalTrigger, Scheduler
+import constellations
+import instrumentation
+import ismr_archive
+import quality_filter
+from profiling import profiler
+from ismr_store import ConstellationRings
 
 # Define Prometheus metrics
-s4_index_gauge = Gauge('s4_index', 'S4 scintillation index', ['svid'])
-vtec_gauge = Gauge('vtec', 'Vertical Total Electron Content', ['svid'])
-phi60_gauge = Gauge('phi60', 'Sigma Phi (60s detrended)', ['svid'])
-
-# Start Prometheus server on port 8000
-start_http_server(8000)
-print("Prometheus exporter running on http://localhost:8000/metrics")
+s4_index_gauge = Gauge('s4_index', 'S4 scintillation index', ['station', 'constellation', 'svid'])
+vtec_gauge = Gauge('vtec', 'Vertical Total Electron Content', ['station', 'constellation', 'svid'])
+phi60_gauge = Gauge('phi60', 'Sigma Phi (60s detrended)', ['station', 'constellation', 'svid'])
 
 
 # FTP server credentials
 ftp_server = "ftp.gnss.sansa.org.za"
 username = "ngiday"
 password = "j8dheeZJ"
+# Receiver served by this script (see stations.py for the multi-station pipeline)
+station_code = "ENTG"
+ismr_ftp_dir = "/home/ethiopiagnss/ENTGST1/R/ismr/{year}/{month}/{day}/"
 # Local directory for ISMR files
 local_dir = r"/home/space/Downloads/spaceWheatherFinal/spaceWheather/ismr/assets/"
 local_dir = os.path.join(os.getcwd(), "assets")
 os.makedirs(local_dir, exist_ok=True)
+retention_days = 8
+# Observations of the retained files, bounded by the retention window
+ismr_store = ConstellationRings(retention_days)
+ingested_files = set()
+_s4_renderer = None
 
 # Function to get the last three days
 def get_last_three_days():
@@ -45,20 +52,21 @@ def get_last_three_days():
          "day": (today - timedelta(days=i)).strftime("%d"),
          "yy": (today - timedelta(days=i)).strftime("%y"),
          "doy": (today - timedelta(days=i)).timetuple().tm_yday}
-        for i in range(8)  
+        for i in range(retention_days)  
     ]
 
 # Function to remove old ISMR files (older than the last three days)
-def remove_old_ismr_files():
+def remove_old_ismr_files(prefix=station_code, directory=None):
+    directory = directory or local_dir
     days_info = get_last_three_days()
     last_three_doys = {day["doy"] for day in days_info}
 
-    for filename in os.listdir(local_dir):
-        if filename.startswith("ENTG"):
+    for filename in os.listdir(directory):
+        if filename.startswith(prefix):
             try:
-                doy = int(filename[4:7])  # Extract DOY from filename
+                doy = int(filename[len(prefix):len(prefix) + 3])  # Extract DOY from filename
                 if doy not in last_three_doys:
-                    file_path = os.path.join(local_dir, filename)
+                    file_path = os.path.join(directory, filename)
                     os.remove(file_path)
                     #print(f"Removed old file: {file_path}")
             except ValueError:
@@ -70,7 +78,8 @@ def remove_old_ismr_files():
                     #print(f"Removed old ISMR file: {file_path}")
    
 # Function to download ISMR files
-def download_ismr_files():
+def download_ismr_files(ftp_dir=ismr_ftp_dir, directory=None):
+    directory = directory or local_dir
     days_info = get_last_three_days()[:3]  
     try:
         with ftplib.FTP(ftp_server) as ftp:
@@ -78,7 +87,7 @@ def download_ismr_files():
             print("Connected to FTP server.")
 
             for day_info in days_info:
-                folder = f"/home/ethiopiagnss/ENTGST1/R/ismr/{day_info['year']}/{day_info['month']}/{day_info['day']}/"
+                folder = ftp_dir.format(**day_info)
                 print(f"Checking folder: {folder}")
 
                 try:
@@ -87,39 +96,32 @@ def download_ismr_files():
 
                     for item in items:
                         if item.endswith(".ismr.gz"):
-                            local_file = item.replace(".gz", "")
-                            local_path = os.path.join(local_dir, local_file)
+                            # archives are kept compressed; read_ismr decompresses while parsing
+                            gz_path = os.path.join(directory, item)
 
-                            if os.path.exists(local_path):
-                                #print(f"File already exists: {local_file}. Skip downloading.")
+                            # an already extracted copy (older releases) counts as downloaded
+                            if os.path.exists(gz_path) or os.path.exists(gz_path[:-len(".gz")]):
                                 continue
 
-                            gz_path = local_path + ".gz"
-                            with open(gz_path, "wb") as f:
-                                ftp.retrbinary(f"RETR {item}", f.write)
+                            # hidden until complete, so file triggers never see a partial archive
+                            part_path = os.path.join(directory, f".{item}.part")
+                            with instrumentation.stage('s4', 'download') as timed:
+                                with open(part_path, "wb") as f:
+                                    ftp.retrbinary(f"RETR {item}", f.write)
+                                timed.bytes = os.path.getsize(part_path)
+                            os.replace(part_path, gz_path)
                             print(f"Downloaded: {item}")
 
-                            extract_gz(gz_path, local_path)
-
                 except ftplib.error_perm as e:
                     print(f"Failed to access folder {folder}: {e}")
 
     except Exception as e:
         print(f"FTP connection failed: {e}")
 
-# Function to extract .gz files
-def extract_gz(gz_path, target_path):
-    try:
-        with gzip.open(gz_path, 'rb') as f_in, open(target_path, 'wb') as f_out:
-            shutil.copyfileobj(f_in, f_out)
-        os.remove(gz_path)
-        print(f"Extracted: {target_path}")
-    except gzip.BadGzipFile:
-        print(f"Warning: Bad GZIP file detected for {gz_path}. Skip extraction.")
-
 
 ##########################read ISMR###############
-def read_ismr(filename, lat='9.11', lon='38.79', columns=None, Ipp=350, skiprows=None, dtype=None, elevation_mask=20):
+def read_ismr(filename, lat='9.11', lon='38.79', columns=None, Ipp=350, skiprows=None, dtype=None, elevation_mask=20,
+              systems=None):
     
     ismr_column = [
         'GPS_Week_Number', 'GPS_Time_Week', 'SVID', 'Value', 'Azimuth', 'Elevation',
@@ -151,209 +153,171 @@ def read_ismr(filename, lat='9.11', lon='38.79', columns=None, Ipp=350, skiprows
         ismr_column = columns
 
     try:
-        data = pd.read_csv(
-            filename,
-            names=ismr_column,
-            skiprows=skiprows,
-            dtype=str  
-        )
-        
-        # Convert numerical columns to proper types
-        numeric_cols = [
-            'GPS_Week_Number', 'GPS_Time_Week', 'SVID', 'Azimuth', 'Elevation', 
-            'Total_S4_Sig3', 'Correction_total_S4_Sig3', 'TEC_TOW', 
-            'Total_S4_Sig1', 'Correction_total_S4_Sig1', 'Total_S4_Sig2', 'Correction_total_S4_Sig2', 'Phi60_Sig1_60'
-        ]
-        
-        # Ensure all columns that should be numeric are converted
-        for col in numeric_cols:
-            data[col] = pd.to_numeric(data[col], errors='coerce')
-        
-        # elevation mask (>20 degrees)
-        data = data[data['Elevation'] >= elevation_mask]
-        
+        with instrumentation.stage('s4', 'parse') as timed:
+            data = pd.read_csv(
+                filename,
+                names=ismr_column,
+                skiprows=skiprows,
+                dtype=str  
+            )
+
+            # Convert numerical columns to proper types
+            numeric_cols = [
+                'GPS_Week_Number', 'GPS_Time_Week', 'SVID', 'Azimuth', 'Elevation', 
+                'Total_S4_Sig3', 'Correction_total_S4_Sig3', 'TEC_TOW', 
+                'Total_S4_Sig1', 'Correction_total_S4_Sig1', 'Total_S4_Sig2', 'Correction_total_S4_Sig2', 'Phi60_Sig1_60'
+            ]
+
+            # Ensure all columns that should be numeric (and those the quality rules read) are converted
+            for col in dict.fromkeys(numeric_cols + sorted(quality_filter.compiled(elevation_mask).columns)):
+                data[col] = pd.to_numeric(data[col], errors='coerce')
+
+            # constellations that are not ingested (`systems`, default constellations.INGEST) skip the geometry
+            data = constellations.select(data, systems)
+
+            timed.rows, timed.bytes = len(data), os.path.getsize(filename)
+
+        # elevation mask and the other quality rules, before any time or geometry work
+        with instrumentation.stage('s4', 'quality', rows=len(data)):
+            data = quality_filter.apply(data, elevation_mask, service='s4')
+
         # Convert GPS time to UTC datetime
-        data['Time'] = data.apply(lambda row: __weeksecondstoutc(row['GPS_Week_Number'], row['GPS_Time_Week']), axis=1)
-        data = data.set_index('Time')
+        with instrumentation.stage('s4', 'gps_time', rows=len(data)):
+            data['Time'] = __weeksecondstoutc(data['GPS_Week_Number'].to_numpy(), data['GPS_Time_Week'].to_numpy())
+            data = data.set_index('Time')
 
         # Compute S4 index
-        data['S4_index_1'] = np.sqrt(data['Total_S4_Sig1']**2 - data['Correction_total_S4_Sig1']**2)
-        data['S4_index'] = np.round(data['S4_index_1'] * 100) / 100
-        data['S4_index'][data['S4_index'] > 3] = np.nan
-
-        # Compute VTEC from STEC using provided formula
-        Re = 6371  # Mean Earth radius in km
-        hs = 350   # Thin-shell effective altitude in km
-        data['Sf'] = (1 - ((Re * np.cos(np.radians(data['Elevation']))) / (Re + hs))**2)**(-0.5)
-        data['VTEC'] = data['TEC_TOW'] / data['Sf']
+        with instrumentation.stage('s4', 's4_vtec', rows=len(data)):
+            data['S4_index_1'] = np.sqrt(data['Total_S4_Sig1']**2 - data['Correction_total_S4_Sig1']**2)
+            data['S4_index'] = np.round(data['S4_index_1'] * 100) / 100
+            data.loc[data['S4_index'] > 3, 'S4_index'] = np.nan
 
+            # Compute VTEC from STEC using provided formula
+            Re = 6371  # Mean Earth radius in km
+            hs = 350   # Thin-shell effective altitude in km
+            data['Sf'] = (1 - ((Re * np.cos(np.radians(data['Elevation']))) / (Re + hs))**2)**(-0.5)
+            data['VTEC'] = data['TEC_TOW'] / data['Sf']
 
         # Compute Ionospheric Pierce Point (IPP)
-        PHI = float(lat)
-        LAMBDA = float(lon)
-        ELEV = np.deg2rad(data['Elevation'])
-        AZI = np.deg2rad(data['Azimuth'])
-        RE = 6378136.3  # Earth radius in meters
-        IPP = Ipp * 1000  # Convert to meters
-        Iono_ht = (RE / (RE + IPP)) * np.cos(ELEV)
-        Shi_pp = (np.pi / 2) - ELEV - np.arcsin(Iono_ht)
-        Phi_pp = np.arcsin(np.sin(np.deg2rad(PHI)) * np.cos(Shi_pp) + np.cos(np.deg2rad(PHI)) * np.sin(Shi_pp) * np.cos(AZI))
-        Lambda_pp = np.deg2rad(LAMBDA) + np.arcsin(np.sin(Shi_pp) * np.sin(AZI) / np.cos(Phi_pp))
-        
-        data['Dlat_IPP'] = np.rad2deg(Phi_pp)
-        data['Dlong_IPP'] = np.rad2deg(Lambda_pp)
-        data['Stec'] = data['TEC_TOW']
-        
+        with instrumentation.stage('s4', 'ipp', rows=len(data)):
+            PHI = float(lat)
+            LAMBDA = float(lon)
+            ELEV = np.deg2rad(data['Elevation'])
+            AZI = np.deg2rad(data['Azimuth'])
+            RE = 6378136.3  # Earth radius in meters
+            IPP = Ipp * 1000  # Convert to meters
+            Iono_ht = (RE / (RE + IPP)) * np.cos(ELEV)
+            Shi_pp = (np.pi / 2) - ELEV - np.arcsin(Iono_ht)
+            Phi_pp = np.arcsin(np.sin(np.deg2rad(PHI)) * np.cos(Shi_pp) + np.cos(np.deg2rad(PHI)) * np.sin(Shi_pp) * np.cos(AZI))
+            Lambda_pp = np.deg2rad(LAMBDA) + np.arcsin(np.sin(Shi_pp) * np.sin(AZI) / np.cos(Phi_pp))
+
+            data['Dlat_IPP'] = np.rad2deg(Phi_pp)
+            data['Dlong_IPP'] = np.rad2deg(Lambda_pp)
+            data['Stec'] = data['TEC_TOW']
+
         return data[['SVID', 'S4_index', 'Dlat_IPP', 'Dlong_IPP', 'VTEC', 'Phi60_Sig1_60']]
     
     except Exception as e:
         print(f"Error processing {filename}: {str(e)}")
         return None
 def __weeksecondstoutc(gpsweek, gpsseconds):
-    """Convert GPS week and seconds to UTC time."""
-    import datetime
-    gpsweek = float(gpsweek)
-    gpsseconds = float(gpsseconds)
-    epoch = datetime.datetime(1980, 1, 6)
-    elapsed = datetime.timedelta(days=(gpsweek * 7), seconds=gpsseconds)
-    return epoch + elapsed
+    """Convert arrays of GPS week and seconds of week to UTC times (NaT where either is NaN)."""
+    # weeks and seconds are converted separately: weeks * 604800e9 ns is exact in float64
+    return (pd.Timestamp(1980, 1, 6) + pd.to_timedelta(gpsweek, unit='W')
+            + pd.to_timedelta(gpsseconds, unit='s'))
 
 
 def process_ismr_files():
-    all_data = []
-    input_pattern = os.path.join(local_dir, "*.ismr")
+    ismr_files = ismr_archive.list_files(local_dir)
 
-    for filepath in glob.glob(input_pattern):
-        data = read_ismr(filepath)
+    # Only files not seen before are parsed (a backlog in parallel); earlier ones already live in ismr_store
+    new_files = [filepath for filepath in ismr_files if filepath not in ingested_files]
+    for filepath, data in zip(new_files, ismr_archive.read_files(new_files, read_ismr)):
         if data is not None:
-            csv_filename = os.path.basename(filepath).replace('.ismr', '.csv')
-            csv_path = os.path.join(local_dir, csv_filename)
-            data.to_csv(csv_path, index=True)
-            all_data.append(data)
-
-            # Export metrics for each satellite (SVID)
-            for _, row in data.iterrows():
-                svid = str(row['SVID'])
-                if not np.isnan(row['S4_index']):
-                    s4_index_gauge.labels(svid=svid).set(row['S4_index'])
-                if not np.isnan(row['VTEC']):
-                    vtec_gauge.labels(svid=svid).set(row['VTEC'])
-                if not np.isnan(row['Phi60_Sig1_60']):
-                    phi60_gauge.labels(svid=svid).set(row['Phi60_Sig1_60'])
-
-    if all_data:
-        S4_pi = pd.concat(all_data)
-        S4_pi.sort_index(inplace=True)
+            with instrumentation.stage('s4', 'csv_write', rows=len(data)):
+                data.to_csv(ismr_archive.csv_path(filepath), index=True)
+            ismr_store.append(data)
+            ingested_files.add(filepath)
+
+            export_metrics(data, station_code)
+
+    ingested_files.intersection_update(ismr_files)
+    oldest_day = min(datetime(int(d["year"]), int(d["month"]), int(d["day"])) for d in get_last_three_days())
+    ismr_store.expire(oldest_day)
+
+    if len(ismr_store):
+        S4_pi = ismr_store.to_frame()
         merged_path = os.path.join(local_dir, 'S4_pi_roti.csv')
-        S4_pi.to_csv(merged_path)
+        with instrumentation.stage('s4', 'csv_write', rows=len(S4_pi)):
+            S4_pi.to_csv(merged_path)
         return S4_pi
     return pd.DataFrame()
 
-def plot_continuous_timeseries(S4_pi, bg_color='black', plot_bg='black'):
+def export_metrics(data, station):
+    """Set the per-SVID gauges to each satellite's latest valid S4, VTEC and sigma-phi."""
+    with instrumentation.stage('s4', 'export', rows=len(data)):
+        # groupby().last() skips NaN per column: the value a row-by-row loop would leave behind
+        latest = data.groupby('SVID')[['S4_index', 'VTEC', 'Phi60_Sig1_60']].last()
+        systems = constellations.index_of(latest.index.to_numpy())
+        for system, (svid, row) in zip(systems, latest.iterrows()):
+            labels = {'station': station, 'constellation': constellations.NAMES[system], 'svid': str(svid)}
+            if not np.isnan(row['S4_index']):
+                s4_index_gauge.labels(**labels).set(row['S4_index'])
+            if not np.isnan(row['VTEC']):
+                vtec_gauge.labels(**labels).set(row['VTEC'])
+            if not np.isnan(row['Phi60_Sig1_60']):
+                phi60_gauge.labels(**labels).set(row['Phi60_Sig1_60'])
+        constellations.count(data['SVID'].to_numpy(), 'ingested')
+    if len(data):
+        instrumentation.observe_epoch('s4', station, data.index.max())
+
+def plot_continuous_timeseries(S4_pi, bg_color='black', plot_bg='black', renderer=None):
+    global _s4_renderer
     # Ensure datetime index
     if not isinstance(S4_pi.index, pd.DatetimeIndex):
         S4_pi.index = pd.to_datetime(S4_pi.index)
 
 
-    # Filter GPS PRNs 1-32 and valid data
-    filtered_data = S4_pi[(S4_pi['SVID'].between(1, 32)) & 
+    # Plotted constellations (constellations.PLOT, GPS by default) with valid data
+    filtered_data = S4_pi[constellations.mask(S4_pi['SVID'].to_numpy(), constellations.PLOT) & 
                     (S4_pi['S4_index'].notna()) & 
                     (S4_pi['Phi60_Sig1_60'].notna())].copy()
     
     # Create time-ordered data
     filtered_data.sort_index(inplace=True)
-    
-    # Time range setup
-    fig, ax = plt.subplots(2, 1, figsize=(12, 9))
-    fig.patch.set_facecolor(bg_color)
-    for a in ax:
-        a.set_facecolor(plot_bg)
-    start_date = filtered_data.index.min().normalize()
-    end_date = filtered_data.index.max().normalize() + pd.Timedelta(days=1)
-    time_ticks = pd.date_range(start=start_date, end=end_date, freq='6H')
-    # ----------------- Plot 1: S4 Index -------------------
-    '''for prn in filtered_data['SVID'].unique():
-        prn_data = filtered_data[filtered_data['SVID'] == prn]
-        ax[0].scatter(prn_data.index, prn_data['S4_index'], s=5, label=f'PRN {prn}')
-    
-    ax[0].set_title('GPS S4 Scintillation Index (PRN 1-32)', fontsize=14)
-    ax[0].set_ylabel('S4 Index', fontsize=12)
-    ax[0].set_ylim(0, 1.2)
-    ax[0].legend(loc='upper right', ncol=4, fontsize=8)
-    ax[0].set_xticks(time_ticks)'''
-    
-    # S4 index scatter plot
-    colors = filtered_data['S4_index'].apply(lambda x: 'b' if x <= 0.5 else ('g' if x <= 0.8 else 'r'))
-    ax[0].scatter(filtered_data.index, filtered_data['S4_index'], c=colors, s=5)
-    ax[0].set_xlabel('Time (UT)', fontsize=18, color='white')
-    ax[0].set_ylabel('S4', fontsize=18, color='white')
-    ax[0].set_title('Amplitude Scintillation ', fontsize=18, fontweight='bold', color='white')
-    ax[0].set_xlim(start_date, end_date)
-    ax[0].set_ylim(0, 1.5)
-    ax[0].set_xticks(time_ticks)
-    ax[0].set_xticklabels([t.strftime('%H:%M') for t in time_ticks], rotation=0, color='white')
-    ax[0].tick_params(axis='x', labelsize=18, color='white')
-    ax[0].tick_params(axis='y', labelsize=18, color='white')
-    ax[0].tick_params(axis='both', labelsize='18', colors='white')
-    ax[0].grid(True, linestyle='--', linewidth=0.5, alpha=0.7)
-
-    # S4 legend
-    ax[0].scatter([], [], color='b', label='Low (S4 < 0.5)', s=40)
-    ax[0].scatter([], [], color='g', label='Moderate (0.5 < S4 < 0.8)', s=40)
-    ax[0].scatter([], [], color='r', label='Strong (S4 > 0.8)', s=40)
-    ax[0].legend(loc='upper right', fontsize=14)
 
-    
-    # ----------------- Plot 2: Sigma_Phi (60s detrended) -------------------
-    colors = filtered_data['Phi60_Sig1_60'].apply(lambda x: 'b' if x <= 0.4 else ('g' if x <= 0.7 else 'r'))
-    ax[1].scatter(filtered_data.index, filtered_data['Phi60_Sig1_60'], c=colors, s=5)
-    ax[1].set_xlabel('Time (UT)', fontsize=14)
-    ax[1].set_ylabel(r'$\sigma_{\phi} (1 min)$', fontsize=18, color='white')
-    ax[1].set_title('Phase Scintillation', fontsize=18, fontweight='bold', color='white')
-    ax[1].set_xlim(start_date, end_date)
-    ax[1].set_ylim(0, 1.5)
-    ax[1].set_xticks(time_ticks)
-    ax[1].set_xticklabels([t.strftime('%H:%M') for t in time_ticks], rotation=0,  color='white')
-    ax[1].tick_params(axis='x', labelsize=18, color='white')
-    ax[1].tick_params(axis='y', labelsize=18, color='white')
-    ax[1].tick_params(axis='both', labelsize='18', colors='white')
-    ax[1].grid(True, linestyle='--', linewidth=0.5, alpha=0.7)
-
-    # sigpi legend
-    ax[1].scatter([], [], color='b', label=r'Low ($\sigma_{\phi} < 0.4$)', s=40)
-    ax[1].scatter([], [], color='g', label=r'Moderate ($0.4 < \sigma_{\phi} < 0.7$)', s=40)
-    ax[1].scatter([], [], color='r', label=r'Strong ($\sigma_{\phi} > 0.7$)', s=40)
-
-    ax[1].legend(loc='upper right', fontsize=14)
-    # Add day labels
-    for mid in pd.date_range(start=start_date, end=end_date - pd.Timedelta(days=1), freq='D') + pd.Timedelta(hours=12):
-        ax[1].text(mid, -0.3, mid.strftime('%Y-%m-%d'), horizontalalignment='center', fontsize=18, color='white')
-
-    # Save figure
-    plt.tight_layout()
-    plt.savefig(os.path.join(local_dir, 'ENTG_S4_pi.png'), edgecolor='white', facecolor=fig.get_facecolor())
-    plt.close()
+    # The figure is kept between cycles; the PNG is only rewritten when the data changed
+    if renderer is None:
+        if _s4_renderer is None:
+            from plot_engine import ScintillationRenderer
+            _s4_renderer = ScintillationRenderer(os.path.join(local_dir, f'{station_code}_S4_pi.png'), bg_color, plot_bg)
+        renderer = _s4_renderer
+    with instrumentation.stage('s4', 'plot', rows=len(filtered_data)):
+        renderer.render(filtered_data)
+
+
+def sync_ismr_files():
+    print("Checking for new ISMR files...")
+    download_ismr_files()
+    remove_old_ismr_files()
 
+def update_products():
+    S4_pi = process_ismr_files()
+    if not S4_pi.empty:
+        plot_continuous_timeseries(S4_pi)
+    else:
+        print("No valid data to plot")
 
 def main():
-    while True:
-        print("Checking for new ISMR files...")
-        download_ismr_files()
-        remove_old_ismr_files()  
-        
-        ismr_files = glob.glob(os.path.join(local_dir, "*.ismr"))
-        
-        if ismr_files:
-            S4_pi = process_ismr_files()
-            if not S4_pi.empty:
-                plot_continuous_timeseries(S4_pi)
-            else:
-                print("No valid data to plot")
-        else:
-            print("No new ISMR files found")
-
-        print("Waiting 3 minutes before next check...")
-        time.sleep(180)
+    # The FTP listing is polled every 3 minutes; processing only runs when the local ISMR files change
+    scheduler = Scheduler()
+    scheduler.add('s4_sync', sync_ismr_files, [IntervalTrigger(180)])
+    scheduler.add('s4_process', update_products, [FileTrigger(os.path.join(local_dir, ismr_archive.PATTERN))], debounce=5)
+    scheduler.run_forever()
 
 if __name__ == "__main__":
+    profiler.install()
+    # Start Prometheus server on port 8000
+    start_http_server(8000)
+    print("Prometheus exporter running on http://localhost:8000/metrics")
     main()
\ No newline at end of file
@@ -0,0 +1,110 @@
+"""Render-time benchmark for the persistent dashboard renderers.
+
+    python benchmarks/bench_plotting.py [--days 3] [--prns 32] [--repeat 5] [--no-decimate]
+
+Times a freshly built figure (what every cycle used to pay), a steady-state
+update with one new minute of data, and an update with unchanged data.
+Pass --no-decimate to draw every sample instead of the pixel-thinned set.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from plot_engine import ScintillationRenderer, VtecRotiRenderer  # noqa: E402
+from VTEC_ROTI import compute_roti  # noqa: E402
+
+
+def synthetic_ismr(days=3, prns=32, seed=0):
+    """1-minute S4/sigma-phi/VTEC rows for `prns` satellites over `days` days."""
+    rng = np.random.default_rng(seed)
+    times = pd.date_range(pd.Timestamp.now().normalize() - pd.Timedelta(days=days - 1), periods=days * 1440, freq='min')
+    svid = np.tile(np.arange(1, prns + 1), len(times))
+    t = np.repeat(times.values, prns)
+    n = len(t)
+    frame = pd.DataFrame({
+        'SVID': svid,
+        'S4_index': np.round(np.abs(rng.gamma(1.5, 0.08, n)), 2),
+        'Phi60_Sig1_60': np.abs(rng.gamma(1.5, 0.1, n)),
+        'VTEC': 30 + 10 * np.sin(np.linspace(0, 2 * np.pi * days, n)) + rng.normal(0, 1, n),
+        'Dlat_IPP': rng.uniform(3, 15, n),
+        'Dlong_IPP': rng.uniform(33, 48, n),
+    }, index=pd.DatetimeIndex(t, name='Time'))
+    return frame
+
+
+def _time(fn, repeat):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--days', type=int, default=3)
+    parser.add_argument('--prns', type=int, default=32)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--no-decimate', action='store_true', help='draw every sample')
+    args = parser.parse_args(argv)
+    opts = {'decimation': None} if args.no_decimate else {}
+
+    data = synthetic_ismr(args.days, args.prns)
+    grown = pd.concat([data.iloc[args.prns:], synthetic_ismr(1, args.prns, seed=1).iloc[-args.prns:]])
+    print(f"{len(data)} rows ({args.days} days x {args.prns} PRNs)")
+    out = tempfile.mkdtemp()
+
+    s4_path = os.path.join(out, 's4.png')
+
+    def cold_s4():
+        r = ScintillationRenderer(s4_path, **opts)
+        r.render(data)
+        r.close()
+
+    s4 = ScintillationRenderer(s4_path, **opts)
+    s4.render(data)
+    frames = [data, grown]
+
+    def warm_s4():
+        frames.reverse()
+        s4.render(frames[0])
+
+    print(f"S4/sigma-phi  new figure     {_time(cold_s4, args.repeat) * 1e3:8.1f} ms")
+    print(f"S4/sigma-phi  data changed   {_time(warm_s4, args.repeat) * 1e3:8.1f} ms")
+    print(f"S4/sigma-phi  unchanged      {_time(lambda: s4.render(frames[0]), args.repeat) * 1e3:8.1f} ms")
+    s4.close()
+
+    vtec_path = os.path.join(out, 'vtec.png')
+    roti = compute_roti(data)
+    roti_grown = compute_roti(grown)
+
+    def cold_vtec():
+        r = VtecRotiRenderer(vtec_path, **opts)
+        r.render(data, roti)
+        r.close()
+
+    vtec = VtecRotiRenderer(vtec_path, **opts)
+    vtec.render(data, roti)
+    pairs = [(data, roti), (grown, roti_grown)]
+
+    def warm_vtec():
+        pairs.reverse()
+        vtec.render(*pairs[0])
+
+    print(f"VTEC/ROTI     new figure     {_time(cold_vtec, args.repeat) * 1e3:8.1f} ms")
+    print(f"VTEC/ROTI     data changed   {_time(warm_vtec, args.repeat) * 1e3:8.1f} ms")
+    print(f"VTEC/ROTI     unchanged      {_time(lambda: vtec.render(*pairs[0]), args.repeat) * 1e3:8.1f} ms")
+    print(f"ROTI compute                 {_time(lambda: compute_roti(data), args.repeat) * 1e3:8.1f} ms")
+    vtec.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,576 @@
+"""Benchmark suite over the bundled assets/ ISMR corpus and synthetic data.
+
+    python benchmarks/run.py [--files 24] [--repeat 3] [--days 3]
+                             [--baseline benchmarks/baseline.json] [--save-baseline] [--threshold 0.25]
+
+Each stage reports its best wall time over --repeat runs, throughput in
+rows/s and the peak traced allocation of one extra run. Stages cover ISMR
+parsing and its sub-stages, the quality rules, the K-index chain, net32D,
+the TEC map and tile pyramid, the dashboard plots, gridding and
+assimilation, the query API and service startup.
+
+With --save-baseline the results are written to the baseline file; otherwise
+they are compared against it and the exit status is 1 when any stage is more
+than --threshold slower. Baselines are machine-specific: save one on the
+machine that runs the comparison.
+"""
+import argparse
+import glob
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import urllib.request
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import instrumentation  # noqa: E402
+from prometheus_client import REGISTRY  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+READ_SUBSTAGES = ('quality', 'gps_time', 's4_vtec', 'ipp')
+SERVICE_MODULES = ('S4_Pi', 'VTEC_ROTI', 'ENT_Kindex', 'EthTEC', 'ismr_pipeline', 'service')
+
+
+def _stage_total(stage, service='s4'):
+    return REGISTRY.get_sample_value('pipeline_stage_seconds_sum', {'service': service, 'stage': stage}) or 0.0
+
+
+def _peak_mb(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / 2**20
+    finally:
+        tracemalloc.stop()
+
+
+def measure(fn, repeat, rows):
+    """Best wall time of `fn` over `repeat` runs, throughput and traced peak memory."""
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return {'seconds': best, 'rows': rows, 'rows_per_s': rows / best if best > 0 else None,
+            'peak_mb': _peak_mb(fn)}
+
+
+def synthetic_iaga_files(directory, days, seed=0):
+    """Write `days` IAGA-2002 minute files with a daily variation, noise and a few spikes."""
+    rng = np.random.default_rng(seed)
+    paths = []
+    start = pd.Timestamp('2025-09-01')
+    for d in range(days):
+        times = pd.date_range(start + pd.Timedelta(days=d), periods=1440, freq='min')
+        phase = 2 * np.pi * np.arange(1440) / 1440
+        x = 30000 + 40 * np.sin(phase) + rng.normal(0, 2, 1440)
+        y = 100 + 20 * np.cos(phase) + rng.normal(0, 2, 1440)
+        z = 5000 + rng.normal(0, 1, 1440)
+        x[rng.integers(0, 1440, 3)] += 500
+        path = os.path.join(directory, f"ent{times[0]:%Y%m%d}pmin.min")
+        with open(path, 'w') as f:
+            f.write(" Format                 IAGA-2002                                    |\n")
+            f.write("DATE       TIME         DOY     X         Y         Z         F      |\n")
+            for t, xv, yv, zv in zip(times, x, y, z):
+                f.write(f"{t:%Y-%m-%d %H:%M:%S}.000 {t.dayofyear:03d}     {xv:9.2f} {yv:9.2f} {zv:9.2f}  99999.00\n")
+        paths.append(path)
+    return paths
+
+
+def synthetic_whitespace_ismr(directory, satellites=40, seed=0):
+    """Write one day of the date/time-prefixed ISMR variant read by testS4.parse_ismr_file."""
+    rng = np.random.default_rng(seed)
+    times = np.repeat(pd.date_range('2025-09-01', periods=1440, freq='min').strftime('%Y/%m/%d %H:%M:%S'),
+                      satellites)
+    n = len(times)
+    svid = np.tile(np.arange(1, satellites + 1), 1440)
+    path = os.path.join(directory, 'ENTG244.ismr')
+    with open(path, 'w') as f:
+        f.write("# date time svid azimuth elevation cn0 s4 sigma_phi vtec\n")
+        for row in zip(times, svid, rng.uniform(0, 360, n), rng.uniform(0, 90, n), rng.uniform(30, 50, n),
+                       rng.uniform(0, 1, n), rng.uniform(0, 1, n), rng.uniform(0, 80, n)):
+            f.write("%s %d %.1f %.1f %.1f %.3f %.3f %.2f\n" % row)
+    return path
+
+
+def bench_ismr(files, repeat, results):
+    import S4_Pi
+    from VTEC_ROTI import compute_roti
+
+    frames = []
+
+    def read_all():
+        frames[:] = [S4_Pi.read_ismr(path) for path in files]
+
+    read_all()
+    rows = sum(len(f) for f in frames if f is not None)
+    nbytes = sum(os.path.getsize(path) for path in files)
+
+    # sub-stage times of the fastest repeat, from the instrumentation histograms
+    best, sub = np.inf, {}
+    for _ in range(repeat):
+        before = {stage: _stage_total(stage) for stage in READ_SUBSTAGES}
+        start = time.perf_counter()
+        read_all()
+        elapsed = time.perf_counter() - start
+        if elapsed < best:
+            best = elapsed
+            sub = {stage: _stage_total(stage) - before[stage] for stage in READ_SUBSTAGES}
+    results['read_ismr'] = {'seconds': best, 'rows': rows, 'rows_per_s': rows / best,
+                            'mb_per_s': nbytes / 2**20 / best, 'peak_mb': _peak_mb(read_all)}
+    for stage, seconds in sub.items():
+        results[f'read_ismr.{stage}'] = {'seconds': seconds, 'rows': rows,
+                                         'rows_per_s': rows / seconds if seconds > 0 else None, 'peak_mb': None}
+
+    data = pd.concat([f for f in frames if f is not None]).sort_index()
+    results['roti'] = measure(lambda: compute_roti(data), repeat, len(data))
+    return data
+
+
+def bench_quality_filter(files, repeat, results):
+    """The compiled quality rules vs the same rules as chained pandas masks, over the parsed unfiltered rows."""
+    import quality_filter
+
+    positions = {'SVID': 2, 'Elevation': 5, 'Sig1': 6, 'Total_S4_Sig1': 7, 'Correction_total_S4_Sig1': 8,
+                 'Sig1_lock_time': 24}
+    # a representative operator rule set; the defaults hold the elevation mask only
+    qc = quality_filter.QualityFilter([
+        {"name": "elevation", "column": "Elevation", "min": 20, "missing": "reject"},
+        {"name": "lock_time", "column": "Sig1_lock_time", "min": 180, "missing": "reject"},
+        {"name": "cn0", "column": "Sig1", "min": 30, "max": 60, "missing": "reject"},
+        {"name": "s4_correction", "column": "Correction_total_S4_Sig1", "min": 0, "max": 0.3, "missing": "keep"},
+        {"name": "blacklist", "column": "SVID", "exclude": ["G04"], "missing": "reject"},
+    ])
+    frames = [pd.read_csv(path, header=None, usecols=list(positions.values()), names=list(positions))
+              for path in files if os.path.getsize(path)]
+    data = pd.concat(frames, ignore_index=True).apply(pd.to_numeric, errors='coerce')
+
+    def chained():
+        keep = pd.Series(True, index=data.index)
+        for _, column, bounds, table, keep_missing in qc.rules:
+            values = data[column]
+            if table is not None:
+                keep = keep & ~values.fillna(0).astype(int).clip(0, 255).map(lambda svid: table[svid])
+                continue
+            passed = pd.Series(True, index=data.index)
+            for ufunc, limit in bounds:
+                limit = data[limit] if isinstance(limit, str) else limit
+                passed = passed & (values >= limit if ufunc is np.greater_equal else values <= limit)
+            if keep_missing:
+                passed = passed | values.isna()
+            keep = keep & passed
+        return keep.to_numpy()
+
+    assert np.array_equal(chained(), qc.keep(data))
+    results['quality.compiled'] = measure(lambda: qc.keep(data), repeat, len(data))
+    results['quality.chained'] = measure(chained, repeat, len(data))
+
+
+def bench_ismr_gzip(files, repeat, results):
+    """read_ismr over the same files kept as .ismr.gz archives, serially and through the process pool."""
+    import gzip
+    import shutil
+
+    import S4_Pi
+    import ismr_archive
+
+    directory = tempfile.mkdtemp()
+    archives = []
+    for path in files:
+        archive = os.path.join(directory, os.path.basename(path) + '.gz')
+        with open(path, 'rb') as f_in, gzip.open(archive, 'wb') as f_out:
+            shutil.copyfileobj(f_in, f_out)
+        archives.append(archive)
+    plain = sum(os.path.getsize(path) for path in files)
+    packed = sum(os.path.getsize(path) for path in archives)
+    rows = sum(len(f) for f in ismr_archive.read_files(archives, S4_Pi.read_ismr, 1) if f is not None)
+    for name, workers in (('read_ismr.gzip', 1), ('read_ismr.gzip_pool', None)):
+        results[name] = measure(lambda: ismr_archive.read_files(archives, S4_Pi.read_ismr, workers), repeat, rows)
+        results[name]['mb_per_s'] = plain / 2**20 / results[name]['seconds']
+        results[name]['compression'] = plain / packed
+
+
+def bench_constellations(files, repeat, results):
+    """read_ismr restricted to one constellation, and the retained store's memory per constellation."""
+    import S4_Pi
+    import constellations
+    from ismr_store import ISMR_COLUMNS, ConstellationRings
+
+    for name in constellations.GNSS:
+        frames = []
+
+        def read_one():
+            frames[:] = [S4_Pi.read_ismr(path, systems=(name,)) for path in files]
+
+        read_one()
+        rows = sum(len(f) for f in frames if f is not None)
+        if not rows:
+            continue
+        results[f'read_ismr.{name}'] = measure(read_one, repeat, rows)
+        # live rows in the store vs the ring preallocated for a day of this constellation
+        row_bytes = sum(np.dtype(dtype).itemsize for dtype in ISMR_COLUMNS.values())
+        results[f'read_ismr.{name}']['store_mb'] = rows * row_bytes / 2**20
+        results[f'read_ismr.{name}']['ring_mb_per_day'] = ConstellationRings(1, names=(name,)).nbytes / 2**20
+
+
+def bench_whitespace_ismr(repeat, results):
+    import testS4
+
+    path = synthetic_whitespace_ismr(tempfile.mkdtemp())
+    rows = len(testS4.parse_ismr_file(path))
+    results['whitespace_ismr.parse'] = measure(lambda: testS4.parse_ismr_file(path), repeat, rows)
+
+
+def bench_kindex(days, repeat, results):
+    import ENT_Kindex
+
+    directory = tempfile.mkdtemp()
+    paths = synthetic_iaga_files(directory, days)
+    loaded = ENT_Kindex.read_iaga2002_file_set(paths, max_workers=1)[0]
+    results['kindex.read'] = measure(lambda: ENT_Kindex.read_iaga2002_file_set(paths, max_workers=1), repeat,
+                                     len(loaded))
+    # a fresh filter evaluates the whole history, as after a restart
+    results['kindex.spike_filter'] = measure(
+        lambda: ENT_Kindex.SpikeFilter().filter(loaded, ['X', 'Y', 'Z']), repeat, len(loaded))
+    filtered = ENT_Kindex.SpikeFilter().filter(loaded, ['X', 'Y', 'Z'])
+    times_float = ENT_Kindex.time_to_float(filtered["DATETIME"]).to_numpy()
+    x, y = filtered['X'].values, filtered['Y'].values
+    results['kindex.k_index'] = measure(
+        lambda: ENT_Kindex.calculate_k_index(times_float, x, y, ENT_Kindex.k9_limit), repeat, len(filtered))
+
+    def nowcast_minutes():
+        # the last day fed one minute at a time, as the tail of today's file grows
+        nowcaster = ENT_Kindex.KNowcaster()
+        for i in range(len(times_float) - 1440, len(times_float)):
+            nowcaster.update(times_float[i:i + 1], x[i:i + 1], y[i:i + 1])
+
+    results['kindex.nowcast_day'] = measure(nowcast_minutes, repeat, 1440)
+
+
+def bench_net32d(repeat, results):
+    from EthTEC import compute_tec
+
+    long2, lat2 = np.meshgrid(np.arange(33, 48 + 0.1, 0.1), np.arange(3, 15 + 0.1, 0.1))
+    results['net32d'] = measure(lambda: compute_tec(long2, lat2, 12.0, 259, 150.0), repeat, long2.size)
+
+
+def bench_plots(data, repeat, results):
+    import S4_Pi
+    import VTEC_ROTI
+    from plot_engine import ScintillationRenderer, VtecRotiRenderer
+
+    out = tempfile.mkdtemp()
+
+    # a new renderer per run: a kept one would skip the unchanged PNG
+    def s4_plot():
+        renderer = ScintillationRenderer(os.path.join(out, 's4.png'))
+        S4_Pi.plot_continuous_timeseries(data.copy(), renderer=renderer)
+        renderer.close()
+
+    def vtec_plot():
+        renderer = VtecRotiRenderer(os.path.join(out, 'vtec.png'))
+        VTEC_ROTI.plot_continuous_timeseries(data.copy(), renderer=renderer)
+        renderer.close()
+
+    results['plot.s4'] = measure(s4_plot, repeat, len(data))
+    results['plot.vtec_roti'] = measure(vtec_plot, repeat, len(data))
+
+
+def synthetic_geometry(directory):
+    """Write a border box, a dip equator and two stations under the names EthTEC reads."""
+    with open(os.path.join(directory, 'Ethiopia_border.txt'), 'w') as f:
+        f.write("Lon,Lat\n" + ''.join(f"{x},{y}\n" for x, y in [(34, 4), (47, 4), (47, 14), (34, 14), (34, 4)]))
+    with open(os.path.join(directory, 'geomagnetic_equator.txt'), 'w') as f:
+        f.write("lon\tlat\n" + ''.join(f"{x}\t{10 + 0.1 * (x - 33)}\n" for x in np.arange(33, 48.1, 0.5)))
+    with open(os.path.join(directory, 'GNSS_Stn.txt'), 'w') as f:
+        f.write("Stn,lon,lat\nADIS,38.77,9.03\nENTG,38.79,9.11\n")
+
+
+def bench_tec_map(repeat, results):
+    """The tile pyramid from scratch, and a TEC_Map.png refresh that reuses it (same 15-min bucket)."""
+    from concurrent.futures import ProcessPoolExecutor
+
+    import EthTEC
+    import tec_tiles
+    from tile_server import TecTileServer
+
+    directory = tempfile.mkdtemp()
+    synthetic_geometry(directory)
+    cwd = os.getcwd()
+    os.chdir(directory)     # EthTEC reads its geometry from the working directory
+    try:
+        border, equator, stations = tec_tiles.load_geometry()
+        tiles = len(tec_tiles.plan_tiles(border, equator, stations))
+        now = datetime(2025, 9, 16, 12, 0, tzinfo=timezone.utc)
+        with ProcessPoolExecutor() as pool, redirect_stdout(io.StringIO()):
+            server = TecTileServer()
+            results['tec_map.tiles'] = measure(
+                lambda: tec_tiles.build_tec_pyramid(12.0, 259, 150.0, border, equator, stations, executor=pool),
+                repeat, tiles)
+            EthTEC.render_tec_products(now, 150.0, pool, server, directory)
+            results['tec_map.refresh'] = measure(
+                lambda: EthTEC.render_tec_products(now + timedelta(minutes=1), 150.0, pool, server, directory),
+                repeat, 151 * 121)
+    finally:
+        os.chdir(cwd)
+
+
+def bench_kindex_plot(days, repeat, results):
+    """test.py's K-index bars and derivative panels, redrawn into its kept figure."""
+    try:
+        import test as kindex_dashboard   # also needs influxdb_client
+    except ImportError as e:
+        print(f"Skipping plot.kindex: {e}")
+        return
+    import ENT_Kindex
+
+    directory = tempfile.mkdtemp()
+    data = ENT_Kindex.read_iaga2002_file_set(synthetic_iaga_files(directory, days), max_workers=1)[0]
+    # the plot only shows the last days before now
+    data['DATETIME'] += pd.Timestamp.now(tz='UTC').floor('min') - data['DATETIME'].iloc[-1]
+    times_float = ENT_Kindex.time_to_float(data['DATETIME']).to_numpy()
+    k_values, k_times = ENT_Kindex.calculate_k_index(times_float, data['X'].values, data['Y'].values,
+                                                     ENT_Kindex.k9_limit)
+    cwd = os.getcwd()
+    os.chdir(directory)     # Kindex.png is written to the working directory
+    try:
+        results['plot.kindex'] = measure(
+            lambda: kindex_dashboard.plot_k_indices_with_derivatives(data, k_values, k_times, 'ENT'), repeat, len(data))
+    finally:
+        os.chdir(cwd)
+
+
+def _timing(seconds):
+    return {'seconds': seconds, 'rows': None, 'rows_per_s': None, 'peak_mb': None}
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('localhost', 0))
+        return s.getsockname()[1]
+
+
+def bench_startup(repeat, results):
+    # fresh interpreters in a scratch directory: the services create assets/ in the working directory
+    cwd = tempfile.mkdtemp()
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    for module in SERVICE_MODULES:
+        code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+        best = min(float(subprocess.run([sys.executable, '-c', code], cwd=cwd, env=env, check=True,
+                                        capture_output=True, text=True).stdout.split()[-1])
+                   for _ in range(repeat))
+        results[f'startup.import.{module}'] = _timing(best)
+
+    best = np.inf
+    for _ in range(repeat):
+        port = _free_port()
+        start = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, os.path.join(ROOT, 'launch.py'), 'kindex', '--port', str(port)],
+                                cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            while proc.poll() is None:
+                try:
+                    urllib.request.urlopen(f'http://localhost:{port}/metrics', timeout=1).read()
+                    best = min(best, time.perf_counter() - start)
+                    break
+                except OSError:
+                    time.sleep(0.005)
+        finally:
+            proc.terminate()
+            proc.wait()
+    results['startup.first_metrics'] = _timing(best)
+
+
+def bench_scint_events(data, repeat, results):
+    import scint_events
+
+    minutes = [chunk for _, chunk in data.groupby(data.index.floor('min'))]
+
+    def detect():
+        detector = scint_events.EventDetector('BENCH', log_path=None)
+        for chunk in minutes:
+            detector.process(chunk)
+
+    results['scint_events'] = measure(detect, repeat, len(data))
+
+
+def bench_vtec_grid(data, repeat, results):
+    import vtec_grid
+
+    minutes = [chunk for _, chunk in data.groupby(data.index.floor('min'))]
+    grid = vtec_grid.VtecGrid()
+
+    def add_minutes():
+        for chunk in minutes:
+            grid.add_frame(chunk)
+
+    results['vtec_grid.add'] = measure(add_minutes, repeat, len(data))
+    results['vtec_grid.products'] = measure(grid.products, repeat, grid.ncell)
+
+
+def bench_assimilation(data, repeat, results):
+    import tec_assimilation
+
+    minutes = [chunk for _, chunk in data.groupby(data.index.floor('min'))]
+    lon, lat = np.arange(33, 48.1, 0.1), np.arange(3, 15.1, 0.1)
+    background = np.zeros((len(lat), len(lon)))
+
+    def update_minutes():
+        # one cycle per minute of data: new residuals, then a corrected map
+        fresh = tec_assimilation.TecAssimilator()
+        for chunk in minutes:
+            fresh.add_frame(chunk)
+            fresh.analysis(lon, lat, background)
+        return fresh
+
+    assimilator = update_minutes()
+
+    def dense_analysis():
+        # reference: the same analysis with B(map, obs) built from the full distance matrix
+        grid = assimilator.residuals
+        count = grid.count()
+        rows, cols = np.nonzero(count > 0)
+        obs = np.column_stack((grid.lon[cols] * assimilator.lon_scale, grid.lat[rows]))
+        lon2, lat2 = np.meshgrid(lon * assimilator.lon_scale, lat)
+        points = np.column_stack((lon2.ravel(), lat2.ravel()))
+
+        def corr(a, b):
+            return np.exp(-0.5 * ((a[:, None, :] - b[None]) ** 2).sum(axis=2) / assimilator.length ** 2)
+
+        cov = assimilator.background_var * corr(obs, obs)
+        cov[np.diag_indices_from(cov)] += assimilator.obs_var / count[rows, cols] + assimilator.repr_var
+        weights = np.linalg.solve(cov, grid.mean()[rows, cols])
+        return (assimilator.background_var * corr(points, obs) @ weights).reshape(background.shape)
+
+    results['assimilation.update'] = measure(update_minutes, repeat, len(data))
+    results['assimilation.analysis'] = measure(lambda: assimilator.analysis(lon, lat, background), repeat,
+                                               background.size)
+    results['assimilation.dense_analysis'] = measure(dense_analysis, repeat, background.size)
+
+
+def bench_query(data, repeat, results, days=30):
+    import query_api
+
+    store = query_api.RollupStore()
+    frame = data[['SVID', 'S4_index', 'Phi60_Sig1_60', 'VTEC']]
+    day = pd.Timedelta(days=1)
+    start = frame.index.min().floor('D')
+    for d in range(days):
+        shifted = frame.set_axis(frame.index + d * day)
+        store.add_frame('BENCH', shifted, query_api.ISMR_FIELDS)
+    end = start + days * day
+    t0, t1 = start.value, end.value
+    svid = int(frame['SVID'].iloc[0])
+    results['query.1day_1svid'] = measure(
+        lambda: store.query('BENCH', 'S4_index', t1 - day.value, t1, svid), repeat, 1)
+    results['query.30day_all'] = measure(
+        lambda: store.query('BENCH', 'VTEC', t0, t1, None, 'max', 1000), repeat, 1)
+
+    server = query_api.QueryServer(store, _free_port()).start()
+    body = json.dumps({'range': {'from': start.isoformat(), 'to': end.isoformat()}, 'maxDataPoints': 1000,
+                       'targets': [{'target': 'BENCH:VTEC', 'payload': {'agg': 'max'}}]}).encode()
+
+    def http_query():
+        request = urllib.request.Request(f'http://localhost:{server.port}/query', body,
+                                         {'Content-Type': 'application/json'})
+        urllib.request.urlopen(request).read()
+
+    try:
+        results['query.http_30day_all'] = measure(http_query, repeat, 1)
+    finally:
+        server.stop()
+
+
+def compare(results, baseline, threshold):
+    """Names of stages more than `threshold` slower than the baseline."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base or not base.get('seconds'):
+            continue
+        ratio = result['seconds'] / base['seconds']
+        result['vs_baseline'] = ratio
+        if ratio > 1 + threshold:
+            regressions.append(name)
+    return regressions
+
+
+def report(results):
+    print(f"{'stage':30s} {'best':>10s} {'rows/s':>12s} {'peak MB':>9s} {'vs base':>8s}")
+    for name, r in results.items():
+        rate = f"{r['rows_per_s']:12,.0f}" if r.get('rows_per_s') else f"{'-':>12s}"
+        peak = f"{r['peak_mb']:9.1f}" if r.get('peak_mb') is not None else f"{'-':>9s}"
+        ratio = f"{r['vs_baseline']:7.2f}x" if 'vs_baseline' in r else f"{'-':>8s}"
+        print(f"{name:30s} {r['seconds'] * 1e3:8.1f}ms {rate} {peak} {ratio}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=24, help='number of assets/*.ismr files (0 = all)')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--days', type=int, default=3, help='days of synthetic IAGA-2002 data')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed slowdown (0.25 = 25%%)')
+    args = parser.parse_args(argv)
+
+    instrumentation.ENABLED = True
+    files = sorted(glob.glob(os.path.join(ROOT, 'assets', '*.ismr')))
+    if args.files:
+        files = files[:args.files]
+    if not files:
+        parser.error("no .ismr files under assets/")
+    print(f"{len(files)} ISMR files, {args.days} synthetic IAGA-2002 days, best of {args.repeat}")
+
+    results = {}
+    data = bench_ismr(files, args.repeat, results)
+    bench_quality_filter(files, args.repeat, results)
+    bench_constellations(files, args.repeat, results)
+    bench_ismr_gzip(files, args.repeat, results)
+    bench_whitespace_ismr(args.repeat, results)
+    bench_kindex(args.days, args.repeat, results)
+    bench_net32d(args.repeat, results)
+    bench_plots(data, args.repeat, results)
+    bench_kindex_plot(args.days, args.repeat, results)
+    bench_tec_map(args.repeat, results)
+    bench_scint_events(data, args.repeat, results)
+    bench_vtec_grid(data, args.repeat, results)
+    bench_assimilation(data, args.repeat, results)
+    bench_query(data, args.repeat, results)
+    bench_startup(args.repeat, results)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({'files': len(files), 'days': args.days, 'results': results}, f, indent=1)
+        report(results)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    regressions = []
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if (baseline.get('files'), baseline.get('days')) != (len(files), args.days):
+            print("Warning: baseline was recorded with different --files/--days")
+        regressions = compare(results, baseline['results'], args.threshold)
+    report(results)
+    if regressions:
+        print(f"Regressions above {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,125 @@
+"""Septentrio SVID numbering: constellation and PRN of every ISMR row.
+
+sbf2ismr writes Septentrio SVIDs, one number space for all constellations:
+
+    1-37     GPS G01-G37            141-180  BeiDou C01-C40
+    38-61    GLONASS R01-R24        181-187  QZSS J01-J07
+    62       GLONASS, unknown slot  191-197  NavIC I01-I07
+    63-68    GLONASS R25-R30        198-215  SBAS S141-S158
+    71-106   Galileo E01-E36        216-222  NavIC I08-I14
+    107-119  L-band (MSS)           223-245  BeiDou C41-C63
+    120-140  SBAS S120-S140
+
+Lookups go through two 256-entry tables (constellation index and PRN), so
+labelling or masking a column is a single fancy-indexing operation.
+
+INGEST (env DASHBOARD_CONSTELLATIONS, comma-separated; default every
+constellation, SBAS and L-band included) selects the rows read_ismr keeps.
+Other rows are dropped before the elevation mask and IPP geometry. PLOT selects what the station PNGs show
+(env DASHBOARD_PLOT_CONSTELLATIONS, default gps, the PRNs the plots always
+had). Rows per constellation are counted in
+ismr_constellation_rows_total{constellation,outcome="skipped"|"ingested"}.
+"""
+import os
+
+import numpy as np
+from prometheus_client import Counter
+
+# name -> (single-letter RINEX code, max rows per epoch above the elevation mask)
+CONSTELLATIONS = {
+    'gps': ('G', 16),
+    'glonass': ('R', 12),
+    'galileo': ('E', 14),
+    'beidou': ('C', 20),
+    'qzss': ('J', 4),
+    'navic': ('I', 8),
+    'sbas': ('S', 6),
+    'lband': ('L', 2),
+}
+NAMES = tuple(CONSTELLATIONS) + ('unknown',)
+UNKNOWN = len(NAMES) - 1
+GNSS = ('gps', 'glonass', 'galileo', 'beidou', 'qzss', 'navic')
+
+# (first SVID, last SVID, constellation, PRN of the first SVID)
+_RANGES = [
+    (1, 37, 'gps', 1),
+    (38, 61, 'glonass', 1),
+    (62, 62, 'glonass', 0),
+    (63, 68, 'glonass', 25),
+    (71, 106, 'galileo', 1),
+    (107, 119, 'lband', 1),
+    (120, 140, 'sbas', 120),
+    (141, 180, 'beidou', 1),
+    (181, 187, 'qzss', 1),
+    (191, 197, 'navic', 1),
+    (198, 215, 'sbas', 141),
+    (216, 222, 'navic', 8),
+    (223, 245, 'beidou', 41),
+]
+
+rows_counter = Counter('ismr_constellation_rows', 'ISMR rows per constellation', ['constellation', 'outcome'])
+
+CONSTELLATION_OF = np.full(256, UNKNOWN, np.int8)
+PRN_OF = np.zeros(256, np.int16)
+for _first, _last, _name, _prn in _RANGES:
+    CONSTELLATION_OF[_first:_last + 1] = NAMES.index(_name)
+    PRN_OF[_first:_last + 1] = np.arange(_prn, _prn + _last - _first + 1)
+
+
+def _from_env(variable, default):
+    names = tuple(n.strip().lower() for n in os.environ.get(variable, ','.join(default)).split(',') if n.strip())
+    unknown = set(names) - set(CONSTELLATIONS)
+    if unknown:
+        raise ValueError(f"{variable}: unknown constellation(s) {', '.join(sorted(unknown))}")
+    return names
+
+
+INGEST = _from_env('DASHBOARD_CONSTELLATIONS', tuple(CONSTELLATIONS))
+PLOT = _from_env('DASHBOARD_PLOT_CONSTELLATIONS', ('gps',))
+
+
+def index_of(svids):
+    """Constellation index (into NAMES) of each SVID; NaN and out-of-range SVIDs are 'unknown'."""
+    svids = np.asarray(svids)
+    if svids.dtype.kind == 'f':
+        svids = np.nan_to_num(svids, nan=0)
+    svids = svids.astype(np.int64)
+    inside = (svids >= 0) & (svids < 256)
+    return np.where(inside, CONSTELLATION_OF[np.where(inside, svids, 0)], UNKNOWN)
+
+
+def mask(svids, names):
+    """Boolean mask of the SVIDs that belong to one of the constellations `names`."""
+    wanted = np.zeros(len(NAMES), bool)
+    wanted[[NAMES.index(name) for name in names]] = True
+    return wanted[index_of(svids)]
+
+
+def counts(svids):
+    """Rows per constellation name (only the constellations present)."""
+    found = np.bincount(index_of(svids), minlength=len(NAMES))
+    return {NAMES[i]: int(n) for i, n in enumerate(found) if n}
+
+
+def labels(svids):
+    """RINEX-style satellite labels ('G05', 'E11', ...) of an array of SVIDs."""
+    svids = np.asarray(svids).astype(np.int64)
+    index = index_of(svids)
+    prn = PRN_OF[np.clip(svids, 0, 255)]
+    letters = np.array([CONSTELLATIONS[name][0] for name in NAMES[:-1]] + ['?'])
+    return np.char.add(letters[index], np.char.zfill(prn.astype(str), 2))
+
+
+def count(svids, outcome):
+    """Add the rows of `svids` to ismr_constellation_rows_total per constellation."""
+    for name, n in counts(svids).items():
+        rows_counter.labels(constellation=name, outcome=outcome).inc(n)
+
+
+def select(data, names=None):
+    """Rows of `data` (with an SVID column) in the constellations `names` (default INGEST)."""
+    keep = mask(data['SVID'].to_numpy(), INGEST if names is None else names)
+    if keep.all():
+        return data
+    count(data['SVID'].to_numpy()[~keep], 'skipped')
+    return data[keep]
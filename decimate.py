@@ -0,0 +1,121 @@
+"""Point decimation for the dashboard time-series plots.
+
+A 12-inch figure has ~1200 pixel columns, so three days of 1-minute samples
+for every PRN are mostly overdraw. `minmax` keeps, per series and per pixel
+column, the samples holding the column's minimum and maximum, so isolated
+S4/ROTI spikes survive; `lttb` applies Largest-Triangle-Three-Buckets per
+series. Both return row positions so callers can subset whole frames.
+"""
+import numpy as np
+import pandas as pd
+
+TARGET_PIXELS = 1200   # default pixel columns (12 in at 100 dpi)
+MODE = 'minmax'        # 'minmax', 'lttb' or None to plot every sample
+
+
+def _as_float(x):
+    if isinstance(getattr(x, 'dtype', None), pd.DatetimeTZDtype):
+        x = x.tz_convert(None) if isinstance(x, pd.Index) else x.dt.tz_convert(None)
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype('datetime64[ns]').astype(np.int64).astype(float)
+    return x.astype(float)
+
+
+def minmax_indices(x, y, n_pixels, groups=None, x_range=None, y_pixels=None, y_range=None):
+    """Positions of the min and max sample of each (group, pixel cell) bucket, in input order.
+
+    Cells are pixel columns; with `y_pixels` each column is also split into
+    rows, which bounds scatter clouds of many overlapping series by the
+    number of occupied cells rather than by the number of series.
+    """
+    x = _as_float(x)
+    y = np.asarray(y, dtype=float)
+    valid = np.flatnonzero(~np.isnan(y) & ~np.isnan(x))
+    if len(valid) <= 2 * n_pixels and y_pixels is None:
+        return valid
+    xv, yv = x[valid], y[valid]
+    x0, x1 = x_range if x_range is not None else (xv.min(), xv.max())
+    bucket = np.clip(((xv - x0) / ((x1 - x0) or 1.0) * n_pixels).astype(np.int64), 0, n_pixels - 1)
+    if y_pixels is not None:
+        y0, y1 = y_range if y_range is not None else (yv.min(), yv.max())
+        row = np.clip(((yv - y0) / ((y1 - y0) or 1.0) * y_pixels).astype(np.int64), 0, y_pixels - 1)
+        bucket = bucket * y_pixels + row
+    if groups is not None:
+        _, code = np.unique(np.asarray(groups)[valid], return_inverse=True)
+        bucket = code.astype(np.int64) * (n_pixels * (y_pixels or 1)) + bucket
+    # sort by bucket, then value: the first/last entry of each bucket run are its min/max
+    order = np.lexsort((yv, bucket))
+    bucket = bucket[order]
+    edges = np.flatnonzero(np.diff(bucket)) + 1
+    first = np.concatenate(([0], edges))
+    last = np.concatenate((edges - 1, [len(bucket) - 1]))
+    keep = np.union1d(order[first], order[last])
+    return valid[keep]
+
+
+def lttb_indices(x, y, n_out):
+    """Largest-Triangle-Three-Buckets selection of `n_out` positions from one series."""
+    x = _as_float(x)
+    y = np.asarray(y, dtype=float)
+    valid = np.flatnonzero(~np.isnan(y) & ~np.isnan(x))
+    n = len(valid)
+    if n_out >= n or n_out < 3:
+        return valid
+    xv, yv = x[valid], y[valid]
+    # n_out - 2 buckets between the fixed first and last points
+    bounds = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = bounds[i], bounds[i + 1]
+        nxt_lo, nxt_hi = hi, bounds[i + 2] if i + 2 < len(bounds) else n
+        cx = xv[nxt_lo:nxt_hi].mean()
+        cy = yv[nxt_lo:nxt_hi].mean()
+        area = np.abs((xv[a] - cx) * (yv[lo:hi] - yv[a]) - (xv[a] - xv[lo:hi]) * (cy - yv[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return valid[selected]
+
+
+def decimate_indices(x, y, target_pixels=TARGET_PIXELS, mode=MODE, groups=None, x_range=None,
+                     y_pixels=None, y_range=None):
+    """Row positions to plot for one value column; every row if `mode` or `target_pixels` is None."""
+    if mode is None or target_pixels is None:
+        return np.arange(len(y))
+    if mode == 'minmax':
+        return minmax_indices(x, y, target_pixels, groups, x_range, y_pixels, y_range)
+    if mode == 'lttb':
+        if groups is None:
+            return lttb_indices(x, y, target_pixels)
+        x, y, groups = np.asarray(x), np.asarray(y), np.asarray(groups)
+        picked = []
+        for g in np.unique(groups):
+            rows = np.flatnonzero(groups == g)
+            picked.append(rows[lttb_indices(x[rows], y[rows], target_pixels)])
+        return np.sort(np.concatenate(picked)) if picked else np.arange(0)
+    raise ValueError(f"Unknown decimation mode: {mode}")
+
+
+def decimate_frame(frame, value_cols, target_pixels=TARGET_PIXELS, mode=MODE, group_col=None, time_col=None,
+                   groups=None, y_pixels=None, y_range=None):
+    """Subset `frame` to the union of the rows selected for each of `value_cols`.
+
+    The time axis is `frame[time_col]` or, by default, the index. Series are
+    decimated separately per `group_col` (e.g. 'SVID') or per an explicit
+    `groups` array such as colour classes.
+    """
+    if mode is None or target_pixels is None:
+        return frame
+    if len(frame) <= 2 * target_pixels and y_pixels is None:
+        return frame
+    x = _as_float(frame[time_col] if time_col is not None else frame.index)
+    if group_col is not None:
+        groups = frame[group_col].to_numpy()
+    keep = np.unique(np.concatenate([
+        decimate_indices(x, frame[col].to_numpy(dtype=float), target_pixels, mode, groups,
+                         y_pixels=y_pixels, y_range=y_range)
+        for col in value_cols
+    ]))
+    return frame.iloc[keep]
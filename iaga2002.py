@@ -0,0 +1,97 @@
+"""IAGA-2002 minute files: parsing one file and merging a set of them.
+
+Kept free of import-time side effects (no logging setup, metrics or
+clients), so process-pool workers can import it cheaply.
+"""
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+PARALLEL_MIN_FILES = 8    # a 3-day set parses faster serially than through a fresh pool
+
+
+def read_iaga2002(file_path, station_code='ent'):
+    """(data, components, station_name) of one IAGA-2002 file; an empty frame when unreadable."""
+    try:
+        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+            lines = [line.strip() for line in f.readlines() if line.strip()]
+
+        header_end = -1
+        for i, line in enumerate(lines):
+            if line.startswith("DATE") and "TIME" in line and "DOY" in line:
+                header_end = i
+                break
+        if header_end == -1:
+            logging.error(f"Header not found in file: {file_path}")
+            return pd.DataFrame(), None, None
+
+        header_fields = [field.strip().replace('|', '') for field in lines[header_end].split()]
+        reported_components = ['X', 'Y', 'Z'] if all(c in header_fields for c in ['X', 'Y', 'Z']) else None
+        if reported_components is None:
+            logging.error(f"No valid components in file {file_path}")
+            return pd.DataFrame(), None, None
+
+        data = pd.read_csv(
+            file_path,
+            skiprows=header_end + 1,
+            names=header_fields,
+            sep=r"\s+",
+            na_values=[99999.00, 99999.9],
+            engine='python'
+        )
+        datetime_col = data["DATE"].astype(str) + " " + data["TIME"].astype(str)
+        data["DATETIME"] = pd.to_datetime(datetime_col, errors='coerce', utc=True)
+        data.dropna(subset=["DATETIME"], inplace=True)
+        for comp in reported_components:
+            data[comp] = pd.to_numeric(data[comp], errors='coerce')
+        return data[["DATETIME"] + reported_components], reported_components, station_code.upper()
+    except Exception as e:
+        logging.error(f"Error reading file {file_path}: {e}")
+        return pd.DataFrame(), None, None
+
+
+def read_iaga2002_file_set(file_paths, reader=read_iaga2002, max_workers=None):
+    """Read several IAGA-2002 files into one time-sorted frame.
+
+    Sets of PARALLEL_MIN_FILES or more are parsed in a process pool (with this
+    module's reader only), then copied once into preallocated arrays and
+    de-duplicated by minute (a later file in `file_paths` wins on overlap), so
+    the cost is linear in the number of files. Returns (data, components,
+    station_name) like `reader`.
+    """
+    file_paths = list(file_paths)
+    workers = min(len(file_paths), max_workers or os.cpu_count() or 1)
+    # a pool only pays off for long sets, and its workers import the reader's module
+    if workers > 1 and len(file_paths) >= PARALLEL_MIN_FILES and reader is read_iaga2002:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(reader, file_paths))
+    else:
+        results = [reader(path) for path in file_paths]
+
+    results = [r for r in results if not r[0].empty]
+    if not results:
+        return pd.DataFrame(), None, None
+    _, components, station_name = results[0]
+    results = [r for r in results if r[1] == components]
+
+    total = sum(len(data) for data, _, _ in results)
+    keys = np.empty(total, dtype=np.int64)
+    values = np.empty((total, len(components)), dtype=float)
+    pos = 0
+    for data, _, _ in results:
+        n = len(data)
+        keys[pos:pos + n] = data["DATETIME"].values.astype("datetime64[ns]").view(np.int64)
+        values[pos:pos + n] = data[components].to_numpy(dtype=float)
+        pos += n
+
+    # stable sort keeps file order within a minute; keep the last copy of each
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    last = np.append(keys[1:] != keys[:-1], True)
+    order, keys = order[last], keys[last]
+    merged = pd.DataFrame(values[order], columns=components)
+    merged.insert(0, "DATETIME", pd.to_datetime(keys, utc=True))
+    return merged, components, station_name
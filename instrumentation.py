@@ -0,0 +1,121 @@
+"""Per-stage timing, row/byte counters, cache hit ratios and data freshness.
+
+    with instrumentation.stage('s4', 'read_ismr') as s:
+        data = ...
+        s.rows = len(data)
+
+exports, next to the science gauges on the same Prometheus endpoint:
+
+    pipeline_stage_seconds{service,stage}        histogram of stage durations
+    pipeline_rows_total / pipeline_bytes_total   rows and bytes handled per stage
+    pipeline_cache_requests_total{cache,result}  hit/miss counts
+    pipeline_cache_hit_ratio{cache}              hits / lookups since start
+    pipeline_data_freshness_seconds{service,station}  now minus the newest epoch seen
+
+Set DASHBOARD_INSTRUMENTATION=0 to disable: `stage()` then hands back one
+shared no-op object and the other helpers return immediately.
+"""
+import os
+import time
+
+from prometheus_client import Counter, Gauge, Histogram
+
+ENABLED = os.environ.get('DASHBOARD_INSTRUMENTATION', '1') != '0'
+
+# 1 ms .. ~2 min: metric export is sub-millisecond, a cold ISMR parse takes seconds
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+stage_seconds = Histogram('pipeline_stage_seconds', 'Duration of a pipeline stage', ['service', 'stage'],
+                          buckets=STAGE_BUCKETS)
+stage_rows = Counter('pipeline_rows', 'Rows processed by a pipeline stage', ['service', 'stage'])
+stage_bytes = Counter('pipeline_bytes', 'Bytes processed by a pipeline stage', ['service', 'stage'])
+cache_requests = Counter('pipeline_cache_requests', 'Cache lookups', ['cache', 'result'])
+cache_hit_ratio = Gauge('pipeline_cache_hit_ratio', 'Cache hits / lookups since start', ['cache'])
+freshness = Gauge('pipeline_data_freshness_seconds', 'Now minus the newest data epoch', ['service', 'station'])
+
+_children = {}
+_cache_counts = {}
+_newest = {}
+
+
+def _child(metric, *labels):
+    # labels() does a lock + dict lookup per call; keep the bound children
+    key = (metric, labels)
+    child = _children.get(key)
+    if child is None:
+        child = _children[key] = metric.labels(*labels)
+    return child
+
+
+class _Stage:
+    __slots__ = ('service', 'name', 'rows', 'bytes', '_start')
+
+    def __init__(self, service, name, rows, nbytes):
+        self.service = service
+        self.name = name
+        self.rows = rows
+        self.bytes = nbytes
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        _child(stage_seconds, self.service, self.name).observe(time.perf_counter() - self._start)
+        if self.rows:
+            _child(stage_rows, self.service, self.name).inc(self.rows)
+        if self.bytes:
+            _child(stage_bytes, self.service, self.name).inc(self.bytes)
+        return False
+
+
+class _NoStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NO_STAGE = _NoStage()
+
+
+def stage(service, name, rows=None, nbytes=None):
+    """Context manager timing one stage; set `.rows` / `.bytes` on it to count work done."""
+    if not ENABLED:
+        return _NO_STAGE
+    return _Stage(service, name, rows, nbytes)
+
+
+def cache_lookup(cache, hit):
+    """Count one lookup of `cache` and update its hit ratio."""
+    if not ENABLED:
+        return
+    counts = _cache_counts.setdefault(cache, [0, 0])
+    counts[0 if hit else 1] += 1
+    _child(cache_requests, cache, 'hit' if hit else 'miss').inc()
+    _child(cache_hit_ratio, cache).set(counts[0] / (counts[0] + counts[1]))
+
+
+def observe_epoch(service, station, newest):
+    """Record the newest epoch (datetime/Timestamp or unix seconds) seen for a station.
+
+    The freshness gauge is computed at scrape time, so it keeps growing while
+    no new data arrives.
+    """
+    if not ENABLED or newest is None:
+        return
+    if hasattr(newest, 'timestamp'):
+        newest = newest.timestamp()
+    newest = float(newest)
+    if newest != newest:  # NaN / NaT
+        return
+    key = (service, station)
+    if key not in _newest:
+        _child(freshness, service, station).set_function(lambda: time.time() - _newest[key])
+    _newest[key] = max(newest, _newest.get(key, newest))
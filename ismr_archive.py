@@ -0,0 +1,42 @@
+"""Retained ISMR files, plain or gzipped.
+
+Downloaded `.ismr.gz` archives are kept compressed: pandas decompresses
+them while parsing (a zlib stream, no temporary file), and ISMR text
+compresses 5-8x, so the same disk holds a correspondingly longer
+retention window. Plain `.ismr` files (extracted by older releases, or
+copied in by hand) are still read.
+
+`read_files` parses many files in a process pool, so decompression and
+parsing of a backlog (startup, reprocessing) use every core.
+"""
+import glob
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+SUFFIXES = ('.ismr.gz', '.ismr')
+PATTERN = '*.ismr*'     # for file triggers; downloads in progress are hidden (.name.part)
+
+
+def list_files(directory, prefix=''):
+    """ISMR files of `directory` sorted by name; where both exist, the plain copy wins over its archive."""
+    found = {}
+    for suffix in SUFFIXES:
+        for path in glob.glob(os.path.join(directory, f"{prefix}*{suffix}")):
+            found[path[:-len(suffix)]] = path
+    return [found[stem] for stem in sorted(found)]
+
+
+def csv_path(path):
+    """The CSV written next to an ISMR file: NAME.ismr[.gz] -> NAME.csv."""
+    return re.sub(r'\.ismr(\.gz)?$', '.csv', path)
+
+
+def read_files(paths, reader, max_workers=None):
+    """reader(path) for every path, in order; several files are parsed in a process pool."""
+    paths = list(paths)
+    workers = min(len(paths), max_workers or os.cpu_count() or 1)
+    if workers <= 1:
+        return [reader(path) for path in paths]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(reader, paths))
@@ -0,0 +1,161 @@
+"""Multi-station ISMR pipeline: one process for every receiver in the station registry.
+
+Each cycle downloads all stations concurrently (thread pool, one FTP session
+per station), parses every new file of every station in a shared process pool
+with that station's coordinates for the IPP geometry, and appends the results
+to a per-station store partitioned by constellation. Metrics go to the single exporter with a
+`station` label; PNGs are written to assets/<CODE>/.
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+
+from prometheus_client import Gauge, start_http_server
+
+import constellations
+import instrumentation
+import ismr_archive
+import query_api
+import S4_Pi
+import scint_events
+import tec_assimilation
+import vtec_grid
+import VTEC_ROTI
+from ismr_store import ConstellationRings
+from profiling import profiler
+from stations import load_stations
+
+update_interval_seconds = 180
+
+store_rows_gauge = Gauge('ismr_store_rows', 'Retained ISMR observations', ['station', 'constellation'])
+store_bytes_gauge = Gauge('ismr_store_bytes', 'Memory of the retained ISMR observations', ['station', 'constellation'])
+
+
+class StationState:
+    """Everything kept per station between cycles; bounded by the retention window."""
+
+    def __init__(self, station, root_dir, retention_days=S4_Pi.retention_days):
+        self.code = station['code']
+        self.lat = station['lat']
+        self.lon = station['lon']
+        self.ftp_dir = station['ftp_dir']
+        self.prefix = station['prefix']
+        self.directory = os.path.join(root_dir, self.code)
+        os.makedirs(self.directory, exist_ok=True)
+        self.store = ConstellationRings(retention_days)
+        self.ingested = set()
+        self.renderers = None   # created by the first in-process publish
+
+    def new_files(self):
+        files = ismr_archive.list_files(self.directory, self.prefix)
+        self.ingested.intersection_update(files)
+        return [path for path in files if path not in self.ingested]
+
+
+def sync_station(state):
+    S4_Pi.download_ismr_files(state.ftp_dir, state.directory)
+    S4_Pi.remove_old_ismr_files(state.prefix, state.directory)
+
+
+def parse_file(path, lat, lon):
+    """Worker: read one ISMR file with the station's geometry and write its CSV next to it."""
+    data = S4_Pi.read_ismr(path, lat=str(lat), lon=str(lon))
+    if data is not None:
+        data.to_csv(ismr_archive.csv_path(path), index=True)
+    return path, data
+
+
+def ingest(state, path, data):
+    """Feed one parsed file to the store, the rollups, the VTEC grid and assimilation, and the event detector."""
+    state.ingested.add(path)
+    if data is not None:
+        state.store.append(data)
+        query_api.ingest_ismr(state.code, os.path.basename(path), data, state.store)
+        vtec_grid.regional.add_frame(data)
+        tec_assimilation.assimilator.add_frame(data)
+        scint_events.detector(state.code).process(data)
+        S4_Pi.export_metrics(data, state.code)
+
+
+def oldest_retained_day():
+    return min(datetime(int(d["year"]), int(d["month"]), int(d["day"])) for d in S4_Pi.get_last_three_days())
+
+
+def station_renderers(code, directory):
+    """The S4/sigma-phi and VTEC/ROTI renderers of one station; imports matplotlib."""
+    from plot_engine import ScintillationRenderer, VtecRotiRenderer
+    return (ScintillationRenderer(os.path.join(directory, f'{code}_S4_pi.png')),
+            VtecRotiRenderer(os.path.join(directory, f'{code}_VTEC_and_ROTI.png'), station=code))
+
+
+def draw(frame, renderers):
+    S4_Pi.plot_continuous_timeseries(frame, renderer=renderers[0])
+    VTEC_ROTI.plot_continuous_timeseries(frame, renderer=renderers[1])
+
+
+def publish(state, oldest_day, plot_worker=None):
+    """Expire the station's store to the retention window and redraw its plots.
+
+    With a PlotWorker the plots are drawn in its pre-imported process.
+    """
+    state.store.expire(oldest_day)
+    for name, ring in state.store.rings.items():
+        store_rows_gauge.labels(station=state.code, constellation=name).set(len(ring))
+        store_bytes_gauge.labels(station=state.code, constellation=name).set(ring.nbytes)
+    frame = state.store.to_frame(constellations.PLOT)
+    if frame.empty:
+        print(f"{state.code}: no valid data to plot")
+        return
+    if plot_worker is not None:
+        with instrumentation.stage('ismr', 'plot_worker', rows=len(frame)):
+            plot_worker.draw_station(state.code, state.directory, frame).result()
+        return
+    if state.renderers is None:
+        state.renderers = station_renderers(state.code, state.directory)
+    draw(frame, state.renderers)
+
+
+def run_cycle(states, io_pool, cpu_pool, plot_worker=None):
+    list(io_pool.map(sync_station, states))
+
+    futures = {cpu_pool.submit(parse_file, path, state.lat, state.lon): state
+               for state in states for path in state.new_files()}
+    # ingested in file order: the event detector streams each station's epochs forwards
+    for future, state in futures.items():
+        try:
+            path, data = future.result()
+        except Exception as e:
+            print(f"{state.code}: failed to parse file: {e}")
+            continue
+        ingest(state, path, data)
+
+    oldest_day = oldest_retained_day()
+    for state in states:
+        publish(state, oldest_day, plot_worker)
+    vtec_grid.publish()
+    query_api.rollups.checkpoint()
+
+
+def main(max_workers=None, plot_worker=None):
+    stations = load_stations()
+    states = [StationState(station, S4_Pi.local_dir) for station in stations]
+    print(f"ISMR pipeline for {', '.join(s.code for s in states)}")
+    query_api.start()
+    with ThreadPoolExecutor(max_workers=len(states)) as io_pool, ProcessPoolExecutor(max_workers) as cpu_pool:
+        while True:
+            print("Checking for new ISMR files...")
+            try:
+                with profiler.cycle('ismr_pipeline'):
+                    run_cycle(states, io_pool, cpu_pool, plot_worker)
+            except Exception as e:
+                print(f"Error in ISMR pipeline cycle: {e}")
+            print(f"Waiting {update_interval_seconds // 60} minutes before next check...")
+            time.sleep(update_interval_seconds)
+
+
+if __name__ == "__main__":
+    profiler.install()
+    start_http_server(8000)
+    print("Prometheus exporter running on http://localhost:8000/metrics")
+    main()
@@ -0,0 +1,220 @@
+"""Bounded in-memory store for per-epoch ISMR observations.
+
+Columns are kept as separate typed NumPy arrays (struct of arrays) with a
+capacity fixed from the retention window. Storage is twice the capacity so
+the live rows are always one contiguous slice: appends write at the tail,
+expiry just advances the head, and when the tail reaches the end the live
+rows are moved back to the front once (amortised O(1) per row). Column
+views hand out that slice without copying and are only valid until the
+next append or expiry; `to_frame()` and `between()` return copies, so the
+frames callers keep are not changed when the live rows move.
+
+ConstellationRings partitions a station's rows by constellation. Each
+constellation gets one ring, sized by the satellites it can have in view.
+The GPS-only plots then read only their ring, and every
+constellation's memory is accounted separately.
+"""
+import numpy as np
+import pandas as pd
+
+import constellations
+
+# column -> dtype; 'Time' is nanoseconds since the epoch (UTC)
+ISMR_COLUMNS = {
+    'Time': np.int64,
+    'SVID': np.int16,
+    'S4_index': np.float32,
+    'Dlat_IPP': np.float32,
+    'Dlong_IPP': np.float32,
+    'VTEC': np.float32,
+    'Phi60_Sig1_60': np.float32,
+}
+
+_NAT = np.iinfo(np.int64).min      # NaT as nanoseconds
+
+EPOCHS_PER_DAY = 1440      # 1-minute ISMR records
+MAX_ROWS_PER_EPOCH = 64    # tracked satellites above the elevation mask, all constellations
+
+
+def _batch(frame, columns):
+    """Time-sorted {name: array} of `frame` cast to the `columns` dtypes, without NaT rows, and its length.
+
+    `frame` is a DataFrame indexed by Time (as produced by read_ismr) or a dict of arrays.
+    """
+    if isinstance(frame, pd.DataFrame):
+        times = frame.index if 'Time' not in frame.columns else frame['Time']
+        cols = {'Time': pd.DatetimeIndex(times).as_unit('ns').asi8}
+        for name in columns:
+            if name != 'Time':
+                cols[name] = frame[name].to_numpy()
+    else:
+        cols = dict(frame)
+    batch = {}
+    for name, dtype in columns.items():
+        values = np.asarray(cols[name])
+        if np.issubdtype(dtype, np.integer) and values.dtype.kind == 'f':
+            values = np.nan_to_num(values, nan=0)
+        batch[name] = values.astype(dtype, copy=False)
+    # rows without a time (NaT) cannot be ordered; they would force every later append onto the merge path
+    timed = batch['Time'] != _NAT
+    if not timed.all():
+        batch = {name: values[timed] for name, values in batch.items()}
+    n = len(batch['Time'])
+    order = np.argsort(batch['Time'], kind='stable')
+    if n and np.any(order[1:] < order[:-1]):
+        batch = {name: values[order] for name, values in batch.items()}
+    return batch, n
+
+
+class ObservationRing:
+    """Fixed-capacity, time-ordered observation buffer; the oldest rows are dropped when full."""
+
+    def __init__(self, capacity, columns=ISMR_COLUMNS):
+        self.capacity = int(capacity)
+        self.columns = dict(columns)
+        self._data = {name: np.zeros(2 * self.capacity, dtype=dtype) for name, dtype in self.columns.items()}
+        self._head = 0
+        self._tail = 0
+
+    @classmethod
+    def for_retention(cls, days, columns=ISMR_COLUMNS, epochs_per_day=EPOCHS_PER_DAY,
+                      max_rows_per_epoch=MAX_ROWS_PER_EPOCH):
+        return cls(days * epochs_per_day * max_rows_per_epoch, columns)
+
+    def __len__(self):
+        return self._tail - self._head
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in self._data.values())
+
+    def view(self, name):
+        """Zero-copy view of the live rows of one column."""
+        return self._data[name][self._head:self._tail]
+
+    def time_range(self):
+        if not len(self):
+            return None
+        times = self._data['Time']
+        return times[self._head], times[self._tail - 1]
+
+    def append(self, frame):
+        """Append a batch of rows; older-than-tail batches are merged in time order."""
+        batch, n = _batch(frame, self.columns)
+        if n == 0:
+            return
+        if n > self.capacity:
+            batch = {name: values[-self.capacity:] for name, values in batch.items()}
+            n = self.capacity
+        if len(self) and batch['Time'][0] < self._data['Time'][self._tail - 1]:
+            self._merge(batch)
+            return
+        overflow = len(self) + n - self.capacity
+        if overflow > 0:
+            self._head += overflow
+        if self._tail + n > 2 * self.capacity:
+            self._compact()
+        for name, values in batch.items():
+            self._data[name][self._tail:self._tail + n] = values
+        self._tail += n
+
+    def _merge(self, batch):
+        live = {name: self.view(name) for name in self.columns}
+        merged = {name: np.concatenate((live[name], batch[name])) for name in self.columns}
+        order = np.argsort(merged['Time'], kind='stable')[-self.capacity:]
+        n = len(order)
+        for name in self.columns:
+            self._data[name][:n] = merged[name][order]
+        self._head, self._tail = 0, n
+
+    def _compact(self):
+        n = len(self)
+        for values in self._data.values():
+            values[:n] = values[self._head:self._tail]
+        self._head, self._tail = 0, n
+
+    def expire(self, before):
+        """Drop rows older than `before` (Timestamp/datetime or ns); O(log n)."""
+        if not len(self):
+            return 0
+        if not isinstance(before, (int, np.integer)):
+            before = pd.Timestamp(before).as_unit('ns').value
+        dropped = int(np.searchsorted(self.view('Time'), before, side='left'))
+        self._head += dropped
+        if not len(self):
+            self._head = self._tail = 0
+        return dropped
+
+    def to_frame(self):
+        """Time-indexed DataFrame (a copy) of the live rows."""
+        return _frame({name: self.view(name).copy() for name in self.columns})
+
+    def between(self, start, end):
+        """Time-indexed DataFrame of the rows with start <= Time <= end (ns)."""
+        times = self.view('Time')
+        lo = np.searchsorted(times, start, side='left')
+        hi = np.searchsorted(times, end, side='right')
+        return _frame({name: self.view(name)[lo:hi].copy() for name in self.columns})
+
+
+def _frame(columns):
+    index = pd.DatetimeIndex(columns['Time'].view('datetime64[ns]'), name='Time')
+    return pd.DataFrame({name: values for name, values in columns.items() if name != 'Time'},
+                        index=index, copy=False)
+
+
+class ConstellationRings:
+    """One ObservationRing per ingested constellation, with the ObservationRing interface.
+
+    Rows of constellations without a ring are dropped on append.
+    """
+
+    def __init__(self, days, names=None, columns=ISMR_COLUMNS, epochs_per_day=EPOCHS_PER_DAY):
+        names = constellations.INGEST if names is None else names
+        self.columns = dict(columns)
+        self.rings = {name: ObservationRing(days * epochs_per_day * constellations.CONSTELLATIONS[name][1], columns)
+                      for name in names}
+        self._index = {constellations.NAMES.index(name): ring for name, ring in self.rings.items()}
+
+    def __len__(self):
+        return sum(len(ring) for ring in self.rings.values())
+
+    @property
+    def nbytes(self):
+        return sum(ring.nbytes for ring in self.rings.values())
+
+    def time_range(self):
+        ranges = [ring.time_range() for ring in self.rings.values() if len(ring)]
+        if not ranges:
+            return None
+        return min(r[0] for r in ranges), max(r[1] for r in ranges)
+
+    def append(self, frame):
+        batch, n = _batch(frame, self.columns)
+        if n == 0:
+            return
+        index = constellations.index_of(batch['SVID'])
+        for code, ring in self._index.items():
+            rows = index == code
+            if rows.any():
+                ring.append({name: values[rows] for name, values in batch.items()})
+
+    def expire(self, before):
+        return sum(ring.expire(before) for ring in self.rings.values())
+
+    def _merge(self, parts):
+        # a single part is handed out as is; several are merged in time order
+        parts = [part for part in parts if len(part)]
+        if len(parts) == 1:
+            return parts[0]
+        if not parts:
+            return _frame({name: np.zeros(0, dtype) for name, dtype in self.columns.items()})
+        return pd.concat(parts).sort_index(kind='stable')
+
+    def to_frame(self, names=None):
+        """Time-indexed DataFrame of the constellations `names` (default all)."""
+        return self._merge([ring.to_frame() for name, ring in self.rings.items() if names is None or name in names])
+
+    def between(self, start, end, names=None):
+        return self._merge([ring.between(start, end) for name, ring in self.rings.items()
+                            if names is None or name in names])
@@ -0,0 +1,72 @@
+"""Fast-starting entry point for the dashboard services.
+
+    python launch.py {service,ismr,s4,vtec_roti,kindex,ethtec} [--port 8000] [--workers N] [--plot-worker]
+
+/metrics is served before any product module (pandas, matplotlib, ...) is
+imported, so a restarted service is visible to Prometheus and to the
+supervisor straight away; the product gauges appear once the module is
+loaded. With --plot-worker (ismr and service only) a pre-imported plotting
+process is started first and draws the station PNGs. The time to the first
+/metrics and the module import time are exported as
+startup_seconds{phase="metrics"|"imports"}.
+"""
+import time
+
+_started = time.perf_counter()
+
+import argparse  # noqa: E402
+import importlib  # noqa: E402
+
+from prometheus_client import Gauge, start_http_server  # noqa: E402
+
+from profiling import PROFILE_PORT, profiler  # noqa: E402
+
+METRICS_PORT = 8000
+
+# service name -> (module, entry point)
+ENTRY_POINTS = {
+    'service': ('service', 'serve'),
+    'ismr': ('ismr_pipeline', 'main'),
+    's4': ('S4_Pi', 'main'),
+    'vtec_roti': ('VTEC_ROTI', 'main'),
+    'kindex': ('ENT_Kindex', 'main_loop'),
+    'ethtec': ('EthTEC', 'main'),
+}
+PLOT_WORKER_SERVICES = ('service', 'ismr')
+
+startup_gauge = Gauge('startup_seconds', 'Time from launch to a startup milestone', ['phase'])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('name', choices=sorted(ENTRY_POINTS))
+    parser.add_argument('--port', type=int, default=METRICS_PORT)
+    parser.add_argument('--workers', type=int, default=None, help='process pool size (service, ismr)')
+    parser.add_argument('--plot-worker', action='store_true', help='draw the ISMR plots in a pre-imported process')
+    args = parser.parse_args(argv)
+    if args.plot_worker and args.name not in PLOT_WORKER_SERVICES:
+        parser.error(f"--plot-worker applies to {' and '.join(PLOT_WORKER_SERVICES)} only")
+
+    start_http_server(args.port)
+    startup_gauge.labels(phase='metrics').set(time.perf_counter() - _started)
+    print(f"Prometheus exporter running on http://localhost:{args.port}/metrics")
+    profiler.install(PROFILE_PORT if args.name == 'service' else None)
+
+    plot_worker = None
+    if args.plot_worker:
+        from plot_worker import PlotWorker
+        plot_worker = PlotWorker()
+
+    imported = time.perf_counter()
+    module_name, entry_name = ENTRY_POINTS[args.name]
+    entry = getattr(importlib.import_module(module_name), entry_name)
+    startup_gauge.labels(phase='imports').set(time.perf_counter() - imported)
+
+    if args.name in PLOT_WORKER_SERVICES:
+        entry(args.workers, plot_worker=plot_worker)
+    else:
+        entry()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""Persistent-figure renderers for the ISMR dashboard PNGs.
+
+The S4/sigma-phi and VTEC/ROTI figures are built once and kept alive between
+cycles. Each update only swaps the point data of one PathCollection per panel
+(`set_offsets`/`set_array`), colours come from vectorized thresholding into a
+ListedColormap, and the PNG is re-encoded only when the plotted data changed.
+Points are thinned to the figure's pixel grid by `decimate` before drawing.
+"""
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import matplotlib.dates as mdates
+from matplotlib.colors import BoundaryNorm, ListedColormap
+
+import decimate
+import instrumentation
+
+# Dashboard colour classes: low / moderate / strong
+LEVEL_CMAP = ListedColormap(['b', 'g', 'r'])
+LEVEL_NORM = BoundaryNorm([0, 1, 2, 3], LEVEL_CMAP.N)
+S4_THRESHOLDS = (0.5, 0.8)
+PHI60_THRESHOLDS = (0.4, 0.7)
+
+
+def threshold_levels(values, thresholds):
+    """0/1/2 colour class per value: <= low, <= high, above (same edges as the old per-point lambda)."""
+    return np.digitize(values, thresholds, right=True).astype(np.int8)
+
+
+def prn_colour_index(svids, ncolors):
+    """Index into the default colour cycle per PRN, in ascending PRN order like a groupby loop."""
+    svids = np.asarray(svids)
+    return np.searchsorted(np.unique(svids), svids) % ncolors
+
+
+def _time_offsets(index, values):
+    return np.column_stack((mdates.date2num(index.values), np.asarray(values, dtype=float)))
+
+
+def _time_window(index):
+    start_date = index.min().normalize()
+    end_date = index.max().normalize() + pd.Timedelta(days=1)
+    return start_date, end_date
+
+
+def _digest(*arrays):
+    h = hashlib.blake2b(digest_size=16)
+    for a in arrays:
+        a = np.ascontiguousarray(a)
+        h.update(str(a.shape).encode())
+        h.update(a.data)
+    return h.hexdigest()
+
+
+class _Renderer:
+    """Common figure lifetime, x-axis and change detection for the dashboard renderers."""
+
+    def __init__(self, output_path, bg_color='black', plot_bg='black', figsize=(12, 9), edgecolor='white',
+                 target_pixels=decimate.TARGET_PIXELS, decimation=decimate.MODE):
+        self.output_path = output_path
+        self.edgecolor = edgecolor
+        self.target_pixels = target_pixels
+        self.decimation = decimation
+        self.fig, self.ax = plt.subplots(2, 1, figsize=figsize)
+        self.fig.patch.set_facecolor(bg_color)
+        for a in self.ax:
+            a.set_facecolor(plot_bg)
+        self._digest = None
+        self._window = None
+        self.renders = 0
+
+    def _set_time_window(self, start_date, end_date):
+        """Re-tick the shared time axis; returns True if the window moved."""
+        if self._window == (start_date, end_date):
+            return False
+        self._window = (start_date, end_date)
+        time_ticks = pd.date_range(start=start_date, end=end_date, freq='6h')
+        tick_pos = mdates.date2num(time_ticks.values)
+        for a in self.ax:
+            a.set_xlim(mdates.date2num(start_date.to_datetime64()), mdates.date2num(end_date.to_datetime64()))
+            a.set_xticks(tick_pos)
+            a.set_xticklabels([t.strftime('%H:%M') for t in time_ticks], rotation=0, color='white')
+        return True
+
+    def _thin(self, ax, offsets, groups, marker_size, y_range):
+        """Positions of `offsets` worth drawing on `ax` at the target pixel width."""
+        if self.decimation is None or self.target_pixels is None or len(offsets) == 0:
+            return np.arange(len(offsets))
+        # one cell per marker diameter of the axes area, at the target figure width
+        fig_w, fig_h = self.fig.get_size_inches()
+        px_per_inch = self.target_pixels / fig_w
+        marker_px = max(np.sqrt(marker_size) / 72 * px_per_inch, 1.0)
+        box = ax.get_position()
+        nx = max(int(box.width * fig_w * px_per_inch / marker_px), 1)
+        ny = max(int(box.height * fig_h * px_per_inch / marker_px), 1)
+        if self.decimation == 'lttb':
+            return decimate.decimate_indices(offsets[:, 0], offsets[:, 1], nx, 'lttb', groups)
+        return decimate.minmax_indices(offsets[:, 0], offsets[:, 1], nx, groups, ax.get_xlim(), ny, y_range)
+
+    def _changed(self, *arrays):
+        digest = _digest(*arrays)
+        # an unchanged digest is a hit on the last encoded PNG
+        instrumentation.cache_lookup('png_' + os.path.basename(self.output_path), digest == self._digest)
+        if digest == self._digest:
+            return False
+        self._digest = digest
+        return True
+
+    def _save(self, relayout):
+        if relayout:
+            self.fig.tight_layout()
+        self.fig.savefig(self.output_path, edgecolor=self.edgecolor, facecolor=self.fig.get_facecolor())
+        self.renders += 1
+
+    def close(self):
+        plt.close(self.fig)
+
+
+class ScintillationRenderer(_Renderer):
+    """S4 (top) and sigma-phi 60 s (bottom) scatter panels coloured by scintillation level."""
+
+    def __init__(self, output_path, bg_color='black', plot_bg='black', **kwargs):
+        super().__init__(output_path, bg_color, plot_bg, figsize=(12, 9), edgecolor='white', **kwargs)
+        ax = self.ax
+        self.s4_points = ax[0].scatter(np.empty(0), np.empty(0), c=np.empty(0), cmap=LEVEL_CMAP, norm=LEVEL_NORM, s=5)
+        self.phi_points = ax[1].scatter(np.empty(0), np.empty(0), c=np.empty(0), cmap=LEVEL_CMAP, norm=LEVEL_NORM, s=5)
+        self._day_labels = []
+
+        ax[0].set_xlabel('Time (UT)', fontsize=18, color='white')
+        ax[0].set_ylabel('S4', fontsize=18, color='white')
+        ax[0].set_title('Amplitude Scintillation ', fontsize=18, fontweight='bold', color='white')
+        ax[0].scatter([], [], color='b', label='Low (S4 < 0.5)', s=40)
+        ax[0].scatter([], [], color='g', label='Moderate (0.5 < S4 < 0.8)', s=40)
+        ax[0].scatter([], [], color='r', label='Strong (S4 > 0.8)', s=40)
+
+        ax[1].set_xlabel('Time (UT)', fontsize=14)
+        ax[1].set_ylabel(r'$\sigma_{\phi} (1 min)$', fontsize=18, color='white')
+        ax[1].set_title('Phase Scintillation', fontsize=18, fontweight='bold', color='white')
+        ax[1].scatter([], [], color='b', label=r'Low ($\sigma_{\phi} < 0.4$)', s=40)
+        ax[1].scatter([], [], color='g', label=r'Moderate ($0.4 < \sigma_{\phi} < 0.7$)', s=40)
+        ax[1].scatter([], [], color='r', label=r'Strong ($\sigma_{\phi} > 0.7$)', s=40)
+
+        for a in ax:
+            a.set_ylim(0, 1.5)
+            a.tick_params(axis='both', labelsize='18', colors='white')
+            a.grid(True, linestyle='--', linewidth=0.5, alpha=0.7)
+            a.legend(loc='upper right', fontsize=14)
+
+    def render(self, filtered_data):
+        """Plot S4_index and Phi60_Sig1_60 of a time-indexed frame; returns True if the PNG was rewritten."""
+        s4 = filtered_data['S4_index'].to_numpy(dtype=float)
+        phi = filtered_data['Phi60_Sig1_60'].to_numpy(dtype=float)
+        s4_offsets = _time_offsets(filtered_data.index, s4)
+        if not self._changed(s4_offsets, phi):
+            return False
+        phi_offsets = s4_offsets.copy()
+        phi_offsets[:, 1] = phi
+        start_date, end_date = _time_window(filtered_data.index)
+        moved = self._set_time_window(start_date, end_date)
+
+        for points, offsets, levels in ((self.s4_points, s4_offsets, threshold_levels(s4, S4_THRESHOLDS)),
+                                        (self.phi_points, phi_offsets, threshold_levels(phi, PHI60_THRESHOLDS))):
+            # thin per colour class so every drawn cell keeps its own extremes
+            keep = self._thin(points.axes, offsets, levels, 5, (0, 1.5))
+            points.set_offsets(offsets[keep])
+            points.set_array(levels[keep])
+
+        if moved:
+            for label in self._day_labels:
+                label.remove()
+            mids = pd.date_range(start=start_date, end=end_date - pd.Timedelta(days=1), freq='D') + pd.Timedelta(hours=12)
+            self._day_labels = [
+                self.ax[1].text(mdates.date2num(mid.to_datetime64()), -0.3, mid.strftime('%Y-%m-%d'),
+                                horizontalalignment='center', fontsize=18, color='white')
+                for mid in mids
+            ]
+        self._save(relayout=moved)
+        return True
+
+
+class VtecRotiRenderer(_Renderer):
+    """Per-PRN VTEC with the epoch mean (top) and per-PRN ROTI (bottom)."""
+
+    def __init__(self, output_path, bg_color='black', plot_bg='black', station='ENTG', **kwargs):
+        super().__init__(output_path, bg_color, plot_bg, figsize=(12, 8), edgecolor='black', **kwargs)
+        self.station = station
+        colors = plt.rcParams['axes.prop_cycle'].by_key()['color']
+        self.prn_cmap = ListedColormap(colors)
+        self.prn_norm = BoundaryNorm(np.arange(len(colors) + 1), len(colors))
+        ax = self.ax
+        self.vtec_points = ax[0].scatter(np.empty(0), np.empty(0), c=np.empty(0), cmap=self.prn_cmap, norm=self.prn_norm, s=15)
+        self.mean_points = ax[0].scatter(np.empty(0), np.empty(0), color='blue', s=10, label='Mean VTEC')
+        self.roti_points = ax[1].scatter(np.empty(0), np.empty(0), c=np.empty(0), cmap=self.prn_cmap, norm=self.prn_norm, s=15)
+        for i, ylabel in enumerate(['VTEC (TECU)', 'ROTI (TECU/min)']):
+            ax[i].set_xlabel('Time (UT)', fontsize=18, color='white')
+            ax[i].set_ylabel(ylabel, fontsize=16, color='white')
+            ax[i].tick_params(axis='both', labelsize=18, colors='white')
+            ax[i].grid(True, linestyle='--', alpha=0.7)
+        ax[1].set_title('Rate of TEC Index', fontsize=18, fontweight='bold', color='white')
+        ax[1].set_ylim(0, 1.0)
+        self.fig.subplots_adjust(right=0.95)
+
+    def render(self, filtered_data, valid_data, updated=None):
+        """Plot VTEC of `filtered_data` and ROTI of `valid_data` (both time-indexed with SVID)."""
+        vtec = filtered_data['VTEC'].to_numpy(dtype=float)
+        keep = ~np.isnan(vtec)
+        vtec_offsets = _time_offsets(filtered_data.index[keep], vtec[keep])
+        vtec_svid = filtered_data['SVID'].to_numpy()[keep]
+
+        mean_vtec = filtered_data.groupby(level=0)['VTEC'].mean().dropna()
+        mean_offsets = _time_offsets(mean_vtec.index, mean_vtec.values)
+
+        roti = valid_data['ROTI'].to_numpy(dtype=float)
+        keep = ~np.isnan(roti)
+        roti_offsets = _time_offsets(valid_data.index[keep], roti[keep])
+        roti_svid = valid_data['SVID'].to_numpy()[keep]
+
+        if not self._changed(vtec_offsets, vtec_svid, roti_offsets, roti_svid):
+            return False
+
+        vtec_max = mean_vtec.max() if not mean_vtec.empty else 20
+        self.ax[0].set_ylim(0, vtec_max + 20)
+        moved = self._set_time_window(*_time_window(filtered_data.index))
+
+        ncolors = self.prn_cmap.N
+        keep = self._thin(self.ax[0], vtec_offsets, vtec_svid, 15, (0, vtec_max + 20))
+        self.vtec_points.set_offsets(vtec_offsets[keep])
+        self.vtec_points.set_array(prn_colour_index(vtec_svid, ncolors)[keep])
+        keep = self._thin(self.ax[0], mean_offsets, None, 10, (0, vtec_max + 20))
+        self.mean_points.set_offsets(mean_offsets[keep])
+        keep = self._thin(self.ax[1], roti_offsets, roti_svid, 15, (0, 1.0))
+        self.roti_points.set_offsets(roti_offsets[keep])
+        self.roti_points.set_array(prn_colour_index(roti_svid, ncolors)[keep])
+
+        updated = updated or pd.Timestamp.now()
+        self.ax[0].set_title(f"{self.station} GNSS Total Electron Content: Last Updated: {updated.strftime('%Y-%m-%d %H:%M:%S')}",
+                             fontsize=18, fontweight='bold', color='white')
+        self._save(relayout=moved)
+        return True
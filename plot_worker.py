@@ -0,0 +1,49 @@
+"""A plotting process that has matplotlib imported before it is needed.
+
+The worker is forked from a multiprocessing forkserver that preloads
+plot_engine (matplotlib, Agg) and ismr_pipeline while the main process is
+still starting, so neither the service nor its first cycle pays the
+matplotlib import. The process is kept for the life of the service and
+holds each station's renderers, so unchanged PNGs are still skipped.
+
+    worker = PlotWorker()          # as early as possible, e.g. in launch.py
+    ismr_pipeline.main(plot_worker=worker)
+
+Stage timings measured inside the worker stay in its own registry; the
+caller records the whole draw as ('ismr', 'plot_worker').
+"""
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+PRELOAD = ['plot_engine', 'ismr_pipeline']
+
+_renderers = {}   # in the worker: station code -> renderers
+
+
+def _ready():
+    return True
+
+
+def _draw_station(code, directory, frame):
+    import ismr_pipeline
+    renderers = _renderers.get(code)
+    if renderers is None:
+        renderers = _renderers[code] = ismr_pipeline.station_renderers(code, directory)
+    ismr_pipeline.draw(frame, renderers)
+
+
+class PlotWorker:
+    def __init__(self):
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload(PRELOAD)
+        self._pool = ProcessPoolExecutor(max_workers=1, mp_context=context)
+        # starting the forkserver waits for its imports; do it off the caller's thread
+        threading.Thread(target=self._pool.submit, args=(_ready,), daemon=True, name='plot-worker').start()
+
+    def draw_station(self, code, directory, frame):
+        """Future for drawing one station's S4/sigma-phi and VTEC/ROTI PNGs from `frame`."""
+        return self._pool.submit(_draw_station, code, directory, frame)
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
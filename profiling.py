@@ -0,0 +1,185 @@
+"""On-demand profiling of the next N cycles of a running service.
+
+Arm it without restarting the process:
+
+    kill -USR1 <pid>                 profile the next PROFILE_CYCLES cycles
+    kill -USR2 <pid>                 same, with tracemalloc allocation tracking
+    curl 'localhost:8002/profile?cycles=5&memory=1&stage=s4_process'
+    curl  localhost:8002/profile     status
+
+Each armed cycle (a scheduler stage run, an ismr_pipeline cycle or a
+service task step) runs under cProfile in the thread that executes it and
+writes to PROFILE_DIR:
+
+    <stage>-<utc time>.prof   pstats data (snakeviz / python -m pstats)
+    <stage>-<utc time>.txt    top functions by cumulative time, the cycle's
+                              input sizes (rows/bytes counted by the
+                              instrumentation stages during the cycle) and,
+                              with memory tracking, the peak traced memory and
+                              the top sites of allocations still alive
+"""
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import signal
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from prometheus_client import REGISTRY
+
+PROFILE_DIR = os.environ.get('DASHBOARD_PROFILE_DIR', 'profiles')
+PROFILE_CYCLES = int(os.environ.get('DASHBOARD_PROFILE_CYCLES', '3'))
+PROFILE_PORT = 8002
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 25
+
+
+def _work_counters():
+    # rows/bytes the instrumentation stages have counted so far, per (service, stage, kind)
+    counts = {}
+    for metric in REGISTRY.collect():
+        if metric.name not in ('pipeline_rows', 'pipeline_bytes'):
+            continue
+        for sample in metric.samples:
+            if sample.name.endswith('_total'):
+                key = (sample.labels['service'], sample.labels['stage'], metric.name.split('_')[1])
+                counts[key] = sample.value
+    return counts
+
+
+class Profiler:
+    def __init__(self, out_dir=PROFILE_DIR):
+        self.out_dir = out_dir
+        self._lock = threading.Lock()
+        self._remaining = 0
+        self._memory = False
+        self._stage = None
+        self._tracing = 0
+
+    def request(self, cycles=PROFILE_CYCLES, memory=False, stage=None):
+        """Profile the next `cycles` cycles (of `stage` only, if given)."""
+        with self._lock:
+            self._remaining = cycles
+            self._memory = memory
+            self._stage = stage
+        logging.info(f"Profiling the next {cycles} cycle(s){' of ' + stage if stage else ''}"
+                     f"{' with allocation tracking' if memory else ''}")
+
+    def status(self):
+        with self._lock:
+            return {'remaining': self._remaining, 'memory': self._memory, 'stage': self._stage,
+                    'out_dir': os.path.abspath(self.out_dir)}
+
+    def _claim(self, name):
+        with self._lock:
+            if self._remaining <= 0 or (self._stage is not None and self._stage != name):
+                return None
+            self._remaining -= 1
+            return self._memory
+
+    @contextmanager
+    def cycle(self, name):
+        """Profile this cycle if profiling is armed; unarmed, this is one attribute read."""
+        memory = self._claim(name) if self._remaining > 0 else None
+        if memory is None:
+            yield
+            return
+        before = _work_counters()
+        if memory:
+            with self._lock:
+                if self._tracing == 0:
+                    tracemalloc.start(10)
+                self._tracing += 1
+        profile = cProfile.Profile()
+        started = time.perf_counter()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            elapsed = time.perf_counter() - started
+            snapshot = (tracemalloc.take_snapshot(), tracemalloc.get_traced_memory()[1]) if memory else None
+            if memory:
+                with self._lock:
+                    self._tracing -= 1
+                    if self._tracing == 0:
+                        tracemalloc.stop()
+            self._dump(name, profile, elapsed, before, _work_counters(), snapshot)
+
+    def wrap(self, name, fn):
+        """`fn` run under `cycle(name)`, for work handed to an executor thread."""
+        def run(*args, **kwargs):
+            with self.cycle(name):
+                return fn(*args, **kwargs)
+        return run
+
+    def _dump(self, name, profile, elapsed, before, after, snapshot):
+        os.makedirs(self.out_dir, exist_ok=True)
+        stem = os.path.join(self.out_dir, f"{name}-{datetime.now(timezone.utc):%Y%m%dT%H%M%S.%f}")
+        profile.dump_stats(stem + '.prof')
+
+        inputs = {f"{service}.{stage}.{kind}": int(value - before.get((service, stage, kind), 0))
+                  for (service, stage, kind), value in after.items()
+                  if value != before.get((service, stage, kind), 0)}
+        text = io.StringIO()
+        text.write(f"cycle {name}: {elapsed:.3f} s\n")
+        text.write(f"input sizes: {json.dumps(inputs, sort_keys=True)}\n\n")
+        pstats.Stats(profile, stream=text).sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+        if snapshot is not None:
+            snapshot, peak = snapshot
+            text.write(f"\npeak traced memory: {peak / 2**20:.1f} MB\n")
+            text.write("allocations still live at the end of the cycle (size, count):\n")
+            for stat in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]:
+                text.write(f"{stat.size / 2**20:9.2f} MB {stat.count:8d}  {stat.traceback}\n")
+        with open(stem + '.txt', 'w') as f:
+            f.write(text.getvalue())
+        logging.info(f"Profile of {name} written to {stem}.prof/.txt")
+
+    def _handler(self):
+        profiler = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path != '/profile':
+                    return self._send(404, {'error': 'not found'})
+                query = parse_qs(url.query)
+                if 'cycles' in query or 'memory' in query or 'stage' in query:
+                    profiler.request(int(query.get('cycles', [PROFILE_CYCLES])[0]),
+                                     query.get('memory', ['0'])[0] in ('1', 'true'),
+                                     query.get('stage', [None])[0])
+                self._send(200, profiler.status())
+
+            def _send(self, status, body):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def install(self, port=None):
+        """SIGUSR1/SIGUSR2 handlers (main thread only) and, with `port`, the /profile endpoint."""
+        if hasattr(signal, 'SIGUSR1') and threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGUSR1, lambda *_: self.request())
+            signal.signal(signal.SIGUSR2, lambda *_: self.request(memory=True))
+        if port is not None:
+            httpd = ThreadingHTTPServer(('', port), self._handler())
+            threading.Thread(target=httpd.serve_forever, daemon=True, name='profiling').start()
+        return self
+
+
+profiler = Profiler()
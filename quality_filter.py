@@ -0,0 +1,150 @@
+"""Quality control of ISMR rows: declarative rules evaluated in one fused pass.
+
+Rules are read from ismr_quality.json when present, e.g.
+
+    [{"name": "lock_time", "column": "Sig1_lock_time", "min": 300},
+     {"name": "blacklist", "column": "SVID", "exclude": ["G04", "E14"]}]
+
+Each rule constrains one numeric column with `min` and/or `max` (a number,
+or the name of another column), or lists the satellites to `exclude` (RINEX
+labels such as 'G04', or Septentrio SVIDs). Rows whose value is missing
+fail the rule unless it sets "missing": "keep". The "elevation" rule takes
+its limit from read_ismr's `elevation_mask`. Without the file only the
+elevation rule is applied; lock-time, C/N0 or S4-correction cuts such as
+
+    {"name": "cn0", "column": "Sig1", "min": 30, "max": 60}
+
+are opt-in.
+
+A rule set is compiled once into a list of NumPy comparisons that write
+into two preallocated boolean buffers. A batch therefore costs one pass per
+rule and no temporaries, however many rules there are. Rejected rows are
+dropped in read_ismr before GPS time, S4/VTEC and IPP geometry are
+computed. Rows failing each rule are counted in
+ismr_quality_rejected_total{service,rule}; a row failing two rules is
+counted under both.
+"""
+import json
+import os
+
+import numpy as np
+from prometheus_client import Counter
+
+import constellations
+
+QUALITY_FILE = 'ismr_quality.json'
+
+# without ismr_quality.json only the elevation mask applies, as in the original read_ismr
+DEFAULT_RULES = [
+    {"name": "elevation", "column": "Elevation", "min": 20},
+]
+
+rejected_counter = Counter('ismr_quality_rejected', 'ISMR rows failing a quality rule', ['service', 'rule'])
+
+_ALL_LABELS = constellations.labels(np.arange(256))
+
+
+def load_rules(path=QUALITY_FILE):
+    """List of rule dicts (name, column, min/max or exclude, missing)."""
+    if os.path.exists(path):
+        with open(path) as f:
+            rules = json.load(f)
+    else:
+        rules = [dict(rule) for rule in DEFAULT_RULES]
+    for rule in rules:
+        rule.setdefault('missing', 'reject')
+        if rule['missing'] not in ('reject', 'keep'):
+            raise ValueError(f"{path}: rule {rule['name']}: missing must be 'reject' or 'keep'")
+    return rules
+
+
+def _excluded_svids(entries):
+    # 256-entry table; True for the SVIDs of every blacklisted satellite
+    table = np.zeros(256, bool)
+    for entry in entries:
+        if isinstance(entry, str) and not entry.isdigit():
+            found = _ALL_LABELS == entry.upper()
+            if not found.any():
+                raise ValueError(f"unknown satellite {entry!r} in the quality blacklist")
+            table |= found
+        else:
+            table[int(entry)] = True
+    return table
+
+
+class QualityFilter:
+    """A compiled rule set; `keep(data)` evaluates every rule over a DataFrame in one fused pass."""
+
+    def __init__(self, rules):
+        self.rules = []         # (name, column, [(ufunc, limit)], table, keep_missing)
+        self.columns = set()
+        for rule in rules:
+            column = rule['column']
+            table = None
+            if 'exclude' in rule:
+                table = _excluded_svids(rule['exclude'])
+                if not table.any():
+                    continue
+            bounds = [(ufunc, rule[key]) for key, ufunc in (('min', np.greater_equal), ('max', np.less_equal))
+                      if rule.get(key) is not None]
+            if table is None and not bounds:
+                continue
+            self.columns.add(column)
+            self.columns.update(limit for _, limit in bounds if isinstance(limit, str))
+            self.rules.append((rule['name'], column, bounds, table, rule['missing'] == 'keep'))
+
+    def keep(self, data, service=None):
+        """Boolean mask of the rows of `data` passing every rule; rejections are counted per rule."""
+        n = len(data)
+        keep = np.ones(n, bool)
+        passed = np.empty(n, bool)
+        scratch = np.empty(n, bool)
+        for name, column, bounds, table, keep_missing in self.rules:
+            values = data[column].to_numpy(np.float64)
+            if table is not None:
+                index = np.nan_to_num(values, nan=0).astype(np.intp)
+                np.clip(index, 0, 255, out=index)
+                np.take(table, index, out=passed)
+                np.logical_not(passed, out=passed)
+            else:
+                passed.fill(True)
+                for ufunc, limit in bounds:
+                    if isinstance(limit, str):
+                        limit = data[limit].to_numpy(np.float64)
+                    ufunc(values, limit, out=scratch)
+                    passed &= scratch
+                if keep_missing:
+                    np.isnan(values, out=scratch)
+                    passed |= scratch
+            rejected = n - np.count_nonzero(passed)
+            if rejected and service is not None:
+                rejected_counter.labels(service=service, rule=name).inc(rejected)
+            keep &= passed
+        return keep
+
+
+rules = load_rules()
+_compiled = {}      # elevation mask -> QualityFilter over `rules`
+
+
+def compiled(elevation_mask=None):
+    """`rules` compiled, with the elevation rule's limit replaced by `elevation_mask` (when given)."""
+    qc = _compiled.get(elevation_mask)
+    if qc is None:
+        ruleset = [dict(rule) for rule in rules]
+        if elevation_mask is not None:
+            elevation = next((rule for rule in ruleset if rule['name'] == 'elevation'), None)
+            if elevation is None:
+                elevation = {'name': 'elevation', 'column': 'Elevation', 'missing': 'reject'}
+                ruleset.insert(0, elevation)
+            elevation['min'] = elevation_mask
+        qc = _compiled[elevation_mask] = QualityFilter(ruleset)
+    return qc
+
+
+def apply(data, elevation_mask=None, service=None):
+    """Rows of `data` passing the quality rules (the frame itself when none is rejected)."""
+    keep = compiled(elevation_mask).keep(data, service)
+    if keep.all():
+        return data
+    return data[keep]
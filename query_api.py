@@ -0,0 +1,423 @@
+"""Time-range query API over incrementally maintained rollups, for Grafana.
+
+Every ingested observation is folded into 1-min, 10-min and 1-h buckets of
+count/sum/min/max per (station, field, SVID); queries pick the finest level
+whose bucket count fits the requested resolution, so a month-wide panel reads
+~720 hourly buckets per SVID and never touches raw epochs. Each level is kept
+as one array per statistic, sorted by the composite key bucket * SVID_SLOTS +
+SVID: a time range is one contiguous slice (two binary searches), appends land
+at the tail and expiry advances the head, as in ObservationRing.
+
+Fields: S4_index, Phi60_Sig1_60, VTEC and ROTI per station and SVID (fed by
+ismr_pipeline.ingest), K_index per magnetometer station with SVID 0 (fed by
+ENT_Kindex.update_k_index). Rollups are saved to ROLLUP_FILE by the process
+that serves them, so restarts keep the long levels.
+
+Endpoints on QUERY_PORT:
+
+    GET  /                          health check
+    POST /search, POST /metrics     targets "STATION:FIELD" (Grafana JSON datasource)
+    POST /query                     Grafana JSON datasource query; a target
+                                    "STATION:FIELD[:SVID]" returns one series per
+                                    SVID, payload {"agg": "mean|min|max|count"}
+    GET  /api/series?station=&field=&svid=&from=&to=&agg=&max_points=
+                                    flat rows for the Infinity datasource;
+                                    from/to as ISO time or epoch milliseconds
+"""
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+import instrumentation
+
+QUERY_PORT = 8003
+ROLLUP_FILE = os.path.join('assets', 'rollups.npz')
+SVID_SLOTS = 1024          # composite key = bucket * SVID_SLOTS + SVID
+ISMR_FIELDS = ('S4_index', 'Phi60_Sig1_60', 'VTEC')
+AGGREGATES = ('mean', 'min', 'max', 'count')
+DEFAULT_MAX_POINTS = 1000
+ROTI_CONTEXT_NS = 6 * 60 * 10**9   # 5-min ROTI window plus the first ROT difference
+
+# name -> (bucket seconds, retention seconds)
+LEVELS = {
+    '1min': (60, 8 * 86400),
+    '10min': (600, 92 * 86400),
+    '1h': (3600, 3 * 366 * 86400),
+}
+_STATS = ('keys', 'count', 'sum', 'min', 'max')
+
+
+class Rollup:
+    """count/sum/min/max per (time bucket, SVID) for one field at one resolution."""
+
+    def __init__(self, step_seconds, retention_seconds, capacity=1024):
+        self.step = step_seconds * 10**9
+        self.retention = retention_seconds * 10**9
+        self._data = {'keys': np.zeros(capacity, np.int64), 'count': np.zeros(capacity, np.int64),
+                      'sum': np.zeros(capacity), 'min': np.zeros(capacity), 'max': np.zeros(capacity)}
+        self._head = 0
+        self._tail = 0
+
+    def __len__(self):
+        return self._tail - self._head
+
+    def view(self, name):
+        return self._data[name][self._head:self._tail]
+
+    def add(self, times, svids, values, replace=False):
+        """Fold samples (ns, SVID, value) in; with `replace` a sample overwrites its bucket.
+
+        `replace` is meant for series with at most one sample per bucket that
+        get recomputed, such as the 3-hourly K-index.
+        """
+        keys = times // self.step * SVID_SLOTS + svids
+        order = np.argsort(keys, kind='stable')
+        keys, values = keys[order], values[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        batch = {'keys': keys[starts],
+                 'count': np.diff(np.r_[starts, len(keys)]),
+                 'sum': np.add.reduceat(values, starts),
+                 'min': np.minimum.reduceat(values, starts),
+                 'max': np.maximum.reduceat(values, starts)}
+        if replace:
+            # the last sample of each bucket wins
+            last = np.r_[starts[1:], len(keys)] - 1
+            batch.update(count=np.ones(len(starts), np.int64), sum=values[last], min=values[last],
+                         max=values[last])
+
+        live = self.view('keys')
+        pos = np.searchsorted(live, batch['keys'])
+        found = pos < len(live)
+        found[found] = live[pos[found]] == batch['keys'][found]
+        if found.any():
+            at = self._head + pos[found]
+            if replace:
+                for name in ('count', 'sum', 'min', 'max'):
+                    self._data[name][at] = batch[name][found]
+            else:
+                self._data['count'][at] += batch['count'][found]
+                self._data['sum'][at] += batch['sum'][found]
+                np.minimum.at(self._data['min'], at, batch['min'][found])
+                np.maximum.at(self._data['max'], at, batch['max'][found])
+        new = ~found
+        if new.any():
+            self._insert({name: values[new] for name, values in batch.items()})
+        self._expire()
+
+    def _insert(self, batch):
+        n = len(batch['keys'])
+        if len(self) and batch['keys'][0] < self._data['keys'][self._tail - 1]:
+            # late data: rebuild the live slice in key order
+            merged = {name: np.concatenate((self.view(name), batch[name])) for name in _STATS}
+            order = np.argsort(merged['keys'], kind='stable')
+            batch = {name: values[order] for name, values in merged.items()}
+            n = len(order)
+            self._head = self._tail = 0
+        if self._tail + n > len(self._data['keys']):
+            capacity = max(2 * (len(self) + n), 1024)
+            for name, values in self._data.items():
+                grown = np.zeros(capacity, values.dtype)
+                grown[:len(self)] = values[self._head:self._tail]
+                self._data[name] = grown
+            self._head, self._tail = 0, len(self)
+        for name in _STATS:
+            self._data[name][self._tail:self._tail + n] = batch[name]
+        self._tail += n
+
+    def _expire(self):
+        if not len(self):
+            return
+        newest = self._data['keys'][self._tail - 1] // SVID_SLOTS * self.step
+        cutoff = (newest - self.retention) // self.step * SVID_SLOTS
+        self._head += int(np.searchsorted(self.view('keys'), cutoff))
+
+    def query(self, start, end, svid=None):
+        """Buckets overlapping [start, end) ns as {'time', 'svid', 'count', 'sum', 'min', 'max'} arrays."""
+        live = self.view('keys')
+        lo = np.searchsorted(live, start // self.step * SVID_SLOTS)
+        hi = np.searchsorted(live, ((end - 1) // self.step + 1) * SVID_SLOTS)
+        keys = live[lo:hi]
+        # copies: the caller reads them after the store's lock is released
+        rows = {name: self.view(name)[lo:hi].copy() for name in ('count', 'sum', 'min', 'max')}
+        rows['time'] = keys // SVID_SLOTS * self.step
+        rows['svid'] = keys % SVID_SLOTS
+        if svid is not None:
+            mask = rows['svid'] == svid
+            rows = {name: values[mask] for name, values in rows.items()}
+        return rows
+
+    def state(self):
+        return {name: self.view(name).copy() for name in _STATS}
+
+    def restore(self, state):
+        self._data = {name: np.array(state[name]) for name in _STATS}
+        self._head, self._tail = 0, len(self._data['keys'])
+
+
+class RollupStore:
+    """Rollup levels per (station, field), shared by the ingest paths and the HTTP server."""
+
+    def __init__(self, levels=LEVELS):
+        self.levels = dict(levels)
+        self.series = {}
+        self.sources = {}   # (station, source) -> newest epoch (ns): re-ingesting a file is a no-op
+        self.path = None    # set by start(); only the serving process saves
+        self.dirty = False
+        self._lock = threading.Lock()
+
+    def _levels(self, station, field):
+        levels = self.series.get((station, field))
+        if levels is None:
+            levels = self.series[(station, field)] = {name: Rollup(step, retention)
+                                                      for name, (step, retention) in self.levels.items()}
+        return levels
+
+    def add(self, station, field, times, svids, values, replace=False):
+        times = np.asarray(times, np.int64)
+        values = np.asarray(values, np.float64)
+        svids = np.broadcast_to(np.asarray(svids, np.int64), times.shape)
+        valid = np.isfinite(values)
+        if not valid.any():
+            return
+        times, svids, values = times[valid], svids[valid], values[valid]
+        with self._lock:
+            for rollup in self._levels(station, field).values():
+                rollup.add(times, svids, values, replace)
+            self.dirty = True
+
+    def add_frame(self, station, frame, fields, source=None):
+        """Fold a Time-indexed frame with an SVID column in; a known `source` is skipped."""
+        if source is not None and (station, source) in self.sources:
+            return False
+        times = pd.DatetimeIndex(frame.index).as_unit('ns').asi8
+        svids = frame['SVID'].to_numpy(np.int64)
+        for field in fields:
+            self.add(station, field, times, svids, frame[field].to_numpy(np.float64))
+        if source is not None and len(times):
+            with self._lock:
+                self.sources[(station, source)] = int(times.max())
+                # forget sources older than the longest level
+                horizon = self.sources[(station, source)] - max(r for _, r in self.levels.values()) * 10**9
+                self.sources = {key: newest for key, newest in self.sources.items() if newest >= horizon}
+        return True
+
+    def targets(self):
+        with self._lock:
+            return sorted(f"{station}:{field}" for station, field in self.series)
+
+    def level_for(self, start, end, max_points=DEFAULT_MAX_POINTS, interval_ms=None):
+        """Finest level with at most `max_points` buckets per series and buckets >= `interval_ms`."""
+        names = sorted(self.levels, key=lambda name: self.levels[name][0])
+        for name in names:
+            step = self.levels[name][0]
+            if (end - start) / (step * 1e9) <= max_points and (interval_ms is None or step * 1000 >= interval_ms):
+                return name
+        return names[-1]
+
+    def query(self, station, field, start, end, svid=None, agg='mean', max_points=DEFAULT_MAX_POINTS,
+              interval_ms=None):
+        """{svid: (bucket start ms, value)} over [start, end) ns, from the level chosen by level_for."""
+        level = self.level_for(start, end, max_points, interval_ms)
+        with instrumentation.stage('query', level) as timed:
+            with self._lock:
+                levels = self.series.get((station, field))
+                if levels is None:
+                    return {}
+                rows = levels[level].query(start, end, svid)
+            if agg == 'mean':
+                values = rows['sum'] / rows['count']
+            else:
+                values = rows[agg].astype(np.float64)
+            times_ms = rows['time'] // 10**6
+            order = np.argsort(rows['svid'], kind='stable')
+            svids = rows['svid'][order]
+            bounds = np.flatnonzero(np.r_[True, svids[1:] != svids[:-1], True]) if len(svids) else []
+            timed.rows = len(values)
+            return {int(svids[a]): (times_ms[order[a:b]], values[order[a:b]])
+                    for a, b in zip(bounds[:-1], bounds[1:])}
+
+    def save(self, path=None):
+        path = path or self.path
+        if path is None:
+            return
+        with self._lock:
+            arrays = {f"{station}|{field}|{level}|{name}": values
+                      for (station, field), levels in self.series.items()
+                      for level, rollup in levels.items()
+                      for name, values in rollup.state().items()}
+            arrays['sources'] = np.array(json.dumps([[s, src, t] for (s, src), t in self.sources.items()]))
+            self.dirty = False
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, path)
+
+    def checkpoint(self):
+        """Save if anything changed since the last save (serving process only)."""
+        if self.dirty and self.path is not None:
+            self.save()
+
+    def load(self, path):
+        with np.load(path) as saved:
+            states = {}
+            for name in saved.files:
+                if name == 'sources':
+                    continue
+                station, field, level, stat = name.split('|')
+                states.setdefault((station, field, level), {})[stat] = saved[name]
+            sources = json.loads(str(saved['sources']))
+        with self._lock:
+            for (station, field, level), state in states.items():
+                if level in self.levels:
+                    self._levels(station, field)[level].restore(state)
+            self.sources = {(station, source): newest for station, source, newest in sources}
+
+
+rollups = RollupStore()
+
+
+def ingest_ismr(station, source, data, ring=None):
+    """Fold one parsed ISMR file in; ROTI takes its first minutes' context from `ring`."""
+    if not rollups.add_frame(station, data, ISMR_FIELDS, source):
+        return
+    from VTEC_ROTI import compute_roti
+
+    times = pd.DatetimeIndex(data.index).as_unit('ns').asi8
+    if not len(times):
+        return
+    first = times.min()
+    context = data
+    if ring is not None and len(ring):
+        context = ring.between(first - ROTI_CONTEXT_NS, times.max())
+    roti = compute_roti(context[['SVID', 'VTEC']])
+    roti = roti[pd.DatetimeIndex(roti.index).as_unit('ns').asi8 >= first]
+    rollups.add_frame(station, roti, ['ROTI'])
+
+
+def _parse_time(value, name='time'):
+    if value is None:
+        raise ValueError(f"missing {name}")
+    value = str(value)
+    if value.isdigit():
+        return int(value) * 10**6
+    return pd.Timestamp(value).as_unit('ns').value
+
+
+class QueryServer:
+    def __init__(self, store=rollups, port=QUERY_PORT):
+        self.store = store
+        self.port = port
+        self._httpd = None
+
+    def grafana_query(self, body):
+        start = _parse_time(body['range'].get('from'), 'range.from')
+        end = _parse_time(body['range'].get('to'), 'range.to')
+        max_points = int(body.get('maxDataPoints') or DEFAULT_MAX_POINTS)
+        interval_ms = body.get('intervalMs')
+        response = []
+        for target in body.get('targets', []):
+            name = target.get('target') or ''
+            parts = name.split(':')
+            if len(parts) < 2:
+                continue
+            station, field = parts[0], parts[1]
+            svid = int(parts[2]) if len(parts) > 2 and parts[2] else None
+            agg = (target.get('payload') or {}).get('agg', 'mean')
+            if agg not in AGGREGATES:
+                raise ValueError(f"unknown aggregate {agg}")
+            series = self.store.query(station, field, start, end, svid, agg, max_points, interval_ms)
+            for sv, (times, values) in series.items():
+                response.append({'target': f"{station}:{field}:{sv}",
+                                 'datapoints': [[float(v), int(t)] for v, t in zip(values, times)]})
+        return response
+
+    def series_rows(self, query):
+        def arg(name, default=None):
+            return query.get(name, [default])[0]
+
+        svid = arg('svid')
+        agg = arg('agg', 'mean')
+        if agg not in AGGREGATES:
+            raise ValueError(f"unknown aggregate {agg}")
+        start, end = _parse_time(arg('from'), 'from'), _parse_time(arg('to'), 'to')
+        series = self.store.query(arg('station'), arg('field'), start, end,
+                                  int(svid) if svid else None, agg, int(arg('max_points', DEFAULT_MAX_POINTS)))
+        return [{'time': int(t), 'svid': sv, 'value': float(v)}
+                for sv, (times, values) in series.items() for t, v in zip(times, values)]
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == '/':
+                    return self._send(200, 'OK')
+                if url.path == '/api/series':
+                    try:
+                        return self._send(200, server.series_rows(parse_qs(url.query)))
+                    except (KeyError, TypeError, ValueError) as e:
+                        return self._send(400, {'error': str(e)})
+                self._send(404, {'error': 'not found'})
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                try:
+                    body = json.loads(self.rfile.read(length) or b'{}')
+                    if self.path in ('/search', '/metrics'):
+                        return self._send(200, server.store.targets())
+                    if self.path == '/query':
+                        return self._send(200, server.grafana_query(body))
+                except (KeyError, TypeError, ValueError) as e:
+                    return self._send(400, {'error': str(e)})
+                self._send(404, {'error': 'not found'})
+
+            def do_OPTIONS(self):
+                self.send_response(204)
+                self.send_header('Access-Control-Allow-Origin', '*')
+                self.send_header('Access-Control-Allow-Headers', 'accept, content-type')
+                self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
+                self.end_headers()
+
+            def _send(self, status, body):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.send_header('Access-Control-Allow-Origin', '*')
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        """Serve in a daemon thread."""
+        self._httpd = ThreadingHTTPServer(('', self.port), self._handler())
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        print(f"Query API running on http://localhost:{self.port}/")
+        return self
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+
+def start(port=QUERY_PORT, path=ROLLUP_FILE):
+    """Load the saved rollups, make this process their owner and serve them."""
+    if os.path.exists(path):
+        try:
+            rollups.load(path)
+        except Exception as e:
+            print(f"Could not load rollups from {path}: {e}")
+    rollups.path = path
+    return QueryServer(rollups, port).start()
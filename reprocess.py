@@ -0,0 +1,240 @@
+"""Batch reprocessing of archived ISMR and IAGA-2002 data over a date range.
+
+    python reprocess.py --start 2025-09-01 --end 2025-09-30 --archive /data/archive \
+        [--products kindex,s4,vtec,roti] [--station ENTG] [--output lp|store] [--out reprocessed] \
+        [--workers N] [--restart]
+
+The archive is searched recursively for `<PREFIX><DOY>*.<YY>_.ismr[.gz]` and
+`<station>YYYYMMDDpmin.min` files, so both flat directories and
+year/month/day trees work. Days are processed independently in a process
+pool with the same readers the live services use. Finished days are written
+as they complete: `--output lp` appends InfluxDB line protocol to
+<out>/reprocess.lp (re-written points overwrite, so a resumed run is
+idempotent), `--output store` writes one columnar
+<out>/<station>_<product>_<YYYY-MM-DD>.npz per station, product and day.
+Completed (station, output, product, day) combinations are recorded in
+<out>/checkpoint.json. The next run into the same --out skips them unless
+--restart is given. A run with another station, output or product set only
+skips the products already done for that station and output.
+"""
+import argparse
+import glob
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+import ismr_archive
+
+PRODUCTS = ('kindex', 's4', 'vtec', 'roti')
+ISMR_FIELDS = {'s4': ['S4_index', 'Phi60_Sig1_60'], 'vtec': ['VTEC']}
+MEASUREMENTS = {'kindex': 'k_index', 's4': 'ismr', 'vtec': 'ismr', 'roti': 'roti'}
+
+
+def day_range(start, end):
+    days = []
+    day = start
+    while day <= end:
+        days.append(day)
+        day += timedelta(days=1)
+    return days
+
+
+def _find(archive, pattern):
+    return sorted(glob.glob(os.path.join(archive, '**', pattern), recursive=True))
+
+
+def ismr_files(archive, prefix, day):
+    doy = day.timetuple().tm_yday
+    # plain and gzipped archives; a file present in both forms is read once
+    found = {}
+    for suffix in ismr_archive.SUFFIXES:
+        for path in _find(archive, f"{prefix}{doy:03d}*.{day:%y}_{suffix}"):
+            found[path[:-len(suffix)]] = path
+    return [found[stem] for stem in sorted(found)]
+
+
+def iaga_file(archive, station, day):
+    files = _find(archive, f"{station}{day:%Y%m%d}pmin.min")
+    return files[0] if files else None
+
+
+def _columns(frame, fields, svid=True):
+    cols = {'Time': pd.DatetimeIndex(frame.index).as_unit('ns').asi8}
+    if svid:
+        cols['SVID'] = frame['SVID'].to_numpy(dtype=np.int16)
+    for name in fields:
+        cols[name] = frame[name].to_numpy(dtype=np.float32)
+    return cols
+
+
+def process_ismr_day(archive, station, day, products):
+    """{'ismr': columns, 'roti': columns} for one day of one receiver."""
+    import S4_Pi
+    from VTEC_ROTI import compute_roti
+
+    frames = [S4_Pi.read_ismr(path, lat=str(station['lat']), lon=str(station['lon']))
+              for path in ismr_files(archive, station['prefix'], day)]
+    frames = [f for f in frames if f is not None and not f.empty]
+    if not frames:
+        return {}
+    data = pd.concat(frames).sort_index()
+    results = {}
+    fields = [name for product in ('s4', 'vtec') if product in products for name in ISMR_FIELDS[product]]
+    if fields:
+        results['ismr'] = _columns(data, fields)
+    if 'roti' in products:
+        # only the first minutes of the day lack the previous day's samples
+        roti = compute_roti(data).dropna(subset=['ROTI'])
+        results['roti'] = _columns(roti, ['ROT', 'ROTI'])
+    return results
+
+
+def process_kindex_day(archive, day):
+    """K-index columns for one day; the previous day is loaded as spike-filter context."""
+    import ENT_Kindex
+
+    paths = [iaga_file(archive, ENT_Kindex.station_code, d) for d in (day - timedelta(days=1), day)]
+    if paths[1] is None:
+        return {}
+    data, components, _ = ENT_Kindex.read_iaga2002_file_set([p for p in paths if p], max_workers=1)
+    if data.empty:
+        return {}
+    data = ENT_Kindex.SpikeFilter().filter(data, list(components))
+    data = data[data["DATETIME"] >= pd.Timestamp(day, tz='UTC')]
+    times_float = ENT_Kindex.time_to_float(data["DATETIME"]).to_numpy()
+    k_values, k_times = ENT_Kindex.calculate_k_index(times_float, data[components[0]].values,
+                                                      data[components[1]].values, ENT_Kindex.k9_limit)
+    return {'k_index': {'Time': (np.asarray(k_times) * 1e9).astype(np.int64),
+                        'value': np.asarray(k_values, dtype=np.float32)}}
+
+
+def process_day(archive, station, day, products):
+    """Worker: every requested product for one day, as {measurement: columns}."""
+    results = {}
+    if set(products) & {'s4', 'vtec', 'roti'}:
+        results.update(process_ismr_day(archive, station, day, products))
+    if 'kindex' in products:
+        results.update(process_kindex_day(archive, day))
+    return day, results
+
+
+def to_line_protocol(measurement, columns, tags):
+    """InfluxDB line protocol for one measurement; NaN fields are left out."""
+    fields = [name for name in columns if name not in ('Time', 'SVID')]
+    tag_str = ''.join(f",{k}={v}" for k, v in tags.items())
+    svid = columns.get('SVID')
+    lines = []
+    for i, t in enumerate(columns['Time']):
+        values = ','.join(f"{name}={columns[name][i]:.6g}" for name in fields if np.isfinite(columns[name][i]))
+        if not values:
+            continue
+        row_tags = f"{tag_str},svid={svid[i]}" if svid is not None else tag_str
+        lines.append(f"{measurement}{row_tags} {values} {t}")
+    return lines
+
+
+class Checkpoint:
+    """Completed (station, output, product, day) entries, rewritten atomically after every day."""
+
+    def __init__(self, path, restart=False):
+        self.path = path
+        self.done = set()
+        if not restart and os.path.exists(path):
+            with open(path) as f:
+                self.done = set(json.load(f)['done'])
+
+    @staticmethod
+    def _key(station, output, product, day):
+        return f"{station}:{output}:{product}:{day.isoformat()}"
+
+    def missing(self, station, output, products, day):
+        """The `products` not yet done for `day` of `station` written as `output`."""
+        return [p for p in products if self._key(station, output, p, day) not in self.done]
+
+    def mark(self, station, output, products, day):
+        self.done.update(self._key(station, output, p, day) for p in products)
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'done': sorted(self.done)}, f)
+        os.replace(tmp, self.path)
+
+
+def write_results(day, results, output, out_dir, station_code, products):
+    if output == 'store':
+        # one file per station and product, so a later run over other products or stations never replaces it
+        for product in products:
+            columns = results.get(MEASUREMENTS[product])
+            if columns is None:
+                continue
+            if product in ISMR_FIELDS:
+                columns = {name: columns[name] for name in ('Time', 'SVID', *ISMR_FIELDS[product])}
+            np.savez(os.path.join(out_dir, f"{station_code}_{product}_{day:%Y-%m-%d}.npz"), **columns)
+        return
+    with open(os.path.join(out_dir, 'reprocess.lp'), 'a') as f:
+        for measurement, columns in results.items():
+            tags = {'station': station_code}
+            lines = to_line_protocol(measurement, columns, tags)
+            if lines:
+                f.write('\n'.join(lines) + '\n')
+
+
+def run(start, end, archive, products=PRODUCTS, station_code='ENTG', output='lp', out_dir='reprocessed',
+        workers=None, restart=False):
+    from stations import load_stations
+
+    station = next((s for s in load_stations() if s['code'] == station_code), None)
+    if station is None:
+        raise SystemExit(f"Unknown station {station_code}")
+    os.makedirs(out_dir, exist_ok=True)
+    checkpoint = Checkpoint(os.path.join(out_dir, 'checkpoint.json'), restart)
+    days = day_range(start, end)
+    pending = [(day, todo) for day in days if (todo := checkpoint.missing(station['code'], output, products, day))]
+    print(f"{len(pending)} day(s) to process, {len(days) - len(pending)} already done")
+
+    started = time.time()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(process_day, archive, station, day, tuple(todo)): todo for day, todo in pending}
+        for n, future in enumerate(as_completed(futures), 1):
+            try:
+                day, results = future.result()
+            except Exception as e:
+                print(f"Failed to process a day: {e}")
+                continue
+            write_results(day, results, output, out_dir, station['code'], futures[future])
+            checkpoint.mark(station['code'], output, futures[future], day)
+            rows = sum(len(columns['Time']) for columns in results.values())
+            print(f"[{n}/{len(pending)}] {day}: {rows} rows")
+
+    elapsed = time.time() - started
+    rate = len(pending) / (elapsed / 60) if elapsed > 0 else float('inf')
+    print(f"Processed {len(pending)} day(s) in {elapsed:.1f} s ({rate:.1f} days/min)")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--start', required=True, type=date.fromisoformat)
+    parser.add_argument('--end', required=True, type=date.fromisoformat)
+    parser.add_argument('--archive', required=True, help='directory searched recursively for .ismr/pmin.min files')
+    parser.add_argument('--products', default=','.join(PRODUCTS), help='comma-separated subset of ' + ','.join(PRODUCTS))
+    parser.add_argument('--station', default='ENTG', help='ISMR station code from the station registry')
+    parser.add_argument('--output', choices=['lp', 'store'], default='lp')
+    parser.add_argument('--out', default='reprocessed')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--restart', action='store_true', help='ignore the checkpoint and redo every day')
+    args = parser.parse_args()
+
+    products = [p.strip() for p in args.products.split(',') if p.strip()]
+    unknown = set(products) - set(PRODUCTS)
+    if unknown:
+        parser.error(f"unknown products: {', '.join(sorted(unknown))}")
+    run(args.start, args.end, args.archive, products, args.station, args.output, args.out, args.workers, args.restart)
+
+
+if __name__ == "__main__":
+    main()
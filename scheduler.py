@@ -0,0 +1,242 @@
+"""Input-driven stage scheduler shared by the dashboard services.
+
+A stage is a callable plus the triggers that say its inputs changed:
+
+    FileTrigger(pattern)       files matching a glob appeared, vanished or were rewritten
+    TailTrigger(path)          a growing file (e.g. today's minute file) got longer
+    ValueTrigger(fetch, secs)  a polled value (e.g. F10.7) differs from the last one
+    IntervalTrigger(secs)      wall-clock inputs: remote FTP listings, the model hour
+
+Triggers are polled from one loop; a firing trigger marks its stage pending
+and (re)starts the stage's debounce timer, so a burst of downloads results in
+a single run. Stages run on a shared thread pool, never concurrently with
+themselves; triggers arriving during a run are coalesced into one follow-up
+run. A failing stage is retried after `retry_seconds`. Per-stage queue depth,
+lag (age of the oldest unhandled trigger) and last run duration are exported
+as Prometheus gauges.
+"""
+import glob
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from prometheus_client import Gauge
+
+from profiling import profiler
+
+queue_depth_gauge = Gauge('scheduler_queue_depth', 'Trigger events waiting for a stage run', ['stage'])
+lag_gauge = Gauge('scheduler_lag_seconds', 'Age of the oldest trigger not yet handled by a finished run', ['stage'])
+duration_gauge = Gauge('scheduler_run_seconds', 'Duration of the last stage run', ['stage'])
+
+
+def _resolve(path):
+    return path() if callable(path) else path
+
+
+class Trigger:
+    def __init__(self, poll_seconds):
+        self.poll_seconds = poll_seconds
+        self.next_poll = 0.0
+
+    def poll(self, pool):
+        """True when the stage's input changed since the previous poll."""
+        raise NotImplementedError
+
+
+class FileTrigger(Trigger):
+    """Fires when the set of files matching `pattern` or their size/mtime changes."""
+
+    def __init__(self, pattern, poll_seconds=5):
+        super().__init__(poll_seconds)
+        self.pattern = pattern
+        self._signature = None
+
+    def poll(self, pool):
+        signature = {}
+        for path in glob.glob(_resolve(self.pattern)):
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            signature[path] = (st.st_size, st.st_mtime_ns)
+        changed = self._signature is not None and signature != self._signature
+        self._signature = signature
+        return changed
+
+
+class TailTrigger(Trigger):
+    """Fires when the file at `path` (or a callable returning today's path) grows.
+
+    Rewrites that keep the size are ignored, so re-downloading an unchanged
+    file does not trigger.
+    """
+
+    def __init__(self, path, poll_seconds=5):
+        super().__init__(poll_seconds)
+        self.path = path
+        self._state = None
+
+    def poll(self, pool):
+        path = _resolve(self.path)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            size = 0
+        previous = self._state
+        self._state = (path, size)
+        if previous is None:
+            return False
+        if previous[0] != path:
+            return size > 0
+        return size > previous[1]
+
+
+class ValueTrigger(Trigger):
+    """Fires when `fetch()` returns a new non-None value; the fetch runs on the pool."""
+
+    def __init__(self, fetch, poll_seconds=3600):
+        super().__init__(poll_seconds)
+        self.fetch = fetch
+        self.value = None
+        self._future = None
+
+    def poll(self, pool):
+        if self._future is None:
+            self._future = pool.submit(self.fetch)
+            self.next_poll = 0.0   # come back for the result on the next tick
+            return False
+        if not self._future.done():
+            self.next_poll = 0.0
+            return False
+        future, self._future = self._future, None
+        try:
+            value = future.result()
+        except Exception as e:
+            logging.error(f"Value trigger fetch failed: {e}")
+            return False
+        if value is None or value == self.value:
+            return False
+        self.value = value
+        return True
+
+
+class IntervalTrigger(Trigger):
+    """Fires every `seconds`."""
+
+    def __init__(self, seconds):
+        super().__init__(seconds)
+        self._started = False
+
+    def poll(self, pool):
+        started, self._started = self._started, True
+        return started
+
+
+class Stage:
+    def __init__(self, name, fn, triggers, debounce, retry_seconds):
+        self.name = name
+        self.fn = fn
+        self.triggers = list(triggers)
+        self.debounce = debounce
+        self.retry_seconds = retry_seconds
+        self.pending = 0          # trigger events not yet taken by a run
+        self.first_pending = None
+        self.deadline = None
+        self.running = False
+        self.running_since = None  # oldest trigger covered by the current run
+
+
+class Scheduler:
+    def __init__(self, max_workers=4, tick=0.5):
+        self.tick = tick
+        self.stages = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='stage')
+        self._stop = threading.Event()
+
+    def add(self, name, fn, triggers=(), debounce=2.0, retry_seconds=60, run_at_start=True):
+        stage = Stage(name, fn, triggers, debounce, retry_seconds)
+        self.stages[name] = stage
+        if run_at_start:
+            self.trigger(name, delay=0.0)
+        return stage
+
+    def trigger(self, name, delay=None):
+        """Mark stage `name` pending; it runs once no further trigger arrived for its debounce time."""
+        stage = self.stages[name]
+        now = time.monotonic()
+        with self._lock:
+            stage.pending += 1
+            if stage.first_pending is None:
+                stage.first_pending = now
+            stage.deadline = now + (stage.debounce if delay is None else delay)
+
+    def _poll_triggers(self, now):
+        for stage in self.stages.values():
+            for trigger in stage.triggers:
+                if now < trigger.next_poll:
+                    continue
+                trigger.next_poll = now + trigger.poll_seconds
+                try:
+                    fired = trigger.poll(self._pool)
+                except Exception as e:
+                    logging.error(f"{stage.name}: trigger poll failed: {e}")
+                    continue
+                if fired:
+                    self.trigger(stage.name)
+
+    def _dispatch(self, now):
+        with self._lock:
+            for stage in self.stages.values():
+                if stage.pending and not stage.running and stage.deadline <= now:
+                    stage.running = True
+                    stage.running_since = stage.first_pending
+                    stage.pending, stage.first_pending, stage.deadline = 0, None, None
+                    self._pool.submit(self._run, stage)
+
+    def _run(self, stage):
+        started = time.monotonic()
+        ok = True
+        try:
+            with profiler.cycle(stage.name):
+                stage.fn()
+        except Exception as e:
+            ok = False
+            logging.error(f"Stage {stage.name} failed: {e}; retrying in {stage.retry_seconds} s")
+        finished = time.monotonic()
+        duration_gauge.labels(stage=stage.name).set(finished - started)
+        with self._lock:
+            stage.running = False
+            if not ok:
+                # keep the unhandled trigger's age so lag keeps growing while failing
+                stage.pending += 1
+                if stage.first_pending is None or stage.running_since < stage.first_pending:
+                    stage.first_pending = stage.running_since
+                stage.deadline = finished + stage.retry_seconds
+            stage.running_since = None
+
+    def _export(self, now):
+        with self._lock:
+            for stage in self.stages.values():
+                oldest = [t for t in (stage.first_pending, stage.running_since) if t is not None]
+                queue_depth_gauge.labels(stage=stage.name).set(stage.pending)
+                lag_gauge.labels(stage=stage.name).set(now - min(oldest) if oldest else 0.0)
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            now = time.monotonic()
+            self._poll_triggers(now)
+            self._dispatch(now)
+            self._export(now)
+            self._stop.wait(self.tick)
+
+    def start(self):
+        """Run the scheduler loop in a daemon thread."""
+        threading.Thread(target=self.run_forever, daemon=True, name='scheduler').start()
+        return self
+
+    def stop(self, wait=True):
+        self._stop.set()
+        self._pool.shutdown(wait=wait)
@@ -0,0 +1,206 @@
+"""Streaming scintillation event detection with per-SVID hysteresis.
+
+An amplitude (S4) or phase (sigma-phi) event starts when a satellite's
+value reaches the onset level (the plots' "moderate" threshold). It stays
+open until the value drops below the lower offset level, or until the
+satellite has no epoch for MAX_GAP (it set or fell below the mask).
+Events shorter than MIN_DURATION are dropped.
+
+Each batch of new epochs is processed with array operations. Rows are
+ordered by (SVID, time), and the hysteresis state of each row is the
+latest decisive sample (above onset or below offset) carried forward
+within its run of contiguous epochs. Runs are reduced with reduceat.
+Between batches, a tracker keeps one state slot per SVID: open flag,
+start, last epoch, peak and the peak's IPP. Work is therefore proportional
+to the new epochs, never to the retained history.
+
+Closed events are appended to EVENT_LOG (one JSON object per line, times
+in ns since the epoch) and counted in scintillation_events_total{station,kind,severity}.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from prometheus_client import Counter, Gauge
+
+import instrumentation
+
+EVENT_LOG = os.path.join('assets', 'scint_events.jsonl')
+SVID_SLOTS = 1024
+MIN_DURATION = 3 * 60 * 10**9     # ns
+MAX_GAP = 5 * 60 * 10**9          # ns without an epoch that ends an open event
+
+# kind -> (column, onset, offset, strong); onsets/strong match plot_engine's S4/PHI60 thresholds
+KINDS = {
+    'amplitude': ('S4_index', 0.5, 0.4, 0.8),
+    'phase': ('Phi60_Sig1_60', 0.4, 0.3, 0.7),
+}
+
+events_counter = Counter('scintillation_events', 'Closed scintillation events', ['station', 'kind', 'severity'])
+active_gauge = Gauge('scintillation_active_svids', 'Satellites with an open scintillation event', ['station', 'kind'])
+
+
+class HysteresisTracker:
+    """Open/closed state per SVID for one kind of event at one station."""
+
+    def __init__(self, onset, offset, min_duration=MIN_DURATION, max_gap=MAX_GAP):
+        self.onset, self.offset = onset, offset
+        self.min_duration, self.max_gap = min_duration, max_gap
+        self.open = np.zeros(SVID_SLOTS, bool)
+        self.last = np.full(SVID_SLOTS, np.iinfo(np.int64).min // 2, np.int64)   # last epoch seen
+        self.start = np.zeros(SVID_SLOTS, np.int64)
+        self.end = np.zeros(SVID_SLOTS, np.int64)       # last epoch at or above the offset
+        self.peak = np.zeros(SVID_SLOTS)
+        self.peak_time = np.zeros(SVID_SLOTS, np.int64)
+        self.peak_lat = np.zeros(SVID_SLOTS)
+        self.peak_lon = np.zeros(SVID_SLOTS)
+
+    def _records(self, svids, start, end, peak, peak_time, lat, lon):
+        keep = end - start >= self.min_duration
+        return [{'svid': int(a), 'start': int(b), 'end': int(c), 'peak': float(d), 'peak_time': int(e),
+                 'lat': float(f), 'lon': float(g)}
+                for a, b, c, d, e, f, g in zip(svids[keep], start[keep], end[keep], peak[keep], peak_time[keep],
+                                               lat[keep], lon[keep])]
+
+    def _close(self, svids):
+        """Records of the carried open events of `svids`, which are then closed."""
+        self.open[svids] = False
+        return self._records(svids, self.start[svids], self.end[svids], self.peak[svids], self.peak_time[svids],
+                             self.peak_lat[svids], self.peak_lon[svids])
+
+    def update(self, times, svids, values, lat, lon):
+        """Feed a batch of epochs (ns, SVID, value, IPP lat/lon); returns the events it closed."""
+        if len(times) == 0:
+            return []
+        order = np.lexsort((times, svids))
+        t, sv, v, lat, lon = times[order], svids[order], values[order], lat[order], lon[order]
+        n = len(t)
+        idx = np.arange(n)
+
+        # a run is a stretch of epochs of one SVID without a gap; an SVID's first run may continue its open event
+        new_svid = np.r_[True, sv[1:] != sv[:-1]]
+        gap = t - np.where(new_svid, self.last[sv], np.r_[t[0], t[:-1]]) > self.max_gap
+        run_start = new_svid | gap
+        carried = new_svid & ~gap & self.open[sv]
+
+        # hysteresis: the state of a row is that of the run's latest decisive row (NaN holds the state)
+        above = v >= self.onset
+        decisive = above | (v < self.offset)
+        last_decisive = np.maximum.accumulate(np.where(decisive, idx, -1))
+        run_first = np.maximum.accumulate(np.where(run_start, idx, 0))
+        active = np.where(last_decisive >= run_first, above[np.maximum(last_decisive, 0)], carried[run_first])
+
+        # carried events that do not continue into this batch end at their last epoch
+        continues = carried & active
+        events = self._close(sv[new_svid & self.open[sv] & ~continues])
+
+        # stretches of consecutive active rows within a run
+        prev_active = np.r_[False, active[:-1]] & ~run_start
+        first = active & ~prev_active
+        next_active = np.r_[active[1:] & ~run_start[1:], False]
+        starts, ends = np.flatnonzero(first), np.flatnonzero(active & ~next_active)
+        if len(starts):
+            score = np.where(active & ~np.isnan(v), v, -np.inf)
+            peaks = np.maximum.reduceat(score, starts)
+            stretch = np.cumsum(first) - 1
+            hits = np.flatnonzero(active & (score == peaks[stretch]))
+            _, first_hit = np.unique(stretch[hits], return_index=True)
+            peak_rows = hits[first_hit]
+
+            s_sv = sv[starts]
+            start, end = t[starts], t[ends]
+            peak, peak_time, p_lat, p_lon = peaks, t[peak_rows], lat[peak_rows], lon[peak_rows]
+            # merge the continued events with their carried start and peak
+            cont = continues[starts]
+            if cont.any():
+                c_sv = s_sv[cont]
+                start[cont] = self.start[c_sv]
+                older = cont.copy()
+                older[cont] = self.peak[c_sv] >= peak[cont]
+                o_sv = s_sv[older]
+                peak[older], peak_time[older] = self.peak[o_sv], self.peak_time[o_sv]
+                p_lat[older], p_lon[older] = self.peak_lat[o_sv], self.peak_lon[o_sv]
+
+            # a stretch followed by another epoch of its SVID has ended; the others stay open
+            still_open = (ends == n - 1) | np.r_[sv[1:] != sv[:-1], True][ends]
+            closed = ~still_open
+            events += self._records(s_sv[closed], start[closed], end[closed], peak[closed], peak_time[closed],
+                                    p_lat[closed], p_lon[closed])
+            self.open[s_sv] = False
+            o = s_sv[still_open]
+            self.open[o] = True
+            self.start[o], self.end[o] = start[still_open], end[still_open]
+            self.peak[o], self.peak_time[o] = peak[still_open], peak_time[still_open]
+            self.peak_lat[o], self.peak_lon[o] = p_lat[still_open], p_lon[still_open]
+
+        last_rows = np.r_[np.flatnonzero(new_svid[1:]), n - 1]
+        self.last[sv[last_rows]] = t[last_rows]
+        # satellites without an epoch for MAX_GAP before the newest one have set
+        events += self._close(np.flatnonzero(self.open & (self.last < t.max() - self.max_gap)))
+        return events
+
+
+class EventDetector:
+    """Amplitude and phase trackers of one station, fed with read_ismr frames in time order."""
+
+    def __init__(self, station, log_path=EVENT_LOG):
+        self.station = station
+        self.log_path = log_path
+        self.trackers = {kind: HysteresisTracker(onset, offset) for kind, (_, onset, offset, _) in KINDS.items()}
+        self.newest = None   # epochs up to here were processed; older rows (re-ingested files) are skipped
+
+    def process(self, frame):
+        """Run the trackers over the rows of `frame` newer than the last batch; returns the closed events."""
+        times = pd.DatetimeIndex(frame.index).as_unit('ns').asi8
+        new = times > self.newest if self.newest is not None else np.ones(len(times), bool)
+        if not new.any():
+            return []
+        times = times[new]
+        svids = frame['SVID'].to_numpy(np.int64)[new]
+        lat = frame['Dlat_IPP'].to_numpy(np.float64)[new]
+        lon = frame['Dlong_IPP'].to_numpy(np.float64)[new]
+        events = []
+        with instrumentation.stage('scint_events', 'detect', rows=len(times)):
+            for kind, (column, _, _, strong) in KINDS.items():
+                tracker = self.trackers[kind]
+                for event in tracker.update(times, svids, frame[column].to_numpy(np.float64)[new], lat, lon):
+                    event.update(station=self.station, kind=kind,
+                                 severity='strong' if event['peak'] >= strong else 'moderate')
+                    events.append(event)
+                active_gauge.labels(station=self.station, kind=kind).set(int(tracker.open.sum()))
+        self.newest = int(times.max())
+        for event in events:
+            events_counter.labels(station=self.station, kind=event['kind'], severity=event['severity']).inc()
+        if events and self.log_path is not None:
+            self.write(events)
+        return events
+
+    def write(self, events):
+        with open(self.log_path, 'a') as f:
+            for event in events:
+                f.write(json.dumps(event) + '\n')
+
+
+_detectors = {}
+
+
+def detector(station):
+    """The shared EventDetector of `station`; resumes after the newest event already in the log."""
+    found = _detectors.get(station)
+    if found is None:
+        found = _detectors[station] = EventDetector(station)
+        found.newest = _logged_until(station)
+    return found
+
+
+def _logged_until(station, path=EVENT_LOG):
+    # after a restart the retained files are re-ingested; skip what the log already covers
+    newest = None
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                event = json.loads(line)
+                if event['station'] == station:
+                    newest = max(newest or event['end'], event['end'])
+    return newest
@@ -0,0 +1,149 @@
+"""All dashboard products in one asyncio process.
+
+Runs the multi-station ISMR pipeline (S4/sigma-phi, VTEC/ROTI), the ENT
+K-index and the EthTEC map/tiles side by side instead of as four services:
+
+- FTP and HTTP fetches run in worker threads (`asyncio.to_thread`), so a slow
+  server only delays its own product;
+- ISMR parsing and TEC tile evaluation share one process pool;
+- all matplotlib drawing goes through a single render thread (pyplot state
+  is not thread-safe);
+- one Prometheus endpoint serves every product's gauges, and the S4 and
+  VTEC/ROTI plots of a station render from the same parsed observation store;
+- the EthTEC map is corrected by the ISMR VTEC the pipeline ingests
+  (tec_assimilation.py), which needs both in the same process;
+- the Grafana query API (query_api.py, port 8003) serves rollups of every
+  product over arbitrary time ranges;
+- the work done in threads can be profiled on demand (SIGUSR1/SIGUSR2 or
+  http://localhost:8002/profile, see profiling.py).
+
+    python service.py
+"""
+import asyncio
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from prometheus_client import start_http_server
+
+import ENT_Kindex
+import EthTEC
+import ismr_pipeline
+import query_api
+import vtec_grid
+import S4_Pi
+from profiling import PROFILE_PORT, profiler
+from scheduler import TailTrigger
+from stations import load_stations
+from tile_server import TecTileServer
+
+METRICS_PORT = 8000
+ISMR_INTERVAL = ismr_pipeline.update_interval_seconds
+KINDEX_INTERVAL = ENT_Kindex.update_interval_minutes * 60
+TEC_INTERVAL = 60
+F10P7_INTERVAL = 3600
+
+
+class DashboardService:
+    def __init__(self, max_workers=None, assets_dir='assets', plot_worker=None):
+        self.assets_dir = assets_dir
+        self.plot_worker = plot_worker
+        self.cpu_pool = ProcessPoolExecutor(max_workers)
+        self.render_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='render')
+        self.stations = [ismr_pipeline.StationState(station, S4_Pi.local_dir) for station in load_stations()]
+        self.tile_server = TecTileServer()
+        self.f10p7 = None
+
+    async def _render(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.render_pool, fn, *args)
+
+    async def ismr_loop(self):
+        loop = asyncio.get_running_loop()
+        oldest_drawn = None
+        while True:
+            try:
+                await asyncio.gather(*(asyncio.to_thread(ismr_pipeline.sync_station, state) for state in self.stations))
+                jobs = [(state, path) for state in self.stations for path in state.new_files()]
+                results = await asyncio.gather(
+                    *(loop.run_in_executor(self.cpu_pool, ismr_pipeline.parse_file, path, state.lat, state.lon)
+                      for state, path in jobs),
+                    return_exceptions=True)
+                changed = set()
+                for (state, path), result in zip(jobs, results):
+                    if isinstance(result, Exception):
+                        print(f"{state.code}: failed to parse file: {result}")
+                        continue
+                    # the store append, VTEC grid, assimilation and event detection stay off the event loop
+                    await asyncio.to_thread(ismr_pipeline.ingest, state, *result)
+                    changed.add(state.code)
+
+                # redraw stations with new files, or all of them when the retention window moved
+                oldest_day = ismr_pipeline.oldest_retained_day()
+                for state in self.stations:
+                    if state.code in changed or oldest_day != oldest_drawn:
+                        await self._render(profiler.wrap('ismr_publish', ismr_pipeline.publish), state, oldest_day,
+                                           self.plot_worker)
+                oldest_drawn = oldest_day
+                await asyncio.to_thread(vtec_grid.publish)
+                await asyncio.to_thread(query_api.rollups.checkpoint)
+            except Exception as e:
+                print(f"Error in ISMR cycle: {e}")
+            await asyncio.sleep(ISMR_INTERVAL)
+
+    async def kindex_loop(self):
+        today_file = TailTrigger(ENT_Kindex.today_iaga_file)
+        history = None
+        while True:
+            try:
+                await asyncio.to_thread(ENT_Kindex.get_ftp_files)
+                # the history is recomputed when a closed day's file arrives or changes and when the
+                # UTC day rolls over; otherwise only today's appended minutes are nowcast
+                grew = today_file.poll(None)
+                signature = await asyncio.to_thread(ENT_Kindex.history_signature)
+                if signature != history:
+                    await asyncio.to_thread(profiler.wrap('kindex', ENT_Kindex.update_k_index), 1)
+                    await asyncio.to_thread(query_api.rollups.checkpoint)
+                    history = signature
+                elif grew:
+                    await asyncio.to_thread(profiler.wrap('kindex', ENT_Kindex.nowcast_k_index))
+                    await asyncio.to_thread(query_api.rollups.checkpoint)
+            except Exception as e:
+                print(f"Error in K-index cycle: {e}")
+            await asyncio.sleep(KINDEX_INTERVAL)
+
+    async def tec_loop(self):
+        next_f10p7 = 0.0
+        while True:
+            now = datetime.now(timezone.utc)
+            try:
+                if time.monotonic() >= next_f10p7:
+                    value = await asyncio.to_thread(EthTEC.getF10p7N, now.year, now.month, now.day)
+                    if value is not None:
+                        self.f10p7 = value
+                    next_f10p7 = time.monotonic() + F10P7_INTERVAL
+                await self._render(profiler.wrap('ethtec', EthTEC.render_tec_products), now, self.f10p7, self.cpu_pool,
+                                   self.tile_server, self.assets_dir)
+            except Exception as e:
+                print(f"Error in EthTEC cycle: {e}")
+            elapsed = (datetime.now(timezone.utc) - now).total_seconds()
+            await asyncio.sleep(max(0.0, TEC_INTERVAL - elapsed))
+
+    async def run(self):
+        self.tile_server.start()
+        query_api.start()
+        await asyncio.gather(self.ismr_loop(), self.kindex_loop(), self.tec_loop())
+
+
+def serve(max_workers=None, plot_worker=None):
+    asyncio.run(DashboardService(max_workers, plot_worker=plot_worker).run())
+
+
+def main(max_workers=None):
+    profiler.install(PROFILE_PORT)
+    start_http_server(METRICS_PORT)
+    print(f"Prometheus exporter running on http://localhost:{METRICS_PORT}/metrics")
+    serve(max_workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+"""Registry of the ISMR receivers processed by ismr_pipeline.
+
+Stations are read from ismr_stations.json when present, e.g.
+
+    [{"code": "ENTG", "lat": 9.11, "lon": 38.79,
+      "ftp_dir": "/home/ethiopiagnss/ENTGST1/R/ismr/{year}/{month}/{day}/"}]
+
+`ftp_dir` is formatted with the year/month/day of each retained day and
+`prefix` (default: the station code) is the file-name prefix of its ISMR files.
+"""
+import json
+import os
+
+STATIONS_FILE = 'ismr_stations.json'
+
+DEFAULT_STATIONS = [
+    {"code": "ENTG", "lat": 9.11, "lon": 38.79,
+     "ftp_dir": "/home/ethiopiagnss/ENTGST1/R/ismr/{year}/{month}/{day}/"},
+]
+
+
+def load_stations(path=STATIONS_FILE):
+    """List of station dicts (code, lat, lon, ftp_dir, prefix)."""
+    if os.path.exists(path):
+        with open(path) as f:
+            stations = json.load(f)
+    else:
+        stations = [dict(station) for station in DEFAULT_STATIONS]
+    for station in stations:
+        station.setdefault('prefix', station['code'])
+    return stations
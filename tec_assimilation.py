@@ -0,0 +1,155 @@
+"""Optimal interpolation of measured ISMR VTEC into the net32D background map.
+
+Each observation's residual (measured VTEC minus net32D at its pierce point,
+hour and day of year) is binned into a coarse VtecGrid over a sliding window.
+The observed cells become super-observations: the mean residual, with error
+variance OBS_SIGMA**2 / count + REPRESENTATIVENESS**2. The analysis increment
+at any output point x is
+
+    increment(x) = B(x, o) @ solve(B(o, o) + R, d)
+
+where B is a Gaussian covariance with variance BACKGROUND_SIGMA**2 and
+correlation length CORRELATION_LENGTH. Distances are in degrees, with
+longitude scaled by cos(mean latitude).
+
+That correlation is separable in longitude and latitude, so the covariance
+between the map grid and the coarse cells is the product of two small 1-D
+factors. These factors are computed once per grid and cached. An update
+therefore costs one m x m Cholesky solve for the m observed cells (tens)
+plus one (lat x m)(m x lon) product. That is far cheaper than solving the
+grid-space system over every cell. The weights are only recomputed when the
+residual window changed.
+
+Observations whose residual exceeds GROSS_ERROR standard deviations of
+the innovation are rejected before binning. These are mostly uncalibrated
+arcs with large receiver/satellite biases. Residuals older than MAX_AGE
+relative to the map time are not applied.
+"""
+import threading
+
+import numpy as np
+from prometheus_client import Counter, Gauge
+
+import instrumentation
+from vtec_grid import LAT_RANGE, LON_RANGE, VtecGrid
+
+CELL_DEG = 0.5
+WINDOW_MINUTES = 15
+BACKGROUND_SIGMA = 8.0         # TECU, net32D climatology error
+OBS_SIGMA = 4.0                # TECU per observation (receiver bias, mapping function)
+REPRESENTATIVENESS = 1.0       # TECU, a cell mean vs the model at the cell centre
+CORRELATION_LENGTH = 2.5       # degrees
+GROSS_ERROR = 4.0              # innovation standard deviations
+MAX_AGE = 30 * 60 * 10**9      # ns
+
+observed_cells_gauge = Gauge('tec_assimilation_observed_cells', 'Coarse cells with observations in the window')
+residual_rms_gauge = Gauge('tec_assimilation_residual_rms', 'RMS of the observed cell residuals (TECU)')
+rejected_counter = Counter('tec_assimilation_rejected', 'Observations failing the background check')
+
+
+def _correlation(a, b, length):
+    return np.exp(-0.5 * ((a[:, None] - b[None, :]) / length) ** 2)
+
+
+class TecAssimilator:
+    def __init__(self, lon_range=LON_RANGE, lat_range=LAT_RANGE, cell_deg=CELL_DEG, window_minutes=WINDOW_MINUTES,
+                 background_sigma=BACKGROUND_SIGMA, obs_sigma=OBS_SIGMA,
+                 representativeness=REPRESENTATIVENESS, length=CORRELATION_LENGTH):
+        self.residuals = VtecGrid(lon_range, lat_range, cell_deg, window_minutes)
+        self.lon_scale = np.cos(np.deg2rad(np.mean(lat_range)))
+        self.background_var = background_sigma ** 2
+        self.obs_var = obs_sigma ** 2
+        self.repr_var = representativeness ** 2
+        self.length = length
+        self.max_residual = GROSS_ERROR * np.sqrt(self.background_var + self.obs_var)
+        self.f10p7 = 100.0          # background F10.7 for the residuals; follows the latest map
+        # coarse-cell factors, fixed for the life of the assimilator
+        self._cx = _correlation(self.residuals.lon * self.lon_scale, self.residuals.lon * self.lon_scale, length)
+        self._cy = _correlation(self.residuals.lat, self.residuals.lat, length)
+        self._factors = {}          # output grid -> (lon factor, lat factor)
+        self._weights = None        # (window version, observed rows, cols, weights)
+        self._lock = threading.Lock()
+
+    def add(self, times, lat, lon, vtec):
+        """Bin the residuals of observations (ns, deg, deg, TECU) against net32D; returns the count binned."""
+        from EthTEC import compute_tec   # EthTEC is only needed once observations arrive
+
+        times = np.asarray(times, np.int64)
+        stamps = times.astype('datetime64[ns]')
+        hour = (stamps - stamps.astype('datetime64[D]')).astype(np.int64) / 3.6e12
+        doy = (stamps.astype('datetime64[D]') - stamps.astype('datetime64[Y]')).astype(np.int64) + 1
+        lon = np.asarray(lon, np.float64)
+        lat = np.asarray(lat, np.float64)
+        residual = np.asarray(vtec, np.float64) - compute_tec(lon, lat, hour, doy, self.f10p7)
+        rejected = np.abs(residual) > self.max_residual
+        if rejected.any():
+            rejected_counter.inc(int(rejected.sum()))
+            residual[rejected] = np.nan      # NaN observations are not binned
+        with self._lock:
+            return self.residuals.add(times, lat, lon, residual)
+
+    def add_frame(self, frame):
+        import pandas as pd
+        return self.add(pd.DatetimeIndex(frame.index).as_unit('ns').asi8, frame['Dlat_IPP'].to_numpy(),
+                        frame['Dlong_IPP'].to_numpy(), frame['VTEC'].to_numpy())
+
+    def _solve(self):
+        # weights of the observed cells; recomputed only when the residual window changed
+        grid = self.residuals
+        if self._weights is not None and self._weights[0] == grid.version:
+            return self._weights
+        count = grid.count()
+        rows, cols = np.nonzero(count > 0)
+        d = grid.mean()[rows, cols]
+        weights = None
+        if len(rows):
+            cov = self.background_var * self._cy[np.ix_(rows, rows)] * self._cx[np.ix_(cols, cols)]
+            cov[np.diag_indices_from(cov)] += self.obs_var / count[rows, cols] + self.repr_var
+            factor = np.linalg.cholesky(cov)
+            weights = np.linalg.solve(factor.T, np.linalg.solve(factor, d))
+            residual_rms_gauge.set(float(np.sqrt(np.mean(d * d))))
+        observed_cells_gauge.set(len(rows))
+        self._weights = (grid.version, rows, cols, weights)
+        return self._weights
+
+    def _grid_factors(self, lon, lat):
+        key = (lon[0], lon[-1], len(lon), lat[0], lat[-1], len(lat))
+        factors = self._factors.get(key)
+        if factors is None:
+            factors = self._factors[key] = (
+                _correlation(lon * self.lon_scale, self.residuals.lon * self.lon_scale, self.length),
+                _correlation(lat, self.residuals.lat, self.length))
+        return factors
+
+    def _current(self, now):
+        grid = self.residuals
+        if grid.newest is None:
+            return False
+        return now is None or now - (grid.newest + 1) * grid.slot_ns <= MAX_AGE
+
+    def version(self, now=None):
+        """Version of the residual window applied at `now`; None without recent observations."""
+        with self._lock:
+            return self.residuals.version if self._current(now) else None
+
+    def increment(self, lon, lat, now=None):
+        """Analysis increment (TECU) on the regular grid lon x lat, or None without recent observations."""
+        with self._lock:
+            if not self._current(now):
+                return None
+            _, rows, cols, weights = self._solve()
+        if weights is None:
+            return None
+        fx, fy = self._grid_factors(np.asarray(lon, np.float64), np.asarray(lat, np.float64))
+        return self.background_var * (fy[:, rows] * weights) @ fx[:, cols].T
+
+    def analysis(self, lon, lat, background, now=None):
+        """`background` (lat x lon, net32D) corrected by the recent observations; TEC stays >= 0."""
+        with instrumentation.stage('ethtec', 'assimilate', rows=background.size):
+            increment = self.increment(lon, lat, now)
+            if increment is None:
+                return background
+            return np.maximum(background + increment, 0)
+
+
+assimilator = TecAssimilator()
@@ -0,0 +1,237 @@
+"""Tiled, adaptive-resolution evaluation of the net32D TEC model.
+
+The EthTEC domain is split into square tiles. Level 0 covers every tile that
+touches the Ethiopia border polygon at the base resolution; each further level
+halves the tile size (and the grid spacing) but is only evaluated where it is
+needed: around the GNSS stations and along the geomagnetic equator. Tiles are
+evaluated in a process pool and collected into a TecPyramid, which can be
+sampled at arbitrary lon/lat (finest tile wins) and saved as one .npy per tile.
+"""
+import functools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from matplotlib.path import Path
+from matplotlib.transforms import Bbox
+
+from EthTEC import compute_tec
+
+# EthTEC map domain (lon_start, lon_end, lat_start, lat_end) in degrees
+DOMAIN = (33.0, 48.0, 3.0, 15.0)
+TILE_DEG = 2.4      # level-0 tile size in degrees; the last row/column of tiles runs past the domain
+TILE_PX = 30        # grid points per tile side -> 0.08 deg at level 0
+MAX_LEVEL = 2       # 0.08 -> 0.04 -> 0.02 deg
+
+STATION_RADIUS = 1.0   # refine to MAX_LEVEL within this distance (deg) of a station
+EQUATOR_RADIUS = 0.5   # refine to MAX_LEVEL - 1 within this distance of the dip equator
+
+
+@functools.lru_cache(maxsize=None)
+def load_geometry(border_file='Ethiopia_border.txt', equator_file='geomagnetic_equator.txt',
+                  stations_file='GNSS_Stn.txt'):
+    """Read the border polygon, geomagnetic equator and GNSS stations used by EthTEC (once; they are static)."""
+    coast = pd.read_csv(border_file, sep=',')
+    gmea = pd.read_csv(equator_file, sep='\t', skiprows=1, header=None, names=['lon', 'lat'])
+    GNSS = pd.read_csv(stations_file, sep=',')
+    border = np.column_stack((coast['Lon'].values, coast['Lat'].values))
+    equator = np.column_stack((gmea['lon'].values, gmea['lat'].values))
+    stations = np.column_stack((GNSS['lon'].values, GNSS['lat'].values))
+    return border, equator, stations
+
+
+def _densify(line, step=0.1):
+    # Insert vertices so no segment is longer than `step` degrees; distance tests
+    # against a polyline can then be done against its vertices only.
+    line = np.asarray(line, dtype=float)
+    if len(line) < 2:
+        return line
+    seg = np.hypot(*np.diff(line, axis=0).T)
+    n = np.maximum(np.ceil(seg / step).astype(int), 1)
+    t = np.concatenate([np.arange(k) / k for k in n] + [[0.0]])
+    start = np.concatenate([np.repeat(line[:-1], n, axis=0), line[-1:]])
+    delta = np.concatenate([np.repeat(np.diff(line, axis=0), n, axis=0), [[0.0, 0.0]]])
+    return start + t[:, None] * delta
+
+
+def _near_bbox(points, bounds, radius):
+    if points is None or len(points) == 0:
+        return False
+    x0, x1, y0, y1 = bounds
+    dx = np.maximum(np.maximum(x0 - points[:, 0], 0), points[:, 0] - x1)
+    dy = np.maximum(np.maximum(y0 - points[:, 1], 0), points[:, 1] - y1)
+    return bool(np.any(np.hypot(dx, dy) <= radius))
+
+
+def plan_tiles(border, equator=None, stations=None, domain=DOMAIN, tile_deg=TILE_DEG,
+               max_level=MAX_LEVEL, station_radius=STATION_RADIUS, equator_radius=EQUATOR_RADIUS):
+    """Return the (z, tx, ty) tiles to evaluate.
+
+    A tile is kept when it intersects the border polygon; tiles above level 0
+    are additionally restricted to the neighbourhood of a station (up to
+    `max_level`) or of the geomagnetic equator (up to `max_level - 1`).
+    """
+    polygon = Path(np.asarray(border, dtype=float))
+    equator = _densify(equator) if equator is not None else None
+    stations = np.asarray(stations, dtype=float) if stations is not None else None
+    lon0, lon1, lat0, lat1 = domain
+    tiles = []
+    for z in range(max_level + 1):
+        size = tile_deg / 2 ** z
+        nx = int(np.ceil((lon1 - lon0) / size - 1e-9))
+        ny = int(np.ceil((lat1 - lat0) / size - 1e-9))
+        for tx in range(nx):
+            for ty in range(ny):
+                bounds = tile_bounds(domain, tile_deg, z, tx, ty)
+                x0, x1, y0, y1 = bounds
+                if not polygon.intersects_bbox(Bbox([[x0, y0], [x1, y1]]), filled=True):
+                    continue
+                if z > 0:
+                    near_station = _near_bbox(stations, bounds, station_radius)
+                    near_equator = z < max_level and _near_bbox(equator, bounds, equator_radius)
+                    if not (near_station or near_equator):
+                        continue
+                tiles.append((z, tx, ty))
+    return tiles
+
+
+def tile_bounds(domain, tile_deg, z, tx, ty):
+    """(lon0, lon1, lat0, lat1) of tile (z, tx, ty)."""
+    size = tile_deg / 2 ** z
+    lon0 = domain[0] + tx * size
+    lat0 = domain[2] + ty * size
+    return lon0, lon0 + size, lat0, lat0 + size
+
+
+def tile_axes(bounds, tile_px):
+    """Lon and lat of the grid-point centres of a tile with `bounds`."""
+    x0, x1, y0, y1 = bounds
+    res = (x1 - x0) / tile_px
+    return x0 + (np.arange(tile_px) + 0.5) * res, y0 + (np.arange(tile_px) + 0.5) * res
+
+
+def _evaluate_tile(task):
+    z, tx, ty, bounds, tile_px, hour, doy, f10p7, border = task
+    long, lat = tile_axes(bounds, tile_px)
+    long2, lat2 = np.meshgrid(long, lat)
+    TECm = compute_tec(long2, lat2, hour, doy, f10p7)
+    inside = Path(border).contains_points(np.column_stack((long2.ravel(), lat2.ravel())))
+    TECm.ravel()[~inside] = np.nan
+    return (z, tx, ty), TECm.astype(np.float32)
+
+
+class TecPyramid:
+    """Multi-resolution TEC tiles; levels[z][(tx, ty)] is a (tile_px, tile_px) array, row 0 south."""
+
+    def __init__(self, domain=DOMAIN, tile_deg=TILE_DEG, tile_px=TILE_PX, epoch=None):
+        self.domain = tuple(domain)
+        self.tile_deg = tile_deg
+        self.tile_px = tile_px
+        self.epoch = epoch
+        self.levels = {}
+        self._index = {}
+
+    def add(self, z, tx, ty, values):
+        self.levels.setdefault(z, {})[(tx, ty)] = values
+        self._index.pop(z, None)
+
+    def resolution(self, z):
+        return self.tile_deg / 2 ** z / self.tile_px
+
+    def bounds(self, z, tx, ty):
+        return tile_bounds(self.domain, self.tile_deg, z, tx, ty)
+
+    def _level_index(self, z):
+        # Dense (tx, ty) -> slot lookup plus the stacked tiles of one level
+        if z not in self._index:
+            tiles = self.levels[z]
+            keys = list(tiles)
+            size = self.tile_deg / 2 ** z
+            nx = int(np.ceil((self.domain[1] - self.domain[0]) / size - 1e-9))
+            ny = int(np.ceil((self.domain[3] - self.domain[2]) / size - 1e-9))
+            lookup = np.full((nx, ny), -1, dtype=np.int32)
+            for slot, (tx, ty) in enumerate(keys):
+                lookup[tx, ty] = slot
+            stack = np.stack([tiles[k] for k in keys]) if keys else np.empty((0, self.tile_px, self.tile_px), np.float32)
+            self._index[z] = (lookup, stack)
+        return self._index[z]
+
+    def sample(self, lon, lat):
+        """Nearest-grid-point TEC at lon/lat from the finest level that covers each point."""
+        lon = np.asarray(lon, dtype=float)
+        lat = np.asarray(lat, dtype=float)
+        out = np.full(lon.shape, np.nan, dtype=np.float32)
+        pending = np.ones(lon.shape, dtype=bool)
+        for z in sorted(self.levels, reverse=True):
+            lookup, stack = self._level_index(z)
+            size = self.tile_deg / 2 ** z
+            fx = (lon - self.domain[0]) / size
+            fy = (lat - self.domain[2]) / size
+            tx = np.floor(fx).astype(np.int64)
+            ty = np.floor(fy).astype(np.int64)
+            sel = pending & (tx >= 0) & (ty >= 0) & (tx < lookup.shape[0]) & (ty < lookup.shape[1])
+            slot = np.full(lon.shape, -1, dtype=np.int64)
+            slot[sel] = lookup[tx[sel], ty[sel]]
+            sel &= slot >= 0
+            if not sel.any():
+                continue
+            ix = np.minimum(((fx[sel] - tx[sel]) * self.tile_px).astype(np.int64), self.tile_px - 1)
+            iy = np.minimum(((fy[sel] - ty[sel]) * self.tile_px).astype(np.int64), self.tile_px - 1)
+            out[sel] = stack[slot[sel], iy, ix]
+            pending &= ~sel
+        return out
+
+    def value_range(self):
+        values = [np.nanmin(a) for tiles in self.levels.values() for a in tiles.values() if np.isfinite(a).any()]
+        highs = [np.nanmax(a) for tiles in self.levels.values() for a in tiles.values() if np.isfinite(a).any()]
+        if not values:
+            return np.nan, np.nan
+        return float(min(values)), float(max(highs))
+
+    def save(self, directory):
+        """Write tiles as <directory>/<z>/<tx>/<ty>.npy plus a meta.json index."""
+        index = []
+        for z, tiles in self.levels.items():
+            for (tx, ty), values in tiles.items():
+                tile_dir = os.path.join(directory, str(z), str(tx))
+                os.makedirs(tile_dir, exist_ok=True)
+                np.save(os.path.join(tile_dir, f"{ty}.npy"), values)
+                index.append([z, tx, ty])
+        meta = {'domain': self.domain, 'tile_deg': self.tile_deg, 'tile_px': self.tile_px,
+                'epoch': self.epoch, 'tiles': sorted(index)}
+        with open(os.path.join(directory, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+
+    @classmethod
+    def load(cls, directory):
+        with open(os.path.join(directory, 'meta.json')) as f:
+            meta = json.load(f)
+        pyramid = cls(meta['domain'], meta['tile_deg'], meta['tile_px'], meta['epoch'])
+        for z, tx, ty in meta['tiles']:
+            pyramid.add(z, tx, ty, np.load(os.path.join(directory, str(z), str(tx), f"{ty}.npy")))
+        return pyramid
+
+
+def build_tec_pyramid(hour, doy, f10p7, border, equator=None, stations=None, epoch=None,
+                      domain=DOMAIN, tile_deg=TILE_DEG, tile_px=TILE_PX, max_level=MAX_LEVEL,
+                      executor=None, max_workers=None):
+    """Evaluate all planned tiles (in parallel) and return a TecPyramid.
+
+    Pass a long-lived `executor` from a service loop to avoid re-spawning the
+    process pool every epoch; otherwise a temporary pool is used.
+    """
+    border = np.asarray(border, dtype=float)
+    tiles = plan_tiles(border, equator, stations, domain, tile_deg, max_level)
+    tasks = [(z, tx, ty, tile_bounds(domain, tile_deg, z, tx, ty), tile_px, hour, doy, f10p7, border)
+             for z, tx, ty in tiles]
+    pyramid = TecPyramid(domain, tile_deg, tile_px, epoch)
+    if executor is None:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(_evaluate_tile, tasks, chunksize=4))
+    else:
+        results = list(executor.map(_evaluate_tile, tasks, chunksize=4))
+    for (z, tx, ty), values in results:
+        pyramid.add(z, tx, ty, values)
+    return pyramid
@@ -11,6 +11,8 @@ import tempfile
 from scipy.stats import zscore
 import matplotlib.dates as mdates
 from matplotlib.patches import Patch
+from decimate import decimate_frame
+from iaga2002 import read_iaga2002_file_set
 from influxdb_client import InfluxDBClient, Point, WritePrecision
 from influxdb_client.client.write_api import SYNCHRONOUS
 
@@ -251,55 +253,108 @@ def compute_derivatives(data):
         data["dH/dt_smooth"] = medfilt(data["dH/dt"], kernel_size=5)
     return data
 
+# K-index bar colours by K (0-9)
+K_COLOURS = np.array(["green"] * 5 + ["yellow", "#DAA520", "orange", "red", "darkred"])
+DERIVATIVE_LINES = [("dX/dt_smooth", "dX/dt", "red"), ("dF/dt_smooth", "dF/dt", "orange"), ("dH/dt_smooth", "dH/dt", "yellow")]
+FIELD_LINES = [("X", "X", "red"), ("H", "H", "yellow")]
+
+_derivative_cache = {}
+_k_figure = None
+
+def cached_derivatives(data):
+    """compute_derivatives per UTC day, reusing days whose minutes have not changed.
+
+    Each day is computed with 3 minutes of the previous day and 2 of the next
+    so the diff/medfilt(5) values match a full-series computation.
+    """
+    if data.empty:
+        return data
+    data = data.sort_values("DATETIME").reset_index(drop=True)
+    day = data["DATETIME"].dt.floor("D")
+    starts = np.flatnonzero(np.r_[True, day.values[1:] != day.values[:-1]])
+    ends = np.r_[starts[1:], len(data)]
+    frames = []
+    for start, end in zip(starts, ends):
+        lo, hi = max(start - 3, 0), min(end + 2, len(data))
+        chunk = data.iloc[lo:hi]
+        key = day.iloc[start]
+        signature = pd.util.hash_pandas_object(chunk, index=False).values.tobytes()
+        cached = _derivative_cache.get(key)
+        if cached is None or cached[0] != signature:
+            derived = compute_derivatives(chunk).iloc[start - lo:end - lo]
+            _derivative_cache[key] = cached = (signature, derived)
+        frames.append(cached[1])
+    for key in set(_derivative_cache) - set(day.iloc[starts]):
+        del _derivative_cache[key]
+    return pd.concat(frames, ignore_index=True)
+
+def _k_plot_figure():
+    global _k_figure
+    if _k_figure is None:
+        fig, axs = plt.subplots(3, 1, figsize=(12, 12), sharex=True)
+        axs[0].set_ylabel("K-index")
+        axs[0].set_ylim(0, 9)
+        axs[1].set_ylabel("Derivatives (nT/min)")
+        axs[2].set_ylabel("Magnetic Intensity (nT)")
+        for ax in axs:
+            ax.grid(True, linestyle="--", alpha=0.7)
+        axs[-1].xaxis.set_major_locator(mdates.DayLocator())
+        axs[-1].xaxis.set_minor_locator(mdates.HourLocator(interval=6))
+        axs[-1].xaxis.set_major_formatter(mdates.DateFormatter('%d\n%b'))
+        axs[-1].xaxis.set_minor_formatter(mdates.DateFormatter('%H:%M'))
+        axs[-1].tick_params(axis="x", which="major", pad=15)
+        axs[-1].tick_params(axis="x", which="minor", labelsize=8)
+        _k_figure = {"fig": fig, "axs": axs, "bars": None, "lines": {}, "laid_out": False}
+    return _k_figure
+
 def plot_k_indices_with_derivatives(data, k_indices, k_times, station_name=""):
     if data.empty or len(k_indices) == 0:
         return
     k_times_dt = pd.to_datetime(k_times, unit='s', utc=True)
     start_time = pd.Timestamp.now(tz='UTC') - pd.Timedelta(days=len_days)
-    recent_data = data[data["DATETIME"] >= start_time].copy()
+    recent_data = data[data["DATETIME"] >= start_time]
     if recent_data.empty:
         return
     if 'dX/dt_smooth' not in recent_data.columns:
-        recent_data = compute_derivatives(recent_data)
+        recent_data = cached_derivatives(recent_data)
+    # Thin to the figure's pixel columns; min/max per column keeps the spikes
+    plot_cols = [c for c in ("dX/dt_smooth", "dF/dt_smooth", "dH/dt_smooth", "X", "H") if c in recent_data.columns]
+    recent_data = decimate_frame(recent_data, plot_cols, time_col="DATETIME")
 
-    fig, axs = plt.subplots(3, 1, figsize=(12, 12), sharex=True)
+    figure = _k_plot_figure()
+    fig, axs = figure["fig"], figure["axs"]
     fig.suptitle(f"{station_name} Magnetic Indices and Derivatives\nLast Updated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    
-    colors = ["green" if k < 5 else "yellow" if k == 5 else "#DAA520" if k == 6 else "orange" if k == 7 else "red" if k == 8 else "darkred" for k in k_indices]
-    for i, (time, k) in enumerate(zip(k_times_dt, k_indices)):
-        axs[0].bar(time, k, width=0.1, color=colors[i], align="center")
-    axs[0].set_ylabel("K-index")
-    axs[0].set_ylim(0, 9)
-    axs[0].grid(True, linestyle="--", alpha=0.7)
-    
-    if 'dX/dt_smooth' in recent_data.columns:
-        axs[1].plot(recent_data["DATETIME"], recent_data["dX/dt_smooth"], label="dX/dt", color="red", linewidth=1)
-    if 'dF/dt_smooth' in recent_data.columns:
-        axs[1].plot(recent_data["DATETIME"], recent_data["dF/dt_smooth"], label="dF/dt", color="orange", linewidth=1)
-    if 'dH/dt_smooth' in recent_data.columns:
-        axs[1].plot(recent_data["DATETIME"], recent_data["dH/dt_smooth"], label="dH/dt", color="yellow", linewidth=1)
-    axs[1].set_ylabel("Derivatives (nT/min)")
-    axs[1].grid(True, linestyle="--", alpha=0.7)
-    axs[1].legend()
-    
-    if 'X' in recent_data.columns:
-        axs[2].plot(recent_data["DATETIME"], recent_data["X"], label="X", color="red", linewidth=1)
-    if 'H' in recent_data.columns:
-        axs[2].plot(recent_data["DATETIME"], recent_data["H"], label="H", color="yellow", linewidth=1)
-    axs[2].set_ylabel("Magnetic Intensity (nT)")
-    axs[2].grid(True, linestyle="--", alpha=0.7)
-    axs[2].legend(loc="upper left")
-    
-    axs[-1].xaxis.set_major_locator(mdates.DayLocator())
-    axs[-1].xaxis.set_minor_locator(mdates.HourLocator(interval=6))
-    axs[-1].xaxis.set_major_formatter(mdates.DateFormatter('%d\n%b'))
-    axs[-1].xaxis.set_minor_formatter(mdates.DateFormatter('%H:%M'))
-    axs[-1].tick_params(axis="x", which="major", pad=15)
-    axs[-1].tick_params(axis="x", which="minor", labelsize=8)
-    
-    plt.tight_layout(rect=[0, 0, 1, 0.96])
-    plt.savefig("Kindex.png")
-    plt.close()
+
+    # one bar artist for all 3-hour blocks
+    if figure["bars"] is not None:
+        figure["bars"].remove()
+    k_indices = np.asarray(k_indices)
+    colors = K_COLOURS[np.clip(k_indices.astype(int), 0, 9)]
+    figure["bars"] = axs[0].bar(k_times_dt, k_indices, width=0.1, color=colors, align="center")
+
+    times = recent_data["DATETIME"].values
+    lines = figure["lines"]
+    for ax, specs in ((axs[1], DERIVATIVE_LINES), (axs[2], FIELD_LINES)):
+        added = False
+        for column, label, color in specs:
+            if column in recent_data.columns:
+                if column not in lines:
+                    lines[column], = ax.plot(times, recent_data[column].values, label=label, color=color, linewidth=1)
+                    added = True
+                else:
+                    lines[column].set_data(times, recent_data[column].values)
+            elif column in lines:
+                lines.pop(column).remove()
+                added = True
+        if added:
+            ax.legend(loc="upper left" if ax is axs[2] else "best")
+        ax.relim()
+        ax.autoscale_view()
+
+    if not figure["laid_out"]:
+        fig.tight_layout(rect=[0, 0, 1, 0.96])
+        figure["laid_out"] = True
+    fig.savefig("Kindex.png")
 
 def main_loop():
     plt.ion()
@@ -312,17 +367,7 @@ def main_loop():
                 time.sleep(update_interval_minutes * 60)
                 continue
 
-            all_data = pd.DataFrame()
-            station_name = station_code.upper()
-            components = None
-
-            for file_path in files:
-                data, comps, name = read_iaga2002(file_path)
-                if not data.empty:
-                    all_data = pd.concat([all_data, data], ignore_index=True)
-                    if components is None:
-                        components = comps
-                        station_name = name
+            all_data, components, station_name = read_iaga2002_file_set(files, reader=read_iaga2002)
 
             if all_data.empty:
                 logging.warning("No valid data processed")
@@ -330,7 +375,6 @@ def main_loop():
                 continue
 
             all_data = preprocess_data(all_data, components)
-            all_data.sort_values("DATETIME", inplace=True)
 
             times_float = time_to_float(all_data["DATETIME"])
             comp_x = all_data[components[0]].values
@@ -346,6 +390,7 @@ def main_loop():
             logging.info("K-index data written to InfluxDB")
 
             if len(k_indices) > 0:
+                all_data = cached_derivatives(all_data)
                 plot_k_indices_with_derivatives(all_data, k_indices, k_times, station_name)
 
             logging.info(f"Sleeping for {update_interval_minutes} minutes...")
@@ -1,4 +1,5 @@
 import os
+import re
 import pandas as pd
 import numpy as np
 import ftplib
@@ -59,35 +60,83 @@ def download_files(ftp, remote_dir, local_dir, station_code, date):
     logging.info(f"Downloaded {remote_filename} to {local_filename}")
     return local_filename
 
-def parse_ismr_file(filepath):
-    data = []
+WHITESPACE_COLUMNS = ["Date", "Time", "SVID", "Azimuth", "Elevation", "CN0", "S4_index", "Sigma_phi", "VTEC"]
+TIMESTAMP_FORMAT = "%Y/%m/%d %H:%M:%S"
+DATE_PREFIX = re.compile(r"\d{4}/\d{2}/\d{2}\s")
+SEPTENTRIO_PREFIX = re.compile(r"\d+,")
+
+
+def detect_ismr_format(filepath):
+    """'whitespace' (date/time-prefixed rows), 'septentrio' (sbf2ismr CSV, see S4_Pi.read_ismr) or None."""
     with open(filepath, "r") as file:
         for line in file:
             if not line.strip() or line.startswith("#"):
                 continue
-            parts = line.split()
-            if len(parts) < 9:
-                continue
-            try:
-                date_str, time_str = parts[0], parts[1]
-                datetime_str = date_str + " " + time_str
-                timestamp = datetime.strptime(datetime_str, "%Y/%m/%d %H:%M:%S")
-                svid = int(parts[2])
-                azimuth = float(parts[3])
-                elevation = float(parts[4])
-                cn0 = float(parts[5])
-                s4_index = float(parts[6])
-                sigma_phi = float(parts[7])
-                vtec = float(parts[8])
-
-                data.append([timestamp, svid, azimuth, elevation, cn0, s4_index, sigma_phi, vtec])
-            except Exception as e:
-                logging.warning(f"Error parsing line: {line} - {e}")
-
-    return pd.DataFrame(data, columns=["Timestamp", "SVID", "Azimuth", "Elevation", "CN0", "S4_index", "Sigma_phi", "VTEC"])
+            if DATE_PREFIX.match(line):
+                return "whitespace"
+            if SEPTENTRIO_PREFIX.match(line):
+                return "septentrio"
+            return None
+    return None
+
+
+def parse_ismr_file(filepath):
+    """Whitespace ISMR variant: one C-level read of the file, timestamps parsed in bulk.
+
+    Rows with fewer than 9 fields, a non-integer SVID or another field that is not
+    a number are skipped, as the line-by-line reader did; extra fields are ignored.
+    """
+    # without NA filtering a missing field reads as "" and a literal "nan" as NaN (float columns) or "nan"
+    try:
+        raw = pd.read_csv(filepath, sep=r"\s+", header=None, comment="#", usecols=range(len(WHITESPACE_COLUMNS)),
+                          names=WHITESPACE_COLUMNS, dtype={"Date": str, "Time": str, "SVID": str}, na_filter=False)
+    except pd.errors.ParserError:
+        # raised when no row has 9 fields
+        logging.warning(f"No complete lines in {filepath}")
+        raw = pd.DataFrame({name: pd.Series(dtype=str) for name in WHITESPACE_COLUMNS})
+    df = pd.DataFrame({"Timestamp": pd.to_datetime(raw["Date"] + " " + raw["Time"], format=TIMESTAMP_FORMAT,
+                                                   errors="coerce")})
+    bad = df["Timestamp"].isna().to_numpy().copy()
+    # SVIDs are integers, as int() read them: "5.0" or "nan" is a bad line
+    try:
+        df["SVID"] = raw["SVID"].astype(np.int64)
+    except ValueError:
+        integral = raw["SVID"].str.fullmatch(r"\s*[+-]?\d+\s*").to_numpy()
+        bad |= ~integral
+        df["SVID"] = pd.to_numeric(raw["SVID"].where(integral, "0")).astype(np.int64)
+    for name in WHITESPACE_COLUMNS[3:]:
+        column = raw[name]
+        if column.dtype.kind in "fi":
+            df[name] = column.astype(np.float64)
+            continue
+        # only a column with a missing or non-numeric field falls back to per-value conversion
+        values = pd.to_numeric(column, errors="coerce")
+        bad |= (values.isna() & ~column.str.lower().eq("nan")).to_numpy()
+        df[name] = values.astype(np.float64)
+    if bad.any():
+        logging.warning(f"Skipped {int(bad.sum())} unparsable lines in {filepath}")
+        df = df[~bad].reset_index(drop=True)
+    return df
+
+
+def load_ismr_file(filepath):
+    """Parse either ISMR format into the Timestamp/SVID/.../VTEC columns of parse_ismr_file."""
+    kind = detect_ismr_format(filepath)
+    if kind == "whitespace":
+        return parse_ismr_file(filepath)
+    if kind == "septentrio":
+        from S4_Pi import read_ismr
+        data = read_ismr(filepath)
+        if data is None:
+            return pd.DataFrame(columns=["Timestamp"] + WHITESPACE_COLUMNS[2:])
+        return (data.reset_index()
+                .rename(columns={"Time": "Timestamp", "Phi60_Sig1_60": "Sigma_phi"})
+                [["Timestamp", "SVID", "S4_index", "Sigma_phi", "VTEC"]])
+    logging.warning(f"Unrecognised ISMR format: {filepath}")
+    return pd.DataFrame(columns=["Timestamp"] + WHITESPACE_COLUMNS[2:])
 
 def process_ismr_data(filepath, output_dir):
-    df = parse_ismr_file(filepath)
+    df = load_ismr_file(filepath)
     if df.empty:
         logging.warning("Parsed DataFrame is empty")
         return None, None
@@ -0,0 +1,84 @@
+"""ObservationRing and ConstellationRings: wrap-around, merging, expiry and NaT rows."""
+import numpy as np
+import pandas as pd
+
+from ismr_store import ConstellationRings, ObservationRing
+
+COLUMNS = {'Time': np.int64, 'SVID': np.int16, 'VTEC': np.float32}
+
+
+def batch(times, svids=5):
+    times = np.asarray(times, np.int64)
+    return {'Time': times, 'SVID': np.broadcast_to(np.asarray(svids, np.int16), times.shape),
+            'VTEC': times.astype(np.float32)}
+
+
+def test_wraps_and_keeps_the_newest_rows():
+    ring = ObservationRing(4, COLUMNS)
+    for start in range(0, 20, 2):
+        ring.append(batch([start, start + 1]))
+        assert len(ring) == min(start + 2, 4)
+        # the live rows stay one contiguous slice of the 2 * capacity storage
+        assert ring.view('Time').tolist() == list(range(max(start - 2, 0), start + 2))
+    assert ring.time_range() == (16, 19)
+    assert ring.nbytes == 2 * 4 * (8 + 2 + 4)
+
+
+def test_oversized_batch_keeps_its_tail():
+    ring = ObservationRing(3, COLUMNS)
+    ring.append(batch(np.arange(10)))
+    assert ring.view('Time').tolist() == [7, 8, 9]
+
+
+def test_out_of_order_batches_are_merged():
+    ring = ObservationRing(6, COLUMNS)
+    ring.append(batch([10, 20, 30]))
+    ring.append(batch([25, 5, 15]))
+    assert ring.view('Time').tolist() == [5, 10, 15, 20, 25, 30]
+    assert ring.view('VTEC').tolist() == [5, 10, 15, 20, 25, 30]
+    ring.append(batch([1, 40]))
+    assert ring.view('Time').tolist() == [10, 15, 20, 25, 30, 40]
+
+
+def test_expire():
+    ring = ObservationRing(8, COLUMNS)
+    ring.append(batch(np.arange(0, 60, 10)))
+    assert ring.expire(25) == 3
+    assert ring.view('Time').tolist() == [30, 40, 50]
+    assert ring.expire(pd.Timestamp(100, unit='ns')) == 3
+    assert len(ring) == 0 and ring.time_range() is None
+    assert ring.expire(200) == 0
+
+
+def test_nat_rows_are_dropped():
+    index = pd.DatetimeIndex(['2025-09-01 00:01', None, '2025-09-01 00:00'], name='Time')
+    frame = pd.DataFrame({'SVID': [3.0, 4.0, np.nan], 'VTEC': [1.0, 2.0, 3.0]}, index=index)
+    ring = ObservationRing(4, COLUMNS)
+    ring.append(frame)
+    assert ring.view('SVID').tolist() == [0, 3]
+    # a later in-order batch still takes the append path
+    ring.append(batch([ring.view('Time')[-1] + 1]))
+    assert len(ring) == 3
+
+
+def test_frames_are_copies():
+    ring = ObservationRing(4, COLUMNS)
+    ring.append(batch([1, 2, 3]))
+    frame, part = ring.to_frame(), ring.between(2, 3)
+    ring.append(batch([4, 5, 6, 7]))
+    assert frame['VTEC'].tolist() == [1, 2, 3]
+    assert part['VTEC'].tolist() == [2, 3]
+    assert part.index.name == 'Time'
+
+
+def test_constellation_rings_partition_by_svid():
+    rings = ConstellationRings(1, names=('gps', 'galileo'), columns=COLUMNS)
+    # G05, R01 (no ring), E01, G06
+    rings.append(batch([4, 3, 2, 1], [5, 38, 71, 6]))
+    assert len(rings.rings['gps']) == 2 and len(rings.rings['galileo']) == 1
+    assert rings.to_frame(('gps',))['SVID'].tolist() == [6, 5]
+    assert rings.to_frame()['SVID'].tolist() == [6, 71, 5]
+    assert rings.between(2, 3)['SVID'].tolist() == [71]
+    assert rings.time_range() == (1, 4)
+    assert rings.expire(3) == 2
+    assert rings.to_frame(('galileo',)).empty
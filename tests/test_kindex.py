@@ -0,0 +1,107 @@
+"""ENT_Kindex's spike filter and the nowcaster of the open 3-hour block."""
+import numpy as np
+import pandas as pd
+import pytest
+
+import ENT_Kindex
+from ENT_Kindex import BLOCK_SECONDS, KNowcaster, SpikeFilter
+
+COMPONENTS = ['X', 'Y', 'Z']
+
+
+def minutes(seed=0, n=600, spikes=8):
+    rng = np.random.default_rng(seed)
+    values = np.cumsum(rng.normal(0, 1, (n, 3)), axis=0)
+    values[rng.choice(n, spikes, replace=False)] += 80
+    times = pd.date_range('2025-09-16', periods=n, freq='min', tz='UTC')
+    return pd.DataFrame({'DATETIME': times, 'X': values[:, 0], 'Y': values[:, 1], 'Z': values[:, 2]})
+
+
+def rejected(data, kept):
+    return set(data['DATETIME']) - set(kept['DATETIME'])
+
+
+def streamed(data, context_rows, chunk=7):
+    # the nowcast path: each read is filtered together with the last raw minutes before it
+    spike_filter = SpikeFilter()
+    context = data.iloc[:0]
+    found = set()
+    for start in range(0, len(data), chunk):
+        new = data.iloc[start:start + chunk]
+        raw = pd.concat([context, new]) if len(context) else new
+        context = raw.tail(context_rows(spike_filter))
+        found |= rejected(new, spike_filter.filter(raw, COMPONENTS))
+    return found
+
+
+def test_spikes_are_rejected():
+    data = minutes(spikes=0)
+    data.loc[300, 'Y'] += 80
+    kept = SpikeFilter().filter(data, COMPONENTS)
+    assert rejected(data, kept) == {data['DATETIME'][300]}
+
+
+def test_reach_is_twice_the_window():
+    assert SpikeFilter(window=61).reach == 120
+
+
+def test_streaming_with_the_full_reach_matches_the_batch():
+    data = minutes()
+    batch = rejected(data, SpikeFilter().filter(data, COMPONENTS))
+    assert batch
+    assert streamed(data, lambda f: f.reach) == batch
+    # one window of context is not enough: the MAD reaches back twice as far
+    assert streamed(data, lambda f: f.window - 1) != batch
+
+
+def test_late_minutes_are_judged_with_their_neighbours():
+    data = minutes(seed=1)
+    batch = rejected(data, SpikeFilter().filter(data, COMPONENTS))
+    spike_filter = SpikeFilter()
+    late = data.index[250:260]
+    spike_filter.filter(data.drop(late), COMPONENTS)
+    assert rejected(data, spike_filter.filter(data, COMPONENTS)) == batch
+
+
+def block_minutes(block, offsets):
+    return block * BLOCK_SECONDS + np.asarray(offsets, dtype=float) * 60
+
+
+def test_nowcaster_keeps_running_ranges_of_the_open_block():
+    nowcaster = KNowcaster(k9=500)
+    block = 20000
+    assert nowcaster.update(block_minutes(block, [0, 1]), [0.0, 3.0], [0.0, 1.0]) == [
+        (block * BLOCK_SECONDS + BLOCK_SECONDS // 2, 0.25, False)]
+    (mid, k, final), = nowcaster.update(block_minutes(block, [2, 3]), [-9.0, np.nan], [0.0, 15.0])
+    assert (k, final) == (2, False)                  # Y spans 15 nT: 10 <= 15 < 20
+    assert nowcaster.low.tolist() == [-9.0, 0.0] and nowcaster.high.tolist() == [3.0, 15.0]
+    assert nowcaster.provisional() == 2
+    assert nowcaster.elapsed == pytest.approx(4 * 60 / BLOCK_SECONDS)
+    # re-read minutes are ignored
+    assert nowcaster.update(block_minutes(block, [3]), [500.0], [500.0]) == []
+    assert nowcaster.provisional() == 2
+
+
+def test_nowcaster_rollover_closes_the_block_and_starts_fresh():
+    nowcaster = KNowcaster(k9=500)
+    block = 20000
+    nowcaster.update(block_minutes(block, [0, 179]), [0.0, 45.0], [0.0, 0.0])
+    results = nowcaster.update(block_minutes(block, [179.5, 180, 181]), [10.0, 100.0, 103.0], [0.0, 0.0, 0.0])
+    assert results == [(block * BLOCK_SECONDS + BLOCK_SECONDS // 2, 4, True),
+                       ((block + 1) * BLOCK_SECONDS + BLOCK_SECONDS // 2, 0.25, False)]
+    assert nowcaster.block == block + 1 and nowcaster.count == 2
+    assert nowcaster.low.tolist() == [100.0, 0.0] and nowcaster.high.tolist() == [103.0, 0.0]
+
+
+def test_nowcaster_agrees_with_the_batch_k_index():
+    data = minutes(spikes=0, n=900)
+    times = ENT_Kindex.time_to_float(data['DATETIME']).to_numpy()
+    x, y = data['X'].to_numpy() * 20, data['Y'].to_numpy() * 20
+    k_values, k_times = ENT_Kindex.calculate_k_index(times, x, y, 500)
+    nowcaster = KNowcaster(k9=500)
+    results = {}
+    for start in range(0, len(times), 45):
+        for mid, k, _ in nowcaster.update(times[start:start + 45], x[start:start + 45], y[start:start + 45]):
+            results[mid] = k
+    assert list(results) == k_times.tolist()
+    assert list(results.values()) == k_values.tolist()
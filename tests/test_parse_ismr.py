@@ -0,0 +1,49 @@
+"""Edge cases of testS4.parse_ismr_file that the line-by-line reader skipped."""
+import importlib
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture(scope="module")
+def testS4(tmp_path_factory):
+    # testS4 configures a log file in the working directory on import
+    cwd = tmp_path_factory.mktemp("log")
+    with pytest.MonkeyPatch.context() as patch:
+        patch.chdir(cwd)
+        return importlib.import_module("testS4")
+
+
+def write(tmp_path, text):
+    path = tmp_path / "ENTG244.ismr"
+    path.write_text(text)
+    return str(path)
+
+
+def test_skips_non_integer_svids(testS4, tmp_path):
+    path = write(tmp_path, "# date time svid azimuth elevation cn0 s4 sigma_phi vtec\n"
+                           "2025/09/01 00:00:00 5 10.0 45.0 40.0 0.1 0.2 20.0\n"
+                           "2025/09/01 00:00:00 nan 10.0 45.0 40.0 0.1 0.2 20.0\n"
+                           "2025/09/01 00:00:00 6.0 10.0 45.0 40.0 0.1 0.2 20.0\n"
+                           "2025/09/01 00:01:00 7 10.0 45.0 40.0 nan 0.2 20.0\n")
+    df = testS4.parse_ismr_file(path)
+    assert df["SVID"].tolist() == [5, 7]
+    assert df["SVID"].dtype == np.int64
+    assert np.isnan(df["S4_index"].iloc[1])
+
+
+def test_skips_short_and_non_numeric_rows(testS4, tmp_path):
+    path = write(tmp_path, "2025/09/01 00:00:00 5 10.0 45.0 40.0 0.1 0.2\n"
+                           "2025/09/01 00:00:00 6 10.0 45.0 40.0 0.1 0.2 x\n"
+                           "2025/09/01 00:00:00 7 10.0 45.0 40.0 0.1 0.2 20.0 extra\n")
+    df = testS4.parse_ismr_file(path)
+    assert df["SVID"].tolist() == [7]
+    assert df["VTEC"].tolist() == [20.0]
+
+
+def test_file_without_complete_rows_is_empty(testS4, tmp_path):
+    path = write(tmp_path, "2025/09/01 00:00:00 5 10.0 45.0 40.0 0.1 0.2\n"
+                           "2025/09/01 00:01:00 5 10.0 45.0\n")
+    df = testS4.parse_ismr_file(path)
+    assert df.empty
+    assert list(df.columns) == ["Timestamp"] + testS4.WHITESPACE_COLUMNS[2:]
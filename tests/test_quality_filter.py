@@ -0,0 +1,70 @@
+"""Rule loading, evaluation and rejection counts of quality_filter."""
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+from prometheus_client import REGISTRY
+
+import quality_filter
+
+
+def rejected(service, rule):
+    return REGISTRY.get_sample_value('ismr_quality_rejected_total', {'service': service, 'rule': rule}) or 0
+
+
+@pytest.fixture
+def data():
+    return pd.DataFrame({
+        'SVID': [1, 4, 5, 38, np.nan],
+        'Elevation': [45.0, 10.0, 30.0, 60.0, 50.0],
+        'Sig1_lock_time': [600.0, 600.0, 60.0, np.nan, 600.0],
+        'Correction_total_S4_Sig1': [0.1, 0.1, 0.1, np.nan, 0.5],
+    })
+
+
+def test_defaults_are_the_elevation_mask(tmp_path):
+    rules = quality_filter.load_rules(str(tmp_path / 'absent.json'))
+    assert [rule['name'] for rule in rules] == ['elevation']
+    assert rules[0]['missing'] == 'reject'
+
+
+def test_load_rules_from_file(tmp_path):
+    path = tmp_path / 'ismr_quality.json'
+    path.write_text(json.dumps([{"name": "lock_time", "column": "Sig1_lock_time", "min": 300},
+                                {"name": "s4", "column": "S4", "max": 1, "missing": "keep"}]))
+    rules = quality_filter.load_rules(str(path))
+    assert [rule['missing'] for rule in rules] == ['reject', 'keep']
+
+    path.write_text(json.dumps([{"name": "s4", "column": "S4", "max": 1, "missing": "maybe"}]))
+    with pytest.raises(ValueError):
+        quality_filter.load_rules(str(path))
+
+
+def test_keep_and_rejection_counts(data):
+    qc = quality_filter.QualityFilter([
+        {"name": "elevation", "column": "Elevation", "min": 20, "missing": "reject"},
+        {"name": "lock_time", "column": "Sig1_lock_time", "min": 180, "missing": "reject"},
+        {"name": "s4_correction", "column": "Correction_total_S4_Sig1", "max": 0.3, "missing": "keep"},
+        {"name": "blacklist", "column": "SVID", "exclude": ["G04"], "missing": "reject"},
+        {"name": "unused", "column": "SVID", "exclude": [], "missing": "reject"},
+    ])
+    assert [rule[0] for rule in qc.rules] == ['elevation', 'lock_time', 's4_correction', 'blacklist']
+
+    keep = qc.keep(data, service='test_counts')
+    assert keep.tolist() == [True, False, False, False, False]
+    # a row failing two rules is counted under both
+    assert rejected('test_counts', 'elevation') == 1
+    assert rejected('test_counts', 'lock_time') == 2
+    assert rejected('test_counts', 's4_correction') == 1
+    assert rejected('test_counts', 'blacklist') == 1
+
+
+def test_column_limits_and_elevation_mask(data):
+    qc = quality_filter.QualityFilter([
+        {"name": "lock", "column": "Sig1_lock_time", "min": "Elevation", "missing": "keep"}])
+    assert qc.columns == {'Sig1_lock_time', 'Elevation'}
+    assert qc.keep(data).tolist() == [True, True, True, True, True]
+
+    assert quality_filter.compiled(40).keep(data).tolist() == [True, False, False, True, True]
+    assert quality_filter.apply(data, 0) is data
@@ -0,0 +1,36 @@
+"""Parameter validation of the query API and isolation of query results from the rollups."""
+import numpy as np
+import pytest
+
+import query_api
+
+MINUTE = 60 * 10**9
+
+
+@pytest.fixture
+def server():
+    store = query_api.RollupStore()
+    store.add('ENTG', 'S4_index', np.arange(5) * MINUTE, 3, np.arange(5, dtype=float))
+    return query_api.QueryServer(store)
+
+
+def test_series_rows(server):
+    rows = server.series_rows({'station': ['ENTG'], 'field': ['S4_index'], 'from': ['0'], 'to': ['300000']})
+    assert [row['value'] for row in rows] == [0.0, 1.0, 2.0, 3.0, 4.0]
+
+
+@pytest.mark.parametrize('missing', ['from', 'to'])
+def test_missing_time_is_a_value_error(server, missing):
+    query = {'station': ['ENTG'], 'field': ['S4_index'], 'from': ['0'], 'to': ['300000']}
+    del query[missing]
+    with pytest.raises(ValueError, match=missing):
+        server.series_rows(query)
+    with pytest.raises(ValueError):
+        server.grafana_query({'range': {k: v[0] for k, v in query.items() if k in ('from', 'to')}})
+
+
+def test_rollup_query_returns_copies(server):
+    rollup = server.store.series[('ENTG', 'S4_index')]['1min']
+    rows = rollup.query(0, 5 * MINUTE)
+    rows['sum'][:] = -1
+    assert rollup.query(0, 5 * MINUTE)['sum'].tolist() == [0.0, 1.0, 2.0, 3.0, 4.0]
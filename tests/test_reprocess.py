@@ -0,0 +1,58 @@
+"""Store output and checkpointing of reprocess.run across runs into the same --out."""
+from datetime import date
+
+import numpy as np
+import pytest
+
+import reprocess
+import stations
+
+DAY = date(2025, 9, 16)
+
+
+def fake_process_day(archive, station, day, products):
+    # the columns process_ismr_day returns, filled with the requested fields only
+    columns = {'Time': np.arange(3, dtype=np.int64), 'SVID': np.array([1, 2, 3], dtype=np.int16)}
+    for product in products:
+        for name in reprocess.ISMR_FIELDS[product]:
+            columns[name] = np.full(3, len(name), dtype=np.float32)
+    return day, {'ismr': columns}
+
+
+@pytest.fixture
+def out_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(reprocess, 'process_day', fake_process_day)
+    monkeypatch.setattr(stations, 'load_stations', lambda: [
+        {'code': code, 'lat': 9.0, 'lon': 38.8, 'prefix': code} for code in ('ENTG', 'BDMT')])
+    return str(tmp_path)
+
+
+def run(out_dir, products, station='ENTG'):
+    reprocess.run(DAY, DAY, 'archive', products, station, 'store', out_dir, workers=1)
+
+
+def test_products_written_in_sequence_both_survive(out_dir):
+    run(out_dir, ['s4'])
+    run(out_dir, ['vtec'])
+
+    s4 = np.load(f"{out_dir}/ENTG_s4_2025-09-16.npz")
+    vtec = np.load(f"{out_dir}/ENTG_vtec_2025-09-16.npz")
+    assert sorted(s4.files) == ['Phi60_Sig1_60', 'S4_index', 'SVID', 'Time']
+    assert sorted(vtec.files) == ['SVID', 'Time', 'VTEC']
+    checkpoint = reprocess.Checkpoint(f"{out_dir}/checkpoint.json")
+    assert checkpoint.missing('ENTG', 'store', ['s4', 'vtec'], DAY) == []
+
+
+def test_stations_do_not_overwrite_each_other(out_dir):
+    run(out_dir, ['s4'], 'ENTG')
+    run(out_dir, ['s4'], 'BDMT')
+
+    assert np.load(f"{out_dir}/ENTG_s4_2025-09-16.npz")['S4_index'].size == 3
+    assert np.load(f"{out_dir}/BDMT_s4_2025-09-16.npz")['S4_index'].size == 3
+
+
+def test_combined_run_splits_products(out_dir):
+    run(out_dir, ['s4', 'vtec'])
+
+    assert 'VTEC' not in np.load(f"{out_dir}/ENTG_s4_2025-09-16.npz").files
+    assert 'S4_index' not in np.load(f"{out_dir}/ENTG_vtec_2025-09-16.npz").files
@@ -0,0 +1,143 @@
+"""Debounce, coalescing and retry of scheduler stages, and the file/value triggers."""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import scheduler
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(scheduler.time, 'monotonic', clock)
+    return clock
+
+
+@pytest.fixture
+def sched():
+    s = scheduler.Scheduler(max_workers=2)
+    yield s
+    s.stop()
+
+
+def wait_idle(stage, timeout=5.0):
+    deadline = time.perf_counter() + timeout
+    while stage.running:
+        assert time.perf_counter() < deadline, f"{stage.name} still running"
+        time.sleep(0.005)
+
+
+def test_burst_of_triggers_runs_once_after_debounce(clock, sched):
+    runs = []
+    stage = sched.add('a', lambda: runs.append(clock.now), debounce=2.0, run_at_start=False)
+    for offset in (0.0, 1.0, 2.5):
+        clock.now = 1000.0 + offset
+        sched.trigger('a')
+    assert stage.pending == 3
+
+    sched._dispatch(1004.0)
+    assert not stage.running and runs == []
+    sched._dispatch(1004.5)
+    wait_idle(stage)
+    assert len(runs) == 1 and stage.pending == 0
+
+
+def test_run_at_start_skips_the_debounce(clock, sched):
+    runs = []
+    stage = sched.add('a', lambda: runs.append(1), debounce=30.0)
+    sched._dispatch(clock.now)
+    wait_idle(stage)
+    assert runs == [1]
+
+
+def test_triggers_during_a_run_coalesce_into_one_follow_up(clock, sched):
+    release = threading.Event()
+    runs = []
+
+    def fn():
+        runs.append(1)
+        release.wait(5)
+
+    stage = sched.add('a', fn, debounce=0.0)
+    sched._dispatch(clock.now)
+    assert stage.running
+    sched.trigger('a')
+    sched.trigger('a')
+    sched._dispatch(clock.now)   # never concurrently with itself
+    assert len(runs) == 1 and stage.pending == 2
+
+    release.set()
+    wait_idle(stage)
+    sched._dispatch(clock.now)
+    wait_idle(stage)
+    assert len(runs) == 2 and stage.pending == 0
+
+
+def test_failing_stage_is_retried_after_retry_seconds(clock, sched):
+    calls = []
+
+    def fn():
+        calls.append(clock.now)
+        if len(calls) == 1:
+            raise RuntimeError('input not ready')
+
+    stage = sched.add('a', fn, retry_seconds=60)
+    sched._dispatch(clock.now)
+    wait_idle(stage)
+    assert stage.pending == 1 and stage.deadline == 1060.0
+    assert stage.first_pending == 1000.0   # lag keeps counting from the original trigger
+
+    sched._dispatch(1059.0)
+    assert len(calls) == 1
+    clock.now = 1060.0
+    sched._dispatch(clock.now)
+    wait_idle(stage)
+    assert len(calls) == 2 and stage.pending == 0 and stage.first_pending is None
+
+
+def test_file_trigger(tmp_path):
+    trigger = scheduler.FileTrigger(str(tmp_path / '*.min'))
+    assert not trigger.poll(None)        # the first poll only records the files
+    (tmp_path / 'a.min').write_text('x')
+    assert trigger.poll(None)
+    assert not trigger.poll(None)
+    (tmp_path / 'a.min').write_text('xy')
+    assert trigger.poll(None)
+    (tmp_path / 'a.min').unlink()
+    assert trigger.poll(None)
+
+
+def test_tail_trigger_fires_on_growth_only(tmp_path):
+    paths = [tmp_path / 'day1.min']
+    trigger = scheduler.TailTrigger(lambda: str(paths[-1]))
+    assert not trigger.poll(None)
+    paths[0].write_text('12')
+    assert trigger.poll(None)
+    paths[0].write_text('34')            # rewritten, same size
+    assert not trigger.poll(None)
+    paths.append(tmp_path / 'day2.min')  # the day rolled over; nothing written yet
+    assert not trigger.poll(None)
+    paths[1].write_text('1')
+    assert trigger.poll(None)
+
+
+def test_value_trigger_fetches_on_the_pool():
+    values = iter([None, 150.0, 150.0, 151.0])
+    trigger = scheduler.ValueTrigger(lambda: next(values))
+    fired = []
+    with ThreadPoolExecutor(1) as pool:
+        for _ in range(4):
+            assert not trigger.poll(pool)    # submits the fetch
+            pool.submit(lambda: None).result()
+            fired.append(trigger.poll(pool))
+    assert fired == [False, True, False, True]
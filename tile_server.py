@@ -0,0 +1,191 @@
+"""Local XYZ tile endpoint for the EthTEC TEC and range-error maps.
+
+Serves web-mercator tiles rendered on demand from the latest TecPyramid:
+
+    /tiles/<layer>/<z>/<x>/<y>.<fmt>    layer: tec | range    fmt: png | webp | f32
+    /tiles/meta.json                    epoch and colour limits of the current field
+
+`f32` tiles are raw little-endian float32 (TILE_SIZE x TILE_SIZE, row 0 north,
+NaN outside the country) for client-side colouring. webp tiles answer 415
+when Pillow was built without libwebp. Encoded tiles are kept in
+an in-memory LRU that is only cleared when a new epoch is published.
+"""
+import io
+import json
+import re
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+from PIL import Image, features
+
+import instrumentation
+
+TILE_SIZE = 256
+TILE_PORT = 8001
+CACHE_TILES = 2048
+
+f_L1 = 1575.42e6
+k_L1 = 40.3e16 / f_L1**2   # metres of L1 range error per TECU
+
+_TILE_RE = re.compile(r'^/tiles/(tec|range)/(\d+)/(\d+)/(\d+)\.(png|webp|f32)$')
+_CONTENT_TYPES = {'png': 'image/png', 'webp': 'image/webp', 'f32': 'application/octet-stream'}
+# formats this Pillow build can encode; webp needs libwebp
+FORMATS = {'png', 'f32'} | ({'webp'} if features.check('webp') else set())
+
+
+def tile_lonlat(z, x, y, size=TILE_SIZE):
+    """Lon/lat of the pixel centres of XYZ tile (z, x, y), row 0 at the top."""
+    n = 2 ** z
+    px = (x + (np.arange(size) + 0.5) / size) / n
+    py = (y + (np.arange(size) + 0.5) / size) / n
+    lon = px * 360.0 - 180.0
+    lat = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * py))))
+    return np.meshgrid(lon, lat)
+
+
+class TileCache:
+    """Thread-safe LRU of encoded tiles, bound to the epoch it was filled for."""
+
+    def __init__(self, max_tiles=CACHE_TILES):
+        self.max_tiles = max_tiles
+        self.epoch = None
+        self.hits = 0
+        self.misses = 0
+        self._tiles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            payload = self._tiles.get(key)
+            instrumentation.cache_lookup('tec_tiles', payload is not None)
+            if payload is None:
+                self.misses += 1
+                return None
+            self._tiles.move_to_end(key)
+            self.hits += 1
+            return payload
+
+    def put(self, epoch, key, payload):
+        with self._lock:
+            if epoch != self.epoch:
+                # rendered against a field that has since been replaced
+                return
+            self._tiles[key] = payload
+            self._tiles.move_to_end(key)
+            while len(self._tiles) > self.max_tiles:
+                self._tiles.popitem(last=False)
+
+    def reset(self, epoch):
+        with self._lock:
+            self.epoch = epoch
+            self._tiles.clear()
+
+    def __len__(self):
+        return len(self._tiles)
+
+
+class TecTileServer:
+    """Renders and serves XYZ tiles from the most recently published TecPyramid."""
+
+    def __init__(self, port=TILE_PORT, cmap='jet', max_tiles=CACHE_TILES):
+        self.port = port
+        from matplotlib import colormaps
+        self.cmap = colormaps[cmap]
+        self.cache = TileCache(max_tiles)
+        self._field = None   # (epoch, pyramid, vmin, vmax)
+        self._httpd = None
+
+    def publish(self, pyramid):
+        """Make `pyramid` the served field; cached tiles are dropped only if the epoch changed."""
+        if self._field is not None and self._field[0] == pyramid.epoch:
+            return
+        lo, hi = pyramid.value_range()
+        # same padded limits as the TEC_Map.png colour bar
+        vmin = round(lo, 0) - 10 if np.isfinite(lo) else 0.0
+        vmax = round(hi, 0) + 10 if np.isfinite(hi) else 1.0
+        self._field = (pyramid.epoch, pyramid, vmin, vmax)
+        self.cache.reset(pyramid.epoch)
+
+    def meta(self):
+        if self._field is None:
+            return {'epoch': None}
+        epoch, _, vmin, vmax = self._field
+        return {'epoch': epoch, 'tec': [vmin, vmax], 'range': [k_L1 * vmin, k_L1 * vmax],
+                'tile_size': TILE_SIZE, 'cached_tiles': len(self.cache)}
+
+    def render(self, layer, z, x, y, fmt):
+        """Encoded tile bytes, or None before the first field has been published."""
+        field = self._field
+        if field is None:
+            return None
+        epoch, pyramid, vmin, vmax = field
+        key = (layer, z, x, y, fmt)
+        payload = self.cache.get(key)
+        if payload is not None:
+            return payload
+
+        lon, lat = tile_lonlat(z, x, y)
+        values = pyramid.sample(lon, lat)
+        if layer == 'range':
+            values = values * np.float32(k_L1)
+            vmin, vmax = k_L1 * vmin, k_L1 * vmax
+
+        if fmt == 'f32':
+            payload = values.astype('<f4').tobytes()
+        else:
+            rgba = self.cmap((values - vmin) / (vmax - vmin), bytes=True)
+            rgba[~np.isfinite(values)] = 0
+            buf = io.BytesIO()
+            Image.fromarray(rgba, 'RGBA').save(buf, format=fmt.upper())
+            payload = buf.getvalue()
+        self.cache.put(epoch, key, payload)
+        return payload
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/tiles/meta.json':
+                    return self._send(200, 'application/json', json.dumps(server.meta()).encode())
+                match = _TILE_RE.match(self.path)
+                if match is None:
+                    return self._send(404, 'text/plain', b'not found')
+                layer, z, x, y, fmt = match.groups()
+                z, x, y = int(z), int(x), int(y)
+                if x >= 2 ** z or y >= 2 ** z:
+                    return self._send(404, 'text/plain', b'tile out of range')
+                if fmt not in FORMATS:
+                    return self._send(415, 'text/plain', f'{fmt} is not supported by this Pillow build'.encode())
+                payload = server.render(layer, z, x, y, fmt)
+                if payload is None:
+                    return self._send(503, 'text/plain', b'no TEC field yet')
+                self._send(200, _CONTENT_TYPES[fmt], payload)
+
+            def _send(self, status, content_type, body):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('Access-Control-Allow-Origin', '*')
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        """Serve in a daemon thread."""
+        self._httpd = ThreadingHTTPServer(('', self.port), self._handler())
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        print(f"TEC tile server running on http://localhost:{self.port}/tiles/")
+        return self
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
@@ -0,0 +1,158 @@
+"""Regional map of measured VTEC, binned from the ISMR ionospheric pierce points.
+
+Every observation (time, Dlat_IPP, Dlong_IPP, VTEC) of every station is
+binned into a lat/lon grid. Per-minute slots of sum, sum of squares and
+count are accumulated with one np.bincount per batch; the sliding window
+keeps running totals, so moving it by a minute adds the new slot and
+subtracts the expired one instead of re-binning the window. Mean, count and
+standard deviation grids come straight from the totals; empty cells can be
+filled by inverse-distance weighting from the observed cells within
+`fill_radius` degrees.
+
+The window follows the newest observation rather than the wall clock, so
+the map shows the latest window of data even when ISMR files arrive late.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+from prometheus_client import Gauge
+
+import instrumentation
+
+LON_RANGE = (33.0, 48.0)    # same region as the EthTEC map
+LAT_RANGE = (3.0, 15.0)
+RESOLUTION = 0.25           # degrees
+WINDOW_MINUTES = 15
+FILL_RADIUS = 2.0           # degrees; farther empty cells stay NaN
+FILL_POWER = 2
+GRID_FILE = os.path.join('assets', 'vtec_grid.npz')
+
+grid_cells_gauge = Gauge('vtec_grid_cells', 'Cells of the measured VTEC grid', ['state'])
+grid_mean_gauge = Gauge('vtec_grid_mean', 'Mean of the observed cells of the measured VTEC grid (TECU)')
+
+
+class VtecGrid:
+    def __init__(self, lon_range=LON_RANGE, lat_range=LAT_RANGE, resolution=RESOLUTION,
+                 window_minutes=WINDOW_MINUTES, slot_seconds=60):
+        self.lon = np.arange(lon_range[0], lon_range[1], resolution) + resolution / 2   # cell centres
+        self.lat = np.arange(lat_range[0], lat_range[1], resolution) + resolution / 2
+        self.lon0, self.lat0, self.resolution = lon_range[0], lat_range[0], resolution
+        self.shape = (len(self.lat), len(self.lon))
+        self.ncell = self.shape[0] * self.shape[1]
+        self.nslots = window_minutes * 60 // slot_seconds
+        self.slot_ns = slot_seconds * 10**9
+        self._slots = np.zeros((3, self.nslots, self.ncell))   # sum, sum of squares, count per slot
+        self._totals = np.zeros((3, self.ncell))
+        self.newest = None      # newest slot id in the window
+        self.version = 0        # bumped whenever the window's contents change
+        self.published = None   # version last written by publish()
+
+    def _advance(self, newest):
+        # expire the slots that fall out of the window ending at slot `newest`
+        if self.newest is None or newest - self.newest >= self.nslots:
+            self._slots[:] = 0
+            self._totals[:] = 0
+        else:
+            for slot in range(self.newest + 1, newest + 1):
+                pos = slot % self.nslots
+                self._totals -= self._slots[:, pos]
+                self._slots[:, pos] = 0
+            # subtraction leaves rounding residue in cells that became empty
+            empty = self._totals[2] <= 0
+            self._totals[:, empty] = 0
+        self.newest = newest
+
+    def add(self, times, lat, lon, vtec):
+        """Bin observations (ns, deg, deg, TECU); those older than the window are ignored."""
+        times = np.asarray(times, np.int64)
+        vtec = np.asarray(vtec, np.float64)
+        row = np.floor((np.asarray(lat, np.float64) - self.lat0) / self.resolution)
+        col = np.floor((np.asarray(lon, np.float64) - self.lon0) / self.resolution)
+        valid = (np.isfinite(vtec) & (row >= 0) & (row < self.shape[0]) & (col >= 0) & (col < self.shape[1]))
+        if not valid.any():
+            return 0
+        slot = times[valid] // self.slot_ns
+        newest = int(slot.max())
+        if self.newest is None or newest > self.newest:
+            self._advance(newest)
+        recent = slot > self.newest - self.nslots
+        if not recent.any():
+            return 0
+        cell = (row[valid] * self.shape[1] + col[valid]).astype(np.int64)[recent]
+        values = vtec[valid][recent]
+        key = (slot[recent] % self.nslots) * self.ncell + cell
+        size = self.nslots * self.ncell
+        binned = np.stack((np.bincount(key, values, size), np.bincount(key, values * values, size),
+                           np.bincount(key, minlength=size).astype(np.float64)))
+        binned = binned.reshape(3, self.nslots, self.ncell)
+        self._slots += binned
+        self._totals += binned.sum(axis=1)
+        self.version += 1
+        return int(recent.sum())
+
+    def add_frame(self, frame):
+        """Bin a Time-indexed frame with Dlat_IPP, Dlong_IPP and VTEC columns (read_ismr output)."""
+        return self.add(pd.DatetimeIndex(frame.index).as_unit('ns').asi8, frame['Dlat_IPP'].to_numpy(),
+                        frame['Dlong_IPP'].to_numpy(), frame['VTEC'].to_numpy())
+
+    def count(self):
+        return self._totals[2].reshape(self.shape)
+
+    def mean(self):
+        total, _, count = self._totals
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(count > 0, total / count, np.nan).reshape(self.shape)
+
+    def std(self):
+        total, squares, count = self._totals
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = total / count
+            variance = np.maximum(squares / count - mean * mean, 0.0)
+            return np.where(count > 0, np.sqrt(variance), np.nan).reshape(self.shape)
+
+    def filled(self, radius=FILL_RADIUS, power=FILL_POWER):
+        """Mean grid with empty cells inverse-distance weighted from observed cells within `radius` deg."""
+        mean = self.mean()
+        observed = np.isfinite(mean)
+        if not observed.any() or observed.all():
+            return mean
+        lon2, lat2 = np.meshgrid(self.lon, self.lat)
+        scale = np.cos(np.deg2rad(lat2.mean()))    # degrees of longitude are shorter
+        src = np.column_stack((lon2[observed] * scale, lat2[observed]))
+        dst = np.column_stack((lon2[~observed] * scale, lat2[~observed]))
+        distance = np.sqrt(((dst[:, None, :] - src[None, :, :]) ** 2).sum(axis=2))
+        weights = np.where(distance <= radius, 1.0 / np.maximum(distance, 1e-6) ** power, 0.0)
+        norm = weights.sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            fill = np.where(norm > 0, weights @ mean[observed] / norm, np.nan)
+        out = mean.copy()
+        out[~observed] = fill
+        return out
+
+    def products(self, fill=True):
+        return {'lon': self.lon, 'lat': self.lat, 'count': self.count(), 'mean': self.mean(), 'std': self.std(),
+                'filled': self.filled() if fill else self.mean(),
+                'window_end': np.int64(((self.newest or 0) + 1) * self.slot_ns)}
+
+
+regional = VtecGrid()
+
+
+def publish(grid=regional, path=GRID_FILE, fill=True):
+    """Write the grid products to `path` (npz, atomically) and export cell counts; no-op if unchanged."""
+    if grid.published == grid.version:
+        return None
+    grid.published = grid.version
+    with instrumentation.stage('vtec_grid', 'publish', rows=grid.ncell):
+        products = grid.products(fill)
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            np.savez(f, **products)
+        os.replace(tmp, path)
+    observed = np.isfinite(products['mean'])
+    grid_cells_gauge.labels(state='observed').set(int(observed.sum()))
+    grid_cells_gauge.labels(state='filled').set(int((np.isfinite(products['filled']) & ~observed).sum()))
+    if observed.any():
+        grid_mean_gauge.set(float(np.nanmean(products['mean'])))
+    return products